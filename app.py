@@ -1,31 +1,101 @@
 """Simple app for the SimPARTIX simulation code."""
 
+import asyncio
+import gzip
 import json
 import logging
+import os
+import time
+from datetime import datetime
+from typing import List
 
-from fastapi import FastAPI, HTTPException, Response
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from marketplace_standard_app_api.models.transformation import (
     TransformationCreateResponse,
     TransformationId,
-    TransformationListResponse,
-    TransformationModel,
-    TransformationStateResponse,
-    TransformationUpdateModel,
-    TransformationUpdateResponse,
 )
 from marketplace_standard_app_api.routers import object_storage
 
-from models.transformation import TransformationInput
+from models.transformation import (
+    FrameListResponse,
+    PreviewKind,
+    PreviewPendingResponse,
+    ProgressResponse,
+    SimulationListResponse,
+    SimulationModel,
+    SimulationState,
+    SimulationStateResponse,
+    SimulationUpdateModel,
+    SimulationUpdateResponse,
+    SweepCreateResponse,
+    SweepInput,
+    SweepModel,
+    SweepUpdateResponse,
+    TransformationInput,
+)
+from simulation_controller.log_capture import read_lines, tail_offset
+from simulation_controller.metrics import (
+    REQUEST_SECONDS,
+    init_metrics,
+    render,
+    stage,
+)
 from simulation_controller.simulation_manager import (
     SimulationManager,
     mappings,
 )
+from simulation_controller.storage import is_compressed
 
 app = FastAPI()
 
+# Size of the chunks in which files are streamed to the client
+CHUNK_SIZE = 1024 * 1024
+
+# Media types of the result formats, by the name used by the controller
+RESULT_MEDIA_TYPES = {
+    "json": "application/json",
+    "npy": "application/x-npy",
+}
+
+# Media types of the previews
+PREVIEW_MEDIA_TYPES = {
+    PreviewKind.THUMBNAIL: "image/png",
+    PreviewKind.ANIMATION: "image/gif",
+}
+
+# Seconds after which clients should ask again for a preview being rendered
+PREVIEW_RETRY_AFTER = 2
+
+# Seconds between two reads of a followed log
+LOG_POLL_INTERVAL = 1.0
+
+# States in which a simulation may still write to its log
+ACTIVE_STATES = (
+    SimulationState.PREPARING,
+    SimulationState.QUEUED,
+    SimulationState.RUNNING,
+)
+
+init_metrics()
 simulation_manager = SimulationManager()
 
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Record the latency of every request, until the response headers."""
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    REQUEST_SECONDS.labels(
+        request.method,
+        getattr(route, "path", "unmatched"),
+        str(response.status_code),
+    ).observe(time.perf_counter() - start)
+    return response
+
+
 @app.get(
     "/heartbeat", operation_id="heartbeat", summary="Check if app is alive"
 )
@@ -33,13 +103,20 @@ async def heartbeat():
     return "SimPARTIX app up and running"
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Metrics of all processes of the app, in the Prometheus format."""
+    content, media_type = render()
+    return Response(content, media_type=media_type)
+
+
 @app.post(
     "/transformations",
     operation_id="newTransformation",
     summary="Create a new transformation",
     response_model=TransformationCreateResponse,
 )
-async def new_simulation(
+def new_simulation(
     payload: TransformationInput,
 ) -> TransformationCreateResponse:
     id = simulation_manager.create_simulation(payload)
@@ -49,7 +126,7 @@ async def new_simulation(
 @app.get(
     "/transformations/{transformation_id}",
     summary="Get a transformation",
-    response_model=TransformationModel,
+    response_model=SimulationModel,
     operation_id="getTransformation",
     responses={
         404: {"description": "Not Found."},
@@ -68,28 +145,48 @@ def get_simulation(transformation_id: TransformationId):
 @app.get(
     "/transformations",
     summary="Get all simulations.",
-    response_model=TransformationListResponse,
+    response_model=SimulationListResponse,
     operation_id="getTransformationList",
+    responses={
+        400: {"description": "Invalid cursor"},
+    },
 )
-def get_simulations():
-    try:
-        items: list = simulation_manager.get_simulations()
+def get_simulations(
+    state: SimulationState = None,
+    created_after: datetime = None,
+    created_before: datetime = None,
+    cursor: str = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """List the simulations, oldest first, one page at a time.
 
-        logging.info(f"simulations: {items}")
-        return {"items": items}
+    Pass the `next_cursor` of a page as `cursor` to get the next one.
+    """
+    try:
+        items, next_cursor = simulation_manager.get_simulations(
+            state,
+            created_after.timestamp() if created_after else None,
+            created_before.timestamp() if created_before else None,
+            cursor,
+            limit,
+        )
+        logging.debug(f"Listing {len(items)} simulations.")
+        return {"items": items, "next_cursor": next_cursor}
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         msg = (
             "Unexpected error while fetching the list of simulations. "
             f"Error message: {e}"
         )
         logging.error(msg)
-        return Response(msg, status=400)
+        raise HTTPException(status_code=400, detail=msg)
 
 
 @app.patch(
     "/transformations/{transformation_id}",
     summary="Update the state of the simulation.",
-    response_model=TransformationUpdateResponse,
+    response_model=SimulationUpdateResponse,
     operation_id="updateTransformation",
     responses={
         404: {"description": "Not Found."},
@@ -98,12 +195,16 @@ def get_simulations():
     },
 )
 def update_simulation_state(
-    transformation_id: TransformationId, payload: TransformationUpdateModel
-) -> TransformationUpdateResponse:
+    transformation_id: TransformationId,
+    payload: SimulationUpdateModel,
+    priority: int = 0,
+) -> SimulationUpdateResponse:
     state = payload.state
     try:
         if state == "RUNNING":
-            simulation_manager.run_simulation(str(transformation_id))
+            simulation_manager.run_simulation(str(transformation_id), priority)
+        elif state == "PAUSED":
+            simulation_manager.pause_simulation(str(transformation_id))
         elif state == "STOPPED":
             simulation_manager.stop_simulation(str(transformation_id))
         else:
@@ -130,7 +231,7 @@ def update_simulation_state(
 @app.get(
     "/transformations/{transformation_id}/state",
     summary="Get the state of the simulation.",
-    response_model=TransformationStateResponse,
+    response_model=SimulationStateResponse,
     operation_id="getTransformationState",
     responses={
         404: {"description": "Unknown simulation"},
@@ -139,18 +240,35 @@ def update_simulation_state(
 )
 def get_simulation_state(
     transformation_id: TransformationId,
-) -> TransformationStateResponse:
+) -> SimulationStateResponse:
     """Get the state of a simulation.
 
     Args:
         transformation_id (TransformationId): ID of the simulation
 
     Returns:
-        TransformationStateResponse: The state of the simulation.
+        SimulationStateResponse: The state of the simulation, its
+            position in the run queue if it is QUEUED, the error message
+            if it FAILED, and the fraction of the powder bed covered by
+            the packed spheres, which is lower than `phi` when the packing
+            cannot reach it.
     """
     try:
         state = simulation_manager.get_simulation_state(str(transformation_id))
-        return {"id": transformation_id, "state": state}
+        queue_position = simulation_manager.get_queue_position(
+            str(transformation_id)
+        )
+        detail = simulation_manager.get_simulation_error(
+            str(transformation_id)
+        )
+        packed_phi = simulation_manager.get_packed_phi(str(transformation_id))
+        return {
+            "id": transformation_id,
+            "state": state,
+            "queue_position": queue_position,
+            "detail": detail,
+            "packed_phi": packed_phi,
+        }
 
     except KeyError:
         raise HTTPException(status_code=404, detail="Simulation not found")
@@ -162,6 +280,207 @@ def get_simulation_state(
         raise HTTPException(status_code=400, detail=msg)
 
 
+@app.get(
+    "/transformations/{transformation_id}/frames",
+    summary="List the output frames available so far.",
+    response_model=FrameListResponse,
+    operation_id="getTransformationFrames",
+    responses={
+        404: {"description": "Unknown simulation"},
+    },
+)
+def get_simulation_frames(
+    transformation_id: TransformationId,
+) -> FrameListResponse:
+    """List the output frames of a simulation converted so far.
+
+    Frames are converted while the simulation is running, so partial
+    results are available before the simulation is COMPLETED.
+    """
+    try:
+        frames = simulation_manager.get_simulation_frames(
+            str(transformation_id)
+        )
+        return {"id": transformation_id, "frames": frames}
+    except KeyError as ke:
+        raise HTTPException(status_code=404, detail=str(ke))
+
+
+@app.get(
+    "/transformations/{transformation_id}/frames/{frame}",
+    summary="Get the output of a single frame.",
+    operation_id="getTransformationFrame",
+    responses={
+        404: {"description": "Unknown simulation or frame"},
+    },
+)
+def get_simulation_frame(transformation_id: TransformationId, frame: int):
+    try:
+        return simulation_manager.get_simulation_frame(
+            str(transformation_id), frame
+        )
+    except KeyError as ke:
+        raise HTTPException(status_code=404, detail=str(ke))
+
+
+@app.get(
+    "/transformations/{transformation_id}/preview",
+    summary="Get a preview image or animation of the simulation.",
+    operation_id="getTransformationPreview",
+    responses={
+        200: {"content": {"image/png": {}, "image/gif": {}}},
+        202: {
+            "model": PreviewPendingResponse,
+            "description": "The preview is being rendered",
+        },
+        404: {"description": "Unknown simulation or frame"},
+        409: {"description": "No output frame available yet"},
+    },
+)
+def get_simulation_preview(
+    transformation_id: TransformationId,
+    request: Request,
+    kind: PreviewKind = PreviewKind.THUMBNAIL,
+    frame: int = None,
+):
+    """Get a PNG thumbnail of the latest output frame, a GIF animation of
+    all frames, or a PNG image of the frame given by `frame`, showing the
+    temperature.
+
+    Previews are rendered in the background from the converted frames and
+    cached. Until a preview is ready, the response is 202 with a
+    `Retry-After` header. Once more frames are converted, the previous
+    preview is returned while the new one is rendered.
+    """
+    try:
+        path = simulation_manager.get_simulation_preview(
+            str(transformation_id), kind, frame
+        )
+    except KeyError as ke:
+        raise HTTPException(status_code=404, detail=str(ke))
+    except RuntimeError as re:
+        raise HTTPException(status_code=409, detail=str(re))
+    if path is None:
+        return JSONResponse(
+            {
+                "id": str(transformation_id),
+                "detail": "The preview is being rendered.",
+            },
+            status_code=202,
+            headers={"Retry-After": str(PREVIEW_RETRY_AFTER)},
+        )
+    return _stream_file(
+        path,
+        PREVIEW_MEDIA_TYPES[
+            PreviewKind.THUMBNAIL if frame is not None else kind
+        ],
+        request.headers.get("range"),
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.get(
+    "/transformations/{transformation_id}/progress",
+    summary="Get the progress of the simulation.",
+    response_model=ProgressResponse,
+    operation_id="getTransformationProgress",
+    responses={
+        404: {"description": "Unknown simulation"},
+        400: {"description": "Error estimating the progress"},
+    },
+)
+def get_simulation_progress(
+    transformation_id: TransformationId,
+) -> ProgressResponse:
+    """Get the progress of a simulation.
+
+    The fraction done is the simulated time of the latest output frame
+    relative to the end time of the run. While the simulation is RUNNING,
+    the throughput (simulated seconds per wall-clock second) and the
+    estimated completion time are given as well.
+    """
+    try:
+        progress = simulation_manager.get_simulation_progress(
+            str(transformation_id)
+        )
+        return {"id": transformation_id, **progress}
+    except KeyError as ke:
+        raise HTTPException(status_code=404, detail=str(ke))
+    except Exception as e:
+        msg = (
+            "Unexpected error while estimating the progress of simulation "
+            f"{transformation_id}. Error message: {e}"
+        )
+        logging.error(msg)
+        raise HTTPException(status_code=400, detail=msg)
+
+
+async def _log_events(id: str, path: str, offset: int, follow: bool):
+    """Server-Sent Events with the lines of a log written after `offset`.
+
+    Each event carries the offset after its line as id, so that clients
+    resume where they left off. An `end` event is sent once the simulation
+    is no longer active. Carriage returns, which end a line in SSE, start a
+    new data line of the event.
+    """
+    while True:
+        lines = await run_in_threadpool(read_lines, path, offset)
+        for offset, line in lines:
+            data = "".join(f"data: {part}\n" for part in line.split("\r"))
+            yield f"id: {offset}\n{data}\n"
+        if lines:
+            continue
+        try:
+            state = await run_in_threadpool(
+                simulation_manager.get_simulation_state, id
+            )
+        except KeyError:
+            state = None
+        if not follow or state not in ACTIVE_STATES:
+            yield f"event: end\ndata: {getattr(state, 'value', state)}\n\n"
+            return
+        await asyncio.sleep(LOG_POLL_INTERVAL)
+
+
+@app.get(
+    "/transformations/{transformation_id}/logs",
+    summary="Follow the SimPARTIX log of the simulation.",
+    operation_id="getTransformationLogs",
+    responses={
+        200: {"content": {"text/event-stream": {}}},
+        404: {"description": "Unknown simulation or no log"},
+    },
+)
+def get_simulation_logs(
+    transformation_id: TransformationId,
+    request: Request,
+    lines: int = Query(100, ge=0),
+    follow: bool = True,
+):
+    """Stream the log of a simulation as Server-Sent Events.
+
+    The last `lines` lines are sent first, then new lines as SimPARTIX
+    writes them, until the run ends. Reconnecting clients sending
+    `Last-Event-ID` get the lines after that event.
+    """
+    try:
+        path = simulation_manager.get_simulation_log_path(
+            str(transformation_id)
+        )
+    except KeyError as ke:
+        raise HTTPException(status_code=404, detail=str(ke))
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        offset = int(last_event_id)
+    else:
+        offset = tail_offset(path, lines)
+    return StreamingResponse(
+        _log_events(str(transformation_id), path, offset, follow),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
 @app.delete(
     "/transformations/{transformation_id}",
     summary="Delete a transformation",
@@ -190,20 +509,340 @@ def delete_simulation(transformation_id: TransformationId):
         raise HTTPException(status_code=400, detail=msg)
 
 
+@app.post(
+    "/sweeps",
+    operation_id="newSweep",
+    summary="Create the transformations of a parameter sweep",
+    response_model=SweepCreateResponse,
+)
+def new_sweep(payload: SweepInput) -> SweepCreateResponse:
+    """Create one simulation per member of a sweep, and run them all if
+    `run` is set.
+
+    Members are given either as `axes`, mapping parameters to the values
+    to sweep over, whose cartesian product is applied to `base`, or as a
+    list of inputs in `members`.
+    """
+    return simulation_manager.create_sweep(
+        payload.members, payload.run, payload.priority
+    )
+
+
+@app.get(
+    "/sweeps/{sweep_id}",
+    summary="Get the state of a parameter sweep and its members",
+    response_model=SweepModel,
+    operation_id="getSweep",
+    responses={
+        404: {"description": "Unknown sweep"},
+    },
+)
+def get_sweep(sweep_id: TransformationId) -> SweepModel:
+    try:
+        return simulation_manager.get_sweep(str(sweep_id))
+    except KeyError as ke:
+        raise HTTPException(status_code=404, detail=str(ke))
+
+
+@app.patch(
+    "/sweeps/{sweep_id}",
+    summary="Run, pause or stop all members of a parameter sweep",
+    response_model=SweepUpdateResponse,
+    operation_id="updateSweep",
+    responses={
+        404: {"description": "Unknown sweep"},
+        400: {"description": "Error executing update operation"},
+    },
+)
+def update_sweep_state(
+    sweep_id: TransformationId,
+    payload: SimulationUpdateModel,
+    priority: int = 0,
+) -> SweepUpdateResponse:
+    """Run the members that are neither in progress nor completed, or pause
+    or stop the members in progress."""
+    state = payload.state
+    try:
+        if state == "RUNNING":
+            members = simulation_manager.run_sweep(str(sweep_id), priority)
+        elif state == "PAUSED":
+            members = simulation_manager.pause_sweep(str(sweep_id))
+        elif state == "STOPPED":
+            members = simulation_manager.stop_sweep(str(sweep_id))
+        else:
+            msg = f"{state} is not a supported state."
+            raise HTTPException(status_code=400, detail=msg)
+        return {"id": sweep_id, "state": state, "members": members}
+    except KeyError as ke:
+        raise HTTPException(status_code=404, detail=str(ke))
+
+
+def _read_chunks(path: str, start: int, length: int):
+    """Yield `length` bytes of a file from offset `start`, in chunks."""
+    with stage("results_stream"), open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _read_decompressed(path: str):
+    """Yield the content of a gzip-compressed file, in chunks."""
+    with stage("results_stream"), gzip.open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip-encoded content.
+
+    Args:
+        accept_encoding (str): value of the Accept-Encoding request header
+
+    Returns:
+        bool: whether gzip, or any encoding, is accepted
+    """
+    qualities = {}
+    for item in (accept_encoding or "").split(","):
+        coding, *parameters = item.strip().split(";")
+        quality = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+def _stream_file(
+    path: str, media_type: str, range_header: str = None, headers=None
+) -> Response:
+    """Stream a file, honouring a single-range HTTP Range header.
+
+    Args:
+        path (str): file to send
+        media_type (str): content type of the response
+        range_header (str): value of the Range request header, if any
+        headers (dict): additional response headers
+
+    Raises:
+        HTTPException: if the requested range cannot be satisfied
+
+    Returns:
+        Response: full (200) or partial (206) streaming response
+    """
+    size = os.path.getsize(path)
+    headers = {**(headers or {}), "Accept-Ranges": "bytes"}
+    start, end = 0, size - 1
+    status_code = 200
+    unit, _, byte_range = (range_header or "").partition("=")
+    first, _, last = byte_range.strip().partition("-")
+    is_range = (
+        unit.strip() == "bytes"
+        and (first or last)
+        and (not first or first.isdigit())
+        and (not last or last.isdigit())
+    )
+    if is_range:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start = max(size - int(last), 0)
+        if start > end:
+            raise HTTPException(
+                status_code=416,
+                detail="Requested range not satisfiable",
+                headers={"Content-Range": f"bytes */{size}"},
+            )
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        _read_chunks(path, start, end - start + 1),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+def _negotiate_format(accept: str) -> str:
+    """Pick the result format preferred by an Accept header.
+
+    Args:
+        accept (str): value of the Accept request header
+
+    Returns:
+        str: "json" or "npy", JSON if nothing else is acceptable
+    """
+    preferences = []
+    for item in (accept or "").split(","):
+        media_type, *parameters = item.strip().split(";")
+        quality = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        preferences.append((quality, media_type.strip()))
+    for quality, media_type in sorted(preferences, reverse=True):
+        if quality <= 0:
+            break
+        for format, format_media_type in RESULT_MEDIA_TYPES.items():
+            if media_type == format_media_type:
+                return format
+        if media_type in ("*/*", "application/*"):
+            break
+    return "json"
+
+
+def _query_results(
+    id: str,
+    format: str,
+    fields: list,
+    frames: str,
+    x: str,
+    z: str,
+    stride: int,
+) -> Response:
+    """Answer a partial result query, see `get_results`."""
+    if format == "npy" and len(fields) != 1:
+        raise HTTPException(
+            status_code=400,
+            detail="Exactly one field is required for the npy format.",
+        )
+    try:
+        with stage("results_query"):
+            result = simulation_manager.query_simulation_output(
+                id, fields, frames, x, z, stride
+            )
+    except KeyError as ke:
+        raise HTTPException(status_code=404, detail=str(ke))
+    except (RuntimeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"x-semantic-mappings": "SimpartixOutput", "Vary": "Accept"}
+    if format == "npy":
+        from simulation_controller.pyramid import to_npy
+
+        headers["X-Cells-X"] = ":".join(map(str, result["x"]))
+        headers["X-Cells-Z"] = ":".join(map(str, result["z"]))
+        return Response(
+            to_npy(result[fields[0]]),
+            media_type=RESULT_MEDIA_TYPES["npy"],
+            headers=headers,
+        )
+    content = {"id": id}
+    for name, values in result.items():
+        if name in ("x", "z"):
+            start, stop, step = values
+            content[name] = {"start": start, "stop": stop, "step": step}
+        else:
+            content[name] = (
+                values.tolist() if hasattr(values, "tolist") else values
+            )
+    return JSONResponse(content, headers=headers)
+
+
 @app.get(
     "/results",
     summary="Get a simulation's result",
     operation_id="getDataset",
-    responses={200: {"content": {"vnd.sintef.dlite+json"}}},
+    responses={
+        200: {
+            "content": {
+                "vnd.sintef.dlite+json": {},
+                RESULT_MEDIA_TYPES["npy"]: {},
+            }
+        },
+        206: {"description": "Partial content of the requested range"},
+        404: {"description": "Unknown simulation"},
+        400: {"description": "Result not available"},
+        416: {"description": "Requested range not satisfiable"},
+    },
 )
 def get_results(
     collection_name: object_storage.CollectionName,
     dataset_name: object_storage.DatasetName,
-    response: Response,
+    request: Request,
+    field: List[str] = Query(None),
+    frames: str = Query(None, example="10:20:2"),
+    x: str = Query(None, example="0:64"),
+    z: str = Query(None, example="8:24"),
+    stride: int = Query(1, ge=1),
 ):
-    json_payload = simulation_manager.get_simulation_output(str(dataset_name))
-    response.headers["x-semantic-mappings"] = "SimpartixOutput"
-    return json_payload
+    """Get the result of a simulation.
+
+    The DLite instance is returned as JSON by default. Clients accepting
+    `application/x-npy` get the NumPy array of the property given by
+    `field` instead, sent as stored on disk.
+
+    Compressed results are sent as stored, with `Content-Encoding: gzip`,
+    to clients accepting gzip, and decompressed for the others.
+
+    Part of the result is returned when any of `frames` (`start:stop:step`),
+    `x` or `z` (`start:stop`, in cells of the output grid) or `stride` is
+    given, or `field` is given for JSON. `stride`, a power of two, coarsens
+    the grid, e.g. 4 returns cells 4 times as large, with averaged
+    temperatures. The JSON object holds the frame indices and times, the
+    returned cells in x and z and the requested fields, all fields by
+    default. The NumPy array holds the single requested field, with the
+    returned cells in the `X-Cells-X` and `X-Cells-Z` headers.
+    """
+    format = _negotiate_format(request.headers.get("accept"))
+    fields = field or []
+    if (
+        frames is not None
+        or x is not None
+        or z is not None
+        or stride != 1
+        or (format == "json" and fields)
+    ):
+        return _query_results(
+            str(dataset_name), format, fields, frames, x, z, stride
+        )
+    if format == "npy" and len(fields) != 1:
+        raise HTTPException(
+            status_code=400,
+            detail="Exactly one field is required for the npy format.",
+        )
+    try:
+        path = simulation_manager.get_simulation_output_path(
+            str(dataset_name), format, fields[0] if fields else None
+        )
+    except KeyError as ke:
+        raise HTTPException(status_code=404, detail=str(ke))
+    except (RuntimeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {
+        "x-semantic-mappings": "SimpartixOutput",
+        "Vary": "Accept, Accept-Encoding",
+    }
+    if is_compressed(path):
+        if not _accepts_gzip(request.headers.get("accept-encoding")):
+            # Ranges of the decompressed content are not supported
+            return StreamingResponse(
+                _read_decompressed(path),
+                media_type=RESULT_MEDIA_TYPES[format],
+                headers=headers,
+            )
+        headers["Content-Encoding"] = "gzip"
+    return _stream_file(
+        path,
+        RESULT_MEDIA_TYPES[format],
+        request.headers.get("range"),
+        headers=headers,
+    )
 
 
 @app.get(
@@ -0,0 +1,369 @@
+"""Benchmarks of the SimPARTIX app.
+
+The suite runs the app in-process against a temporary simulations folder,
+with the stand-in solver of `benchmarks/bin` and synthetic output files.
+The results are compared with a stored baseline, which is required, and the
+run fails if a benchmark regressed by more than the tolerance::
+
+    python -m benchmarks.run                    # compare with the baseline
+    python -m benchmarks.run --update-baseline  # record a new baseline
+
+Benchmarks using ProPARTIX are skipped when it is not installed, and the
+simulations are then postprocessed with the direct engine.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCHMARKS_PATH, "baseline.json")
+
+# Grid of the mapped output, 500 x 90 um at a resolution of 3.6 um
+OUTPUT_GRID = (139, 25)
+
+
+def _has_propartix() -> bool:
+    try:
+        import propartix  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _fake_input_files(foldername: str, simulation_input) -> None:
+    """Input of the stand-in solver, used without ProPARTIX."""
+    inputPath = os.path.join(foldername, "input")
+    os.makedirs(inputPath, exist_ok=True)
+    with open(os.path.join(inputPath, "simulation.conf"), "w") as f:
+        f.write("startTime = 0.0\nendTime = 1.0e-03\n")
+
+
+def _result(value: float, unit: str, better: str = "lower") -> dict:
+    return {"value": value, "unit": unit, "better": better}
+
+
+def bench_input_creation(workdir: str, repeat: int) -> dict:
+    """Time the generation of the input files of a simulation."""
+    if not _has_propartix():
+        print("input_creation: skipped, ProPARTIX is not installed")
+        return {}
+    from models.transformation import TransformationInput
+    from simulation_controller.propartix_files_creation import (
+        generate_input_files,
+    )
+
+    durations = []
+    for seed in range(repeat):
+        path = os.path.join(workdir, "input_creation", str(seed))
+        os.makedirs(path)
+        start = time.perf_counter()
+        generate_input_files(path, TransformationInput(seed=seed))
+        durations.append(time.perf_counter() - start)
+    return {"input_creation": _result(statistics.median(durations), "s")}
+
+
+def bench_postprocessing(workdir: str, particles: int, frames: int) -> dict:
+    """Time the mapping of synthetic frames onto the output grid."""
+    from benchmarks.synthetic import BOX_LOWER, BOX_UPPER, write_h5part
+    from simulation_controller.grid_mapping import map_frames
+
+    basePath = os.path.join(workdir, "postprocessing")
+    output_path = os.path.join(basePath, "output", "output.h5part")
+    os.makedirs(os.path.dirname(output_path))
+    write_h5part(output_path, particles, frames)
+
+    results = {}
+    start = time.perf_counter()
+    map_frames(output_path, list(range(frames)), BOX_LOWER, BOX_UPPER)
+    results["postprocessing_direct_per_frame"] = _result(
+        (time.perf_counter() - start) / frames, "s"
+    )
+    if _has_propartix():
+        from simulation_controller import postprocessing
+
+        postprocessing.POSTPROCESSING_ENGINE = "vtk"
+        start = time.perf_counter()
+        postprocessing.convert_frames(basePath, list(range(frames)))
+        results["postprocessing_vtk_per_frame"] = _result(
+            (time.perf_counter() - start) / frames, "s"
+        )
+    else:
+        print("postprocessing_vtk: skipped, ProPARTIX is not installed")
+    return results
+
+
+# Imports the app and answers `/heartbeat` in a fresh interpreter, printing
+# the elapsed time
+COLD_START_SCRIPT = """
+import time
+
+start = time.perf_counter()
+from fastapi.testclient import TestClient
+
+import app
+
+TestClient(app.app).get("/heartbeat").raise_for_status()
+print(time.perf_counter() - start)
+"""
+
+
+def bench_cold_start(workdir: str, repeat: int) -> dict:
+    """Time from starting the app to its first `/heartbeat` answer."""
+    times = []
+    for i in range(repeat):
+        path = os.path.join(workdir, f"cold_start_{i}")
+        env = {
+            **os.environ,
+            "SIMPARTIX_SIMULATIONS_PATH": path,
+            "SIMPARTIX_REGISTRY_PATH": os.path.join(path, "registry.sqlite"),
+        }
+        output = subprocess.run(
+            [sys.executable, "-c", COLD_START_SCRIPT],
+            cwd=os.path.dirname(BENCHMARKS_PATH),
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        times.append(float(output.split()[-1]))
+    return {"cold_start": _result(statistics.median(times), "s")}
+
+
+def bench_results(client, manager, frames: int, repeat: int) -> dict:
+    """Time `/results` and measure its memory for a completed simulation,
+    in full and for a window of a few frames on a coarser grid."""
+    import numpy as np
+
+    from models.transformation import SimulationState, TransformationInput
+    from simulation_controller.simulation import OutputStatus, Simulation
+
+    rng = np.random.default_rng(0)
+    shape = (frames,) + OUTPUT_GRID
+    result = {
+        "elapsed_time": np.linspace(0, 1.0e-3, frames),
+        "Temperature_SPH": rng.uniform(300, 3000, shape),
+        "Group": rng.integers(0, 200, shape),
+        "StateOfMatter_SPH": rng.integers(0, 2, shape).astype(float),
+    }
+    simulation = Simulation(TransformationInput())
+    simulation.owner = manager.worker_id
+    os.makedirs(simulation.simulationPath)
+    simulation._save_output = lambda: None
+    simulation._save_arrays(result)
+    simulation._save_dlite(result)
+    simulation._save_pyramid(result)
+    simulation.output_status = OutputStatus.READY
+    simulation.status = SimulationState.COMPLETED
+    manager._add_simulation(simulation)
+
+    results = {}
+    for format, headers, params in (
+        ("json", {}, {}),
+        ("npy", {"Accept": "application/x-npy"}, {"field": "temperature"}),
+        ("query", {}, {"frames": "-4:", "x": "32:96", "stride": 4}),
+    ):
+        params = {
+            "collection_name": "simulations",
+            "dataset_name": simulation.id,
+            **params,
+        }
+        durations = []
+        tracemalloc.start()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get("/results", params=params, headers=headers)
+            durations.append(time.perf_counter() - start)
+            response.raise_for_status()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[f"results_{format}_latency"] = _result(
+            statistics.median(durations), "s"
+        )
+        results[f"results_{format}_peak_memory"] = _result(peak / 2**20, "MiB")
+    return results
+
+
+def bench_api_throughput(
+    client, jobs: int, clients: int, timeout: float
+) -> dict:
+    """Serve state and list requests while jobs run with the stand-in
+    solver."""
+    ids = [
+        client.post("/transformations", json={}).json()["id"]
+        for _ in range(jobs)
+    ]
+    start = time.perf_counter()
+    for id in ids:
+        client.patch(f"/transformations/{id}", json={"state": "RUNNING"})
+
+    done = threading.Event()
+    latencies = []
+
+    def _poll(worker: int):
+        i = worker
+        while not done.is_set():
+            request_start = time.perf_counter()
+            if i % 2:
+                client.get("/transformations", params={"limit": 100})
+            else:
+                client.get(f"/transformations/{ids[i % jobs]}/state")
+            latencies.append(time.perf_counter() - request_start)
+            i += 1
+
+    with ThreadPoolExecutor(clients) as executor:
+        for worker in range(clients):
+            executor.submit(_poll, worker)
+        while time.perf_counter() - start < timeout:
+            states = [
+                client.get(f"/transformations/{id}/state").json()["state"]
+                for id in ids
+            ]
+            if all(state in ("COMPLETED", "FAILED") for state in states):
+                break
+            time.sleep(0.5)
+        wall_time = time.perf_counter() - start
+        done.set()
+    if any(state != "COMPLETED" for state in states):
+        raise RuntimeError(f"Jobs did not complete: {states}")
+    latencies.sort()
+    return {
+        "api_requests_per_second": _result(
+            len(latencies) / wall_time, "1/s", "higher"
+        ),
+        "api_p95_latency": _result(
+            latencies[int(0.95 * (len(latencies) - 1))], "s"
+        ),
+        "jobs_wall_time": _result(wall_time, "s"),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """List the benchmarks that regressed compared to the baseline.
+
+    Args:
+        results (dict): results of this run
+        baseline (dict): stored results
+        tolerance (float): allowed relative change
+
+    Returns:
+        list: names of the regressed benchmarks
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        reference = baseline[name]["value"]
+        if result["better"] == "lower":
+            regressed = result["value"] > reference * (1 + tolerance)
+        else:
+            regressed = result["value"] < reference * (1 - tolerance)
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmarks of the SimPARTIX app."
+    )
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed relative regression, default 0.25",
+    )
+    parser.add_argument("--output", help="write the results to this file")
+    parser.add_argument("--particles", type=int, default=20000)
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+    if not args.update_baseline and not os.path.isfile(args.baseline):
+        parser.error(
+            f"no baseline at {args.baseline}, record one on this machine "
+            "with --update-baseline"
+        )
+
+    workdir = tempfile.mkdtemp(prefix="simpartix_benchmarks_")
+    os.environ["SIMPARTIX_SIMULATIONS_PATH"] = os.path.join(
+        workdir, "simulations"
+    )
+    os.environ["SIMPARTIX_REGISTRY_PATH"] = os.path.join(
+        workdir, "simulations", "registry.sqlite"
+    )
+    os.environ["SIMPARTIX_INPUT_CACHE_BYTES"] = "0"
+    os.environ["SIMPARTIX_FAKE_PARTICLES"] = str(args.particles)
+    os.environ["SIMPARTIX_FAKE_FRAMES"] = str(args.frames)
+    if not _has_propartix():
+        os.environ["SIMPARTIX_POSTPROCESSING_ENGINE"] = "direct"
+    try:
+        results = bench_cold_start(workdir, args.repeat)
+
+        from fastapi.testclient import TestClient
+
+        import app
+        from simulation_controller import simulation
+
+        # The stand-in solver, with the interpreter of the benchmarks
+        simulation.SIMPARTIX_COMMAND = [
+            sys.executable,
+            os.path.join(BENCHMARKS_PATH, "bin", "SimPARTIX"),
+        ]
+        if not _has_propartix():
+            simulation.create_input_files = _fake_input_files
+        client = TestClient(app.app)
+
+        results.update(bench_input_creation(workdir, args.repeat))
+        results.update(
+            bench_postprocessing(workdir, args.particles, args.frames)
+        )
+        results.update(
+            bench_results(
+                client, app.simulation_manager, args.frames, args.repeat
+            )
+        )
+        results.update(
+            bench_api_throughput(client, args.jobs, args.clients, args.timeout)
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = {}
+    if not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for name, result in results.items():
+        reference = baseline.get(name, {}).get("value")
+        print(
+            f"{name:36} {result['value']:12.4g} {result['unit']:4}"
+            + ("" if reference is None else f" (baseline {reference:.4g})")
+            + (" REGRESSED" if name in regressions else "")
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}.")
+        return 0
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
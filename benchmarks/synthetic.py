@@ -0,0 +1,139 @@
+"""Synthetic SimPARTIX output for benchmarks.
+
+Writes H5Part files with the layout of `output/output.h5part`: one
+``Step#N`` group per frame with the particle positions and the mapped
+quantities, and the simulated time as ``Time`` attribute. A laser spot
+crosses the powder bed from left to right over the frames.
+"""
+
+import argparse
+
+import h5py
+import numpy as np
+
+# Extent of the 2D powder bed in x and z [m], as generated for the app
+BOX_LOWER = np.array([-250e-6, 0.0, 0.0])
+BOX_UPPER = np.array([250e-6, 0.0, 90e-6])
+
+AMBIENT_TEMPERATURE = 300.0
+PEAK_TEMPERATURE = 3000.0
+MELTING_TEMPERATURE = 1700.0
+SPOT_RADIUS = 40e-6
+
+
+def particle_positions(particles: int) -> np.ndarray:
+    """Positions of about `particles` particles on a lattice in the x-z
+    plane of the box.
+
+    Args:
+        particles (int): approximate number of particles
+
+    Returns:
+        np.ndarray: (N, 3) positions
+    """
+    extent = (BOX_UPPER - BOX_LOWER)[[0, 2]]
+    spacing = np.sqrt(extent.prod() / particles)
+    nx, nz = np.maximum(np.round(extent / spacing), 1).astype(int)
+    x = BOX_LOWER[0] + (np.arange(nx) + 0.5) * extent[0] / nx
+    z = BOX_LOWER[2] + (np.arange(nz) + 0.5) * extent[1] / nz
+    xx, zz = np.meshgrid(x, z, indexing="ij")
+    return np.column_stack((xx.ravel(), np.zeros(xx.size), zz.ravel())).astype(
+        np.float64
+    )
+
+
+def frame_quantities(positions: np.ndarray, progress: float) -> dict:
+    """Quantities of the particles with the laser at `progress` of the bed.
+
+    Args:
+        positions (np.ndarray): (N, 3) particle positions
+        progress (float): position of the laser, from 0 to 1
+
+    Returns:
+        dict: Temperature_SPH and StateOfMatter_SPH of the particles
+    """
+    spot = np.array(
+        [
+            BOX_LOWER[0] + progress * (BOX_UPPER[0] - BOX_LOWER[0]),
+            BOX_UPPER[2],
+        ]
+    )
+    distance = np.linalg.norm(positions[:, [0, 2]] - spot, axis=1)
+    temperature = AMBIENT_TEMPERATURE + (
+        PEAK_TEMPERATURE - AMBIENT_TEMPERATURE
+    ) * np.exp(-((distance / SPOT_RADIUS) ** 2))
+    return {
+        "Temperature_SPH": temperature,
+        "StateOfMatter_SPH": (temperature > MELTING_TEMPERATURE).astype(
+            np.float64
+        ),
+    }
+
+
+def write_frame(
+    f: h5py.File, frame: int, positions, group, time: float, progress: float
+) -> None:
+    """Append one frame to an open H5Part file.
+
+    Args:
+        f (h5py.File): file opened for writing
+        frame (int): index of the frame
+        positions (np.ndarray): (N, 3) particle positions
+        group (np.ndarray): group (powder particle) of each SPH particle
+        time (float): simulated time of the frame [s]
+        progress (float): position of the laser, from 0 to 1
+    """
+    step = f.create_group(f"Step#{frame}")
+    step.attrs["TimeStep"] = frame
+    step.attrs["Time"] = time
+    for i, name in enumerate("xyz"):
+        step[name] = positions[:, i]
+    step["id"] = np.arange(len(positions), dtype=np.int64)
+    step["Group"] = group
+    for name, values in frame_quantities(positions, progress).items():
+        step[name] = values
+
+
+def write_h5part(
+    path: str,
+    particles: int = 10000,
+    frames: int = 10,
+    end_time: float = 1.0e-3,
+    seed: int = 0,
+) -> None:
+    """Write a complete synthetic output file.
+
+    Args:
+        path (str): file to write
+        particles (int): approximate number of particles per frame
+        frames (int): number of frames
+        end_time (float): simulated time of the last frame [s]
+        seed (int): seed of the random particle groups
+    """
+    positions = particle_positions(particles)
+    group = np.random.default_rng(seed).integers(
+        0, 200, len(positions), dtype=np.int64
+    )
+    with h5py.File(path, "w") as f:
+        for frame in range(frames):
+            progress = frame / max(frames - 1, 1)
+            write_frame(
+                f, frame, positions, group, progress * end_time, progress
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("path", help="H5Part file to write")
+    parser.add_argument("--particles", type=int, default=10000)
+    parser.add_argument("--frames", type=int, default=10)
+    parser.add_argument("--end-time", type=float, default=1.0e-3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_h5part(
+        args.path, args.particles, args.frames, args.end_time, args.seed
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,59 @@
 """Definition of the additional required data models."""
 
-from pydantic import BaseModel, validator
+import itertools
+import math
+import os
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Literal, Optional
+
+from marketplace_standard_app_api.models.transformation import (
+    TransformationId,
+    TransformationListResponse,
+    TransformationModel,
+    TransformationStateResponse,
+)
+from pydantic import BaseModel, root_validator, validator
+
+# Maximum number of simulations created by one parameter sweep
+MAX_SWEEP_SIZE = int(os.environ.get("SIMPARTIX_MAX_SWEEP_SIZE", 1000))
+
+
+class SimulationState(str, Enum):
+    """States of a SimPARTIX simulation.
+
+    Superset of the MarketPlace ``TransformationState`` with the states that
+    only exist inside this app.
+    """
+
+    PREPARING = "PREPARING"
+    CREATED = "CREATED"
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    PAUSED = "PAUSED"
+    STOPPED = "STOPPED"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+
+
+class PackingBackend(str, Enum):
+    """Algorithm packing the powder bed.
+
+    ``propartix`` uses the rejection sampling of ProPARTIX, ``grid`` the
+    grid hash of `simulation_controller.packing`, which scales better to
+    dense beds and small spheres.
+    """
+
+    PROPARTIX = "propartix"
+    GRID = "grid"
+
+
+class PreviewKind(str, Enum):
+    """Preview of a simulation: a small image of its latest output frame,
+    or an animation of all its frames."""
+
+    THUMBNAIL = "thumbnail"
+    ANIMATION = "animation"
 
 
 class TransformationInput(BaseModel):
@@ -9,6 +62,10 @@ class TransformationInput(BaseModel):
     sphereDiameter: float = 30e-6
     phi: float = 0.7
     powderLayerHeight: float = 60e-6
+    # Random seed of the powder bed. Runs with an explicit seed are
+    # reproducible and their input files are cached.
+    seed: Optional[int] = None
+    packing: PackingBackend = PackingBackend.PROPARTIX
 
     @validator("sphereDiameter")
     def check_diameter(cls, v):
@@ -29,3 +86,141 @@ class TransformationInput(BaseModel):
                 "Powder layer height must be at least the sphere diameter."
             )
         return v
+
+
+class SweepInput(BaseModel):
+    """Parameter sweep, given either as `axes`, whose cartesian product is
+    applied to `base`, or as an explicit list of `members`.
+
+    After validation, `members` holds the inputs of all simulations of the
+    sweep, in the order of the axes.
+    """
+
+    base: TransformationInput = TransformationInput()
+    axes: Dict[str, List[Any]] = {}
+    members: List[TransformationInput] = []
+    # Run all members once their input files are ready
+    run: bool = False
+    priority: int = 0
+
+    @validator("axes")
+    def check_axes(cls, v):
+        unknown = sorted(set(v) - set(TransformationInput.__fields__))
+        if unknown:
+            raise ValueError(f"Unknown parameters: {', '.join(unknown)}.")
+        if not all(v.values()):
+            raise ValueError("Every axis needs at least one value.")
+        return v
+
+    @root_validator(skip_on_failure=True)
+    def expand_axes(cls, values):
+        axes, members = values["axes"], values["members"]
+        if bool(axes) == bool(members):
+            raise ValueError("Give either axes or members.")
+        size = (
+            math.prod(len(v) for v in axes.values()) if axes else len(members)
+        )
+        if size > MAX_SWEEP_SIZE:
+            raise ValueError(
+                f"The sweep has {size} members, at most {MAX_SWEEP_SIZE} "
+                "are allowed."
+            )
+        if axes:
+            base = values["base"].dict()
+            values["members"] = [
+                TransformationInput(**{**base, **dict(zip(axes, point))})
+                for point in itertools.product(*axes.values())
+            ]
+        return values
+
+
+# States that can be requested. A PAUSED simulation continues from its last
+# complete output frame when it is set to RUNNING again.
+UpdateSimulationStates = Literal[
+    SimulationState.RUNNING, SimulationState.PAUSED, SimulationState.STOPPED
+]
+
+
+class SimulationUpdateModel(BaseModel):
+    state: UpdateSimulationStates
+
+
+class SimulationUpdateResponse(BaseModel):
+    id: TransformationId
+    state: UpdateSimulationStates
+
+
+class SimulationModel(TransformationModel):
+    state: Optional[SimulationState] = None
+    created_at: Optional[datetime] = None
+
+
+class SimulationListResponse(TransformationListResponse):
+    items: List[SimulationModel]
+    # Cursor of the next page, None on the last page
+    next_cursor: Optional[str] = None
+
+
+class SimulationStateResponse(TransformationStateResponse):
+    state: SimulationState
+    queue_position: Optional[int] = None
+    detail: Optional[str] = None
+    # Fraction of the powder bed covered by the packed spheres, which is
+    # lower than `phi` when the packing cannot reach it
+    packed_phi: Optional[float] = None
+
+
+class FrameModel(BaseModel):
+    frame: int
+    elapsed_time: float
+
+
+class FrameListResponse(BaseModel):
+    id: TransformationId
+    frames: List[FrameModel]
+
+
+class ProgressResponse(BaseModel):
+    id: TransformationId
+    state: SimulationState
+    # Simulated time of the latest output frame and end time of the run [s]
+    simulated_time: Optional[float] = None
+    end_time: Optional[float] = None
+    # Fraction of the simulated time done, between 0 and 1
+    fraction: Optional[float] = None
+    # Simulated seconds per wall-clock second
+    throughput: Optional[float] = None
+    eta: Optional[datetime] = None
+
+
+class SweepCreateResponse(BaseModel):
+    id: TransformationId
+    members: List[TransformationId]
+
+
+class SweepMemberModel(SimulationModel):
+    detail: Optional[str] = None
+    # Whether `/results` serves the output of the member
+    result_ready: bool = False
+
+
+class SweepModel(BaseModel):
+    id: TransformationId
+    created_at: datetime
+    # State of the sweep as a whole, see `SimulationManager.get_sweep`
+    state: SimulationState
+    # Number of members in each state
+    counts: Dict[SimulationState, int]
+    members: List[SweepMemberModel]
+
+
+class SweepUpdateResponse(BaseModel):
+    id: TransformationId
+    state: SimulationState
+    # Members that were run or stopped
+    members: List[TransformationId]
+
+
+class PreviewPendingResponse(BaseModel):
+    id: TransformationId
+    detail: str
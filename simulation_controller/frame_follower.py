@@ -0,0 +1,121 @@
+"""Convert the output frames of running simulations as they are written."""
+
+import logging
+import os
+import threading
+import time
+
+FRAME_POLL_INTERVAL = float(
+    os.environ.get("SIMPARTIX_FRAME_POLL_INTERVAL", 10)
+)
+
+
+class FrameFollower:
+    """Watch the output files of running simulations from one thread.
+
+    Every `FRAME_POLL_INTERVAL` seconds the number of frames in each
+    followed `output/output.h5part`, or in `output/segment.h5part` for a
+    resumed run, is checked. All frames but the last one, which may still be
+    being written, are handed to the postprocessing pool.
+    """
+
+    def __init__(self, interval: float = FRAME_POLL_INTERVAL):
+        self.interval = interval
+        self._followed: dict = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def follow(self, basePath: str) -> None:
+        """Start converting the frames of a simulation as they land.
+
+        Args:
+            basePath (str): folder of the simulation
+        """
+        from simulation_controller.postprocessing import stored_frames
+
+        with self._lock:
+            self._followed[basePath] = {
+                "submitted": set(stored_frames(basePath)),
+                "futures": [],
+            }
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="frame_follower", daemon=True
+                )
+                self._thread.start()
+
+    def unfollow(self, basePath: str, wait: bool = False) -> None:
+        """Stop following a simulation.
+
+        Args:
+            basePath (str): folder of the simulation
+            wait (bool): wait for the conversions already submitted
+        """
+        with self._lock:
+            followed = self._followed.pop(basePath, None)
+        if followed is None or not wait:
+            return
+        for future in followed["futures"]:
+            try:
+                future.result()
+            except Exception as e:
+                logging.warning(
+                    f"Incremental conversion in '{basePath}' failed, the "
+                    f"frames are converted again. Error message: {e}"
+                )
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                followed = list(self._followed.items())
+            for basePath, state in followed:
+                try:
+                    self._check(basePath, state)
+                except Exception as e:
+                    logging.warning(
+                        f"Could not read the frames in '{basePath}'. "
+                        f"Error message: {e}"
+                    )
+
+    def _check(self, basePath: str, state: dict) -> None:
+        from simulation_controller.h5part import frame_count
+        from simulation_controller.postprocessing import submit_frames
+        from simulation_controller.restart import (
+            OUTPUT_FILENAME,
+            SEGMENT_FILENAME,
+        )
+
+        source, first, offset = OUTPUT_FILENAME, 0, 0
+        if os.path.isfile(os.path.join(basePath, SEGMENT_FILENAME)):
+            # The first frame of a segment repeats the last frame of the
+            # output, the others are appended to the output when it ends
+            if "offset" not in state:
+                state["offset"] = (
+                    frame_count(os.path.join(basePath, OUTPUT_FILENAME)) - 1
+                )
+            source, first, offset = SEGMENT_FILENAME, 1, state["offset"]
+        elif not os.path.isfile(os.path.join(basePath, OUTPUT_FILENAME)):
+            return
+        complete = frame_count(os.path.join(basePath, source)) - 1
+        new = [
+            i
+            for i in range(first, complete)
+            if offset + i not in state["submitted"]
+        ]
+        if not new:
+            return
+        with self._lock:
+            if basePath not in self._followed:
+                return
+            state["submitted"].update(offset + i for i in new)
+            state["futures"] = [
+                future for future in state["futures"] if not future.done()
+            ]
+            state["futures"].append(
+                submit_frames(basePath, new, source, offset)
+            )
+        logging.info(f"Converting frames {new} of '{source}' in '{basePath}'.")
+
+
+frame_follower = FrameFollower()
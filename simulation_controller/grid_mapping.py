@@ -0,0 +1,173 @@
+"""Map SimPARTIX particle data onto a regular grid, without VTK files.
+
+This is a vectorized alternative to the ``h5partToVtk``/``vtkToDlite`` round
+trip: particle data is read from the H5Part file with h5py and mapped in
+memory using k-d trees.
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from simulation_controller.h5part import open_file
+
+# Resolution of the output grid [m], as used for the MICRESS files
+RESOLUTION = 3.6e-6
+
+# Radius of the Shepard filter kernel, in units of the particle spacing
+KERNEL_RADIUS_FACTOR = 2.0
+
+# Value of cells without any particle in their neighbourhood
+DEFAULT_VALUE = -1
+
+# Quantities interpolated with the Shepard filter, and quantities taken from
+# the closest particle
+SHEPARD_QUANTITIES = ["Temperature_SPH"]
+CLOSEST_NEIGHBOR_QUANTITIES = ["Group", "StateOfMatter_SPH"]
+
+# MICRESS convention, as applied by the vtk engine (`isApplyMicressConvention`
+# of `h5partToVtk`): groups up to the substrate threshold are the substrate,
+# states of matter from the liquid threshold on are liquid
+MICRESS_SUBSTRATE_THRESHOLD = 0
+MICRESS_LIQUID_THRESHOLD = 1
+
+
+def grid_centers(lowerCorner, upperCorner, resolution: float = RESOLUTION):
+    """Centers of the cells of an equally spaced grid in the x-z plane.
+
+    Args:
+        lowerCorner (array): lower corner of the box, [x, y, z]
+        upperCorner (array): upper corner of the box, [x, y, z]
+        resolution (float): edge length of the cells
+
+    Returns:
+        tuple: shape of the grid (X, Z) and the (X * Z, 2) cell centers
+    """
+    lower = np.asarray(lowerCorner)[[0, 2]]
+    upper = np.asarray(upperCorner)[[0, 2]]
+    shape = np.maximum(np.round((upper - lower) / resolution), 1).astype(int)
+    axes = [
+        lower[i] + (np.arange(shape[i]) + 0.5) * resolution for i in range(2)
+    ]
+    x, z = np.meshgrid(*axes, indexing="ij")
+    return tuple(shape), np.column_stack((x.ravel(), z.ravel()))
+
+
+def _wendland(q: np.ndarray) -> np.ndarray:
+    """Wendland C2 kernel, up to normalization, for q = r / radius."""
+    return np.where(q < 1.0, (1.0 - q) ** 4 * (1.0 + 4.0 * q), 0.0)
+
+
+def apply_micress_convention(
+    result: dict,
+    substrate_threshold: float = MICRESS_SUBSTRATE_THRESHOLD,
+    liquid_threshold: float = MICRESS_LIQUID_THRESHOLD,
+) -> dict:
+    """Number the grains and phases of mapped cells as MICRESS does.
+
+    Liquid cells are grain 0 and phase 0, the solid substrate is grain 1,
+    the solid powder particles follow from grain 2 on, and all solid cells
+    are phase 1. Cells without particles keep `DEFAULT_VALUE`.
+
+    Args:
+        result (dict): mapped `Group` and `StateOfMatter_SPH` arrays,
+            modified in place
+        substrate_threshold (float): largest group of the substrate
+        liquid_threshold (float): smallest state of matter of the liquid
+
+    Returns:
+        dict: `result`
+    """
+    group = result["Group"]
+    state = result["StateOfMatter_SPH"]
+    covered = group != DEFAULT_VALUE
+    liquid = covered & (state >= liquid_threshold)
+    substrate = covered & ~liquid & (group <= substrate_threshold)
+    powder = covered & ~liquid & ~substrate
+    mapped_group = np.full_like(group, DEFAULT_VALUE)
+    mapped_group[liquid] = 0
+    mapped_group[substrate] = 1
+    mapped_group[powder] = group[powder] - substrate_threshold + 1
+    mapped_state = np.full_like(state, DEFAULT_VALUE)
+    mapped_state[liquid] = 0
+    mapped_state[substrate | powder] = 1
+    result["Group"] = mapped_group
+    result["StateOfMatter_SPH"] = mapped_state
+    return result
+
+
+def map_frame(step, shape, centers, grid_tree) -> dict:
+    """Map the particles of one H5Part step onto the grid.
+
+    Args:
+        step (h5py.Group): H5Part step with the particle datasets
+        shape (tuple): shape of the grid
+        centers (np.ndarray): cell centers, see `grid_centers`
+        grid_tree (scipy.spatial.cKDTree): k-d tree of the cell centers
+
+    Returns:
+        dict: mapped quantities, each an array of the grid shape, with the
+            MICRESS convention applied
+    """
+    positions = np.column_stack((step["x"][()], step["z"][()]))
+    tree = cKDTree(positions)
+    # Particle spacing, estimated from the nearest neighbour distances
+    spacing = np.median(tree.query(positions[:1000], k=2)[0][:, 1])
+    radius = KERNEL_RADIUS_FACTOR * spacing
+
+    distances = grid_tree.sparse_distance_matrix(
+        tree, radius, output_type="coo_matrix"
+    )
+    weights = distances.copy()
+    weights.data = _wendland(distances.data / radius)
+    weights = weights.tocsr()
+    norm = np.asarray(weights.sum(axis=1)).ravel()
+    covered = norm > 0
+
+    result = {}
+    for name in SHEPARD_QUANTITIES:
+        values = step[name][()]
+        mapped = np.full(len(centers), float(DEFAULT_VALUE))
+        weighted = weights @ values
+        mapped[covered] = weighted[covered] / norm[covered]
+        result[name] = mapped.reshape(shape)
+
+    _, closest = tree.query(centers, distance_upper_bound=radius)
+    found = closest < len(positions)
+    for name in CLOSEST_NEIGHBOR_QUANTITIES:
+        values = step[name][()]
+        mapped = np.full(len(centers), DEFAULT_VALUE, dtype=values.dtype)
+        mapped[found] = values[closest[found]]
+        result[name] = mapped.reshape(shape)
+    return apply_micress_convention(result)
+
+
+def map_frames(
+    h5partFilename: str,
+    frames: list,
+    lowerCorner,
+    upperCorner,
+    resolution: float = RESOLUTION,
+) -> dict:
+    """Map several frames of an H5Part file onto the grid.
+
+    Args:
+        h5partFilename (str): SimPARTIX output file
+        frames (list): indices of the frames to map
+        lowerCorner (array): lower corner of the mapped box
+        upperCorner (array): upper corner of the mapped box
+        resolution (float): edge length of the cells
+
+    Returns:
+        dict: list of mapped arrays per quantity, in the order of `frames`
+    """
+    shape, centers = grid_centers(lowerCorner, upperCorner, resolution)
+    grid_tree = cKDTree(centers)
+    result = {
+        name: [] for name in SHEPARD_QUANTITIES + CLOSEST_NEIGHBOR_QUANTITIES
+    }
+    with open_file(h5partFilename) as f:
+        for frame in frames:
+            mapped = map_frame(f[f"Step#{frame}"], shape, centers, grid_tree)
+            for name, values in mapped.items():
+                result[name].append(values)
+    return result
@@ -0,0 +1,87 @@
+"""Read the frames of SimPARTIX H5Part output files.
+
+Frames are counted and their times read from the ``Step#N`` groups and
+their ``Time`` attribute with h5py, so that the output of a running
+simulation can be read: SimPARTIX keeps the HDF5 file lock of its output
+until it exits. ProPARTIX, when it is installed, reads the times of files
+without a ``Time`` attribute and the box dimensions; without it, the box
+spanned by the particles is used, e.g. for the stand-in solver of the
+benchmarks.
+"""
+
+import h5py
+import numpy as np
+
+
+def _propartix():
+    try:
+        import propartix
+    except ImportError:
+        return None
+    return propartix
+
+
+def open_file(path: str) -> h5py.File:
+    """Open an H5Part file for reading, also while it is being written.
+
+    HDF5 file locking is disabled, the frames flushed by the writer are
+    readable and the last one may be incomplete.
+    """
+    return h5py.File(path, "r", locking=False)
+
+
+def step_names(f: h5py.File) -> list:
+    """Names of the frames of an open H5Part file, in frame order."""
+    return sorted(
+        (name for name in f if name.startswith("Step#")),
+        key=lambda name: int(name[len("Step#") :]),
+    )
+
+
+def frame_times(path: str):
+    """Simulated time of every frame of an H5Part file.
+
+    Args:
+        path (str): H5Part file
+
+    Returns:
+        np.ndarray: time of each frame [s]
+    """
+    with open_file(path) as f:
+        steps = [f[name] for name in step_names(f)]
+        if all("Time" in step.attrs for step in steps):
+            return np.array([float(step.attrs["Time"]) for step in steps])
+    px = _propartix()
+    if px is None:
+        raise KeyError(f"The frames of '{path}' have no 'Time' attribute.")
+    return px.getH5PartTime(filename=path, allFrames=True)
+
+
+def frame_count(path: str) -> int:
+    """Number of frames of an H5Part file, including one being written."""
+    with open_file(path) as f:
+        return len(step_names(f))
+
+
+def box_dimensions(path: str, frame: int = 0) -> tuple:
+    """Lower and upper corner of the simulation box of a frame.
+
+    Without ProPARTIX, the box spanned by the particles is returned.
+
+    Args:
+        path (str): H5Part file
+        frame (int): index of the frame
+
+    Returns:
+        tuple: lower and upper corner, [x, y, z] each
+    """
+    px = _propartix()
+    if px is not None:
+        lowerCorner, upperCorner = px.getH5PartBoxDimensions(
+            path, frame=frame
+        )[:2]
+        return lowerCorner, upperCorner
+    with open_file(path) as f:
+        step = f[step_names(f)[frame]]
+        positions = np.column_stack([step[axis][()] for axis in "xyz"])
+    return positions.min(axis=0), positions.max(axis=0)
@@ -0,0 +1,173 @@
+"""Content-addressed cache of generated simulation inputs."""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+
+from models.transformation import TransformationInput
+
+INPUT_CACHE_PATH = os.environ.get(
+    "SIMPARTIX_INPUT_CACHE_PATH", "/app/input_cache"
+)
+INPUT_CACHE_BYTES = int(
+    os.environ.get("SIMPARTIX_INPUT_CACHE_BYTES", 10 * 1024**3)
+)
+
+TEMPLATES_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "templates"
+)
+
+# ioctl request cloning a file on copy-on-write filesystems (linux/fs.h)
+FICLONE = 0x40049409
+
+
+def parameters_key(simulation_input: TransformationInput) -> str:
+    """Hash identifying the input files generated for a configuration.
+
+    The key covers the normalized parameters, including the random seed, and
+    the content of the templates, so that changing a template invalidates
+    the cached inputs.
+
+    Args:
+        simulation_input (TransformationInput): configuration of the run
+
+    Returns:
+        str: hexadecimal SHA-256 digest
+    """
+    # Defaults are not validated, so cast to the declared types to get the
+    # same key for e.g. `150` and `150.0`.
+    parameters = {}
+    for name, field in simulation_input.__fields__.items():
+        value = getattr(simulation_input, name)
+        parameters[name] = None if value is None else field.type_(value)
+    digest = hashlib.sha256()
+    digest.update(
+        json.dumps(parameters, sort_keys=True, separators=(",", ":")).encode()
+    )
+    for name in sorted(os.listdir(TEMPLATES_PATH)):
+        with open(os.path.join(TEMPLATES_PATH, name), "rb") as f:
+            digest.update(name.encode())
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def link_or_copy(source: str, target: str) -> None:
+    """Hard-link a file, falling back to a reflink and then a plain copy."""
+    try:
+        os.link(source, target)
+        return
+    except OSError:
+        pass
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            shutil.copyfileobj(src, dst)
+    shutil.copystat(source, target)
+
+
+def _directory_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+class InputCache:
+    """Store generated input directories once and link them into jobs.
+
+    Entries are directories named after `parameters_key`. They are evicted
+    in least recently used order once the cache exceeds `max_bytes`. The
+    cache may be shared by several processes, modifications are serialized
+    through a lock file.
+
+    Since entries are hard-linked into the simulation folders, input files
+    must never be modified in place.
+    """
+
+    def __init__(
+        self, path: str = INPUT_CACHE_PATH, max_bytes: int = INPUT_CACHE_BYTES
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        lock_file = open(os.path.join(self.path, ".lock"), "w")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def fetch(self, key: str, target: str, build) -> bool:
+        """Populate `target` with the cached input directory for `key`.
+
+        On a miss, `build(directory)` is called to generate the files, which
+        are then added to the cache.
+
+        Args:
+            key (str): key of the input, see `parameters_key`
+            target (str): directory to populate, created if missing
+            build (callable): generates the input files into a directory
+
+        Returns:
+            bool: whether the input was found in the cache
+        """
+        entry = os.path.join(self.path, key)
+        with self._lock():
+            hit = os.path.isdir(entry)
+            if hit:
+                os.utime(entry)
+        if not hit:
+            staging = os.path.join(self.path, f".tmp-{uuid.uuid4()}")
+            os.makedirs(staging)
+            try:
+                build(staging)
+                with self._lock():
+                    if os.path.isdir(entry):
+                        # Built concurrently by another process
+                        shutil.rmtree(staging)
+                    else:
+                        os.rename(staging, entry)
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+        os.makedirs(target, exist_ok=True)
+        for name in os.listdir(entry):
+            link_or_copy(os.path.join(entry, name), os.path.join(target, name))
+        if not hit:
+            self.evict()
+        logging.info(
+            f"Input cache {'hit' if hit else 'miss'} for key '{key}'."
+        )
+        return hit
+
+    def evict(self) -> None:
+        """Remove least recently used entries until within budget."""
+        with self._lock():
+            entries = []
+            for name in os.listdir(self.path):
+                entry = os.path.join(self.path, name)
+                if name.startswith(".") or not os.path.isdir(entry):
+                    continue
+                entries.append(
+                    (
+                        os.path.getmtime(entry),
+                        _directory_size(entry),
+                        entry,
+                    )
+                )
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+                logging.info(f"Input cache entry '{entry}' evicted.")
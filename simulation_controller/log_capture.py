@@ -0,0 +1,174 @@
+"""Per-simulation SimPARTIX log files, rotated by size."""
+
+import logging
+import os
+import shutil
+import threading
+import time
+
+LOG_MAX_BYTES = int(
+    os.environ.get("SIMPARTIX_LOG_MAX_BYTES", 10 * 1024 * 1024)
+)
+LOG_BACKUPS = int(os.environ.get("SIMPARTIX_LOG_BACKUPS", 3))
+
+# Seconds between two checks of the size of the followed logs
+ROTATION_INTERVAL = 5.0
+
+
+def log_path(basePath: str) -> str:
+    """Path of the SimPARTIX log of a simulation."""
+    return os.path.join(basePath, "logs", "simpartix.log")
+
+
+def open_log(basePath: str):
+    """Open the log of a simulation for appending.
+
+    The file is passed as stdout and stderr of SimPARTIX, so the solver
+    writes its output straight into it and never blocks on a pipe, also
+    while the app is down.
+
+    Args:
+        basePath (str): folder of the simulation
+
+    Returns:
+        file: log file opened in append mode
+    """
+    path = log_path(basePath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return open(path, "ab")
+
+
+def rotate(
+    path: str, max_bytes: int = LOG_MAX_BYTES, backups: int = LOG_BACKUPS
+):
+    """Rotate a log written by another process once it is too large.
+
+    The file is copied to `path.1` (older copies are shifted up to
+    `path.<backups>`) and truncated. As the writer appends, it carries on
+    at the start of the truncated file.
+
+    Args:
+        path (str): log file
+        max_bytes (int): size beyond which the file is rotated
+        backups (int): number of rotated files to keep
+    """
+    if os.path.getsize(path) <= max_bytes:
+        return
+    if backups > 0:
+        for i in range(backups - 1, 0, -1):
+            if os.path.isfile(f"{path}.{i}"):
+                os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+        shutil.copyfile(path, f"{path}.1")
+    os.truncate(path, 0)
+
+
+def tail_offset(path: str, lines: int) -> int:
+    """Offset of the start of the last `lines` lines of a file.
+
+    Args:
+        path (str): text file
+        lines (int): number of lines
+
+    Returns:
+        int: offset in bytes
+    """
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        if lines <= 0:
+            return end
+        position = end
+        count = 0
+        while position > 0:
+            size = min(64 * 1024, position)
+            position -= size
+            f.seek(position)
+            block = f.read(size)
+            # A trailing newline does not start a line
+            if position + size == end and block.endswith(b"\n"):
+                block = block[:-1]
+            for i in range(len(block) - 1, -1, -1):
+                if block[i] == ord("\n"):
+                    count += 1
+                    if count == lines:
+                        return position + i + 1
+    return 0
+
+
+def read_lines(path: str, offset: int, limit: int = 1024 * 1024) -> list:
+    """Read the complete lines written after an offset.
+
+    If the file became shorter than the offset, it was rotated and is read
+    from the start. A line longer than `limit` is returned in pieces of
+    `limit` bytes.
+
+    Args:
+        path (str): text file
+        offset (int): offset of the first byte to read
+        limit (int): maximum number of bytes to read
+
+    Returns:
+        list: the lines without newline, each with the offset after it
+    """
+    if not os.path.isfile(path):
+        return []
+    if os.path.getsize(path) < offset:
+        offset = 0
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(limit)
+    lines = []
+    for line in data.split(b"\n")[:-1]:
+        offset += len(line) + 1
+        lines.append((offset, line.rstrip(b"\r").decode(errors="replace")))
+    if not lines and len(data) == limit:
+        lines.append((offset + len(data), data.decode(errors="replace")))
+    return lines
+
+
+class LogRotator:
+    """Rotate the logs of running simulations from one thread."""
+
+    def __init__(self, interval: float = ROTATION_INTERVAL):
+        self.interval = interval
+        self._watched: set = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def watch(self, basePath: str) -> None:
+        """Start rotating the log of a simulation.
+
+        Args:
+            basePath (str): folder of the simulation
+        """
+        with self._lock:
+            self._watched.add(log_path(basePath))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="log_rotator", daemon=True
+                )
+                self._thread.start()
+
+    def unwatch(self, basePath: str) -> None:
+        """Stop rotating the log of a simulation.
+
+        Args:
+            basePath (str): folder of the simulation
+        """
+        with self._lock:
+            self._watched.discard(log_path(basePath))
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                watched = list(self._watched)
+            for path in watched:
+                try:
+                    rotate(path)
+                except OSError as e:
+                    logging.debug(
+                        f"Could not rotate '{path}'. Error message: {e}"
+                    )
+
+
+log_rotator = LogRotator()
@@ -0,0 +1,205 @@
+"""Prometheus metrics of the app.
+
+Input generation and postprocessing run in worker processes, and the app
+may be served by several uvicorn workers, so the metrics are collected in
+the multiprocess mode of `prometheus_client`. Every process writes its
+samples to `PROMETHEUS_MULTIPROC_DIR`, by default a directory in the
+temporary directory shared by all processes of the host, which `init_metrics`
+sets up when a worker of the app starts. The metrics are created on first
+use, after it, and worker processes inherit the directory. Processes that
+are gone are marked dead: their live gauges are dropped, their counters and
+histograms keep counting.
+"""
+
+import os
+import tempfile
+import threading
+
+DEFAULT_MULTIPROC_DIR = os.path.join(
+    tempfile.gettempdir(), "simpartix_metrics"
+)
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _pids(path: str) -> set:
+    """PIDs of the metric files of a directory, such as
+    `counter_<pid>.db`."""
+    pids = set()
+    for name in os.listdir(path):
+        pid = name[: -len(".db")].rpartition("_")[2]
+        if name.endswith(".db") and pid.isdigit():
+            pids.add(int(pid))
+    return pids
+
+
+def _mark_dead(path: str, pids) -> None:
+    from prometheus_client import multiprocess
+
+    for pid in pids:
+        multiprocess.mark_process_dead(pid, path)
+
+
+def init_metrics() -> str:
+    """Set up the metrics of a worker of the app, when it starts.
+
+    Must run before any metric is used and before `prometheus_client` is
+    imported, which picks the multiprocess mode from the environment. The
+    live gauges of exited processes are dropped, as are those left by an
+    earlier process with the PID of this one, which this process would
+    otherwise start from.
+
+    Returns:
+        str: directory of the metric files
+    """
+    path = os.environ.setdefault(
+        "PROMETHEUS_MULTIPROC_DIR", DEFAULT_MULTIPROC_DIR
+    )
+    os.makedirs(path, exist_ok=True)
+    _mark_dead(
+        path,
+        [
+            pid
+            for pid in _pids(path)
+            if pid == os.getpid() or not _is_alive(pid)
+        ],
+    )
+    return path
+
+
+class _Metric:
+    """A `prometheus_client` metric, created on first use.
+
+    Args:
+        kind (str): class of the metric, e.g. "Counter"
+        *args: arguments of the metric
+        **kwargs: keyword arguments of the metric
+    """
+
+    def __init__(self, kind: str, *args, **kwargs):
+        self._kind = kind
+        self._args = args
+        self._kwargs = kwargs
+        self._metric = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        with self._lock:
+            if self._metric is None:
+                import prometheus_client
+
+                self._metric = getattr(prometheus_client, self._kind)(
+                    *self._args, **self._kwargs
+                )
+        return getattr(self._metric, name)
+
+
+# Stages last from milliseconds (serving a result) to days (the solver)
+STAGE_BUCKETS = (
+    0.01,
+    0.1,
+    0.5,
+    1,
+    5,
+    10,
+    30,
+    60,
+    300,
+    900,
+    3600,
+    4 * 3600,
+    12 * 3600,
+    24 * 3600,
+    float("inf"),
+)
+
+STAGE_SECONDS = _Metric(
+    "Histogram",
+    "simpartix_stage_seconds",
+    "Wall time of the stages of a simulation.",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+STAGE_FAILURES = _Metric(
+    "Counter",
+    "simpartix_stage_failures_total",
+    "Number of stages that raised an error.",
+    ["stage"],
+)
+SIMULATION_TRANSITIONS = _Metric(
+    "Counter",
+    "simpartix_simulation_transitions_total",
+    "Number of simulations that entered each state.",
+    ["state"],
+)
+QUEUE_DEPTH = _Metric(
+    "Gauge",
+    "simpartix_queue_depth",
+    "Number of simulations waiting for a slot.",
+    multiprocess_mode="livesum",
+)
+RUNNING_PROCESSES = _Metric(
+    "Gauge",
+    "simpartix_running_processes",
+    "Number of running SimPARTIX processes.",
+    multiprocess_mode="livesum",
+)
+REQUEST_SECONDS = _Metric(
+    "Histogram",
+    "simpartix_request_seconds",
+    "Latency of the API requests.",
+    ["method", "route", "status"],
+)
+
+
+class stage:
+    """Time a stage, and count it as failed if it raises.
+
+    Usage::
+
+        with stage("dlite_save"):
+            ...
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._timer = STAGE_SECONDS.labels(name).time()
+
+    def __enter__(self):
+        self._timer.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            STAGE_FAILURES.labels(self.name).inc()
+        return self._timer.__exit__(exc_type, exc, traceback)
+
+
+def render() -> tuple:
+    """Collect the metrics of all processes.
+
+    Returns:
+        tuple: metrics in the Prometheus text format, and its content type
+    """
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        CollectorRegistry,
+        generate_latest,
+        multiprocess,
+    )
+
+    # Exited processes, e.g. replaced uvicorn or pool workers, no longer
+    # count towards the live gauges
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    _mark_dead(path, [pid for pid in _pids(path) if not _is_alive(pid)])
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,287 @@
+"""Postprocessing of the SimPARTIX output.
+
+Output frames are mapped onto the MICRESS grid in a process pool, and every
+converted frame is stored in the ``frames`` folder of the simulation as a
+``.npz`` file. Once the results of a simulation are stored, that folder is
+removed and the frames are read from level 0 of its pyramid. The "direct" engine only needs h5py and SciPy, ProPARTIX is
+imported by the "vtk" engine and for the MICRESS VTK files.
+"""
+
+import multiprocessing
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+from simulation_controller.h5part import box_dimensions, frame_times
+from simulation_controller.metrics import stage
+from simulation_controller.restart import OUTPUT_FILENAME
+from simulation_controller.simpartix_output import OUTPUT_PROPERTIES
+
+POSTPROCESSING_WORKERS = int(
+    os.environ.get("SIMPARTIX_POSTPROCESSING_WORKERS", os.cpu_count() or 1)
+)
+
+# Postprocessing engine: "vtk" maps the frames with ProPARTIX through MICRESS
+# VTK files, "direct" maps them in memory (see grid_mapping)
+POSTPROCESSING_ENGINE = os.environ.get(
+    "SIMPARTIX_POSTPROCESSING_ENGINE", "vtk"
+)
+
+# Whether the direct engine also writes the MICRESS VTK files
+WRITE_MICRESS_FILES = (
+    os.environ.get("SIMPARTIX_WRITE_MICRESS_FILES", "0") == "1"
+)
+
+# Whether the vtk engine keeps the MICRESS VTK files once they are converted
+KEEP_VTK_FILES = os.environ.get("SIMPARTIX_KEEP_VTK_FILES", "0") == "1"
+
+_postprocessing_executor = None
+_postprocessing_executor_lock = threading.Lock()
+
+
+def _get_postprocessing_executor() -> ProcessPoolExecutor:
+    """Process pool shared by the postprocessing of all simulations."""
+    global _postprocessing_executor
+    with _postprocessing_executor_lock:
+        if _postprocessing_executor is None:
+            _postprocessing_executor = ProcessPoolExecutor(
+                max_workers=POSTPROCESSING_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _postprocessing_executor
+
+
+def get_output_values(basePath: str) -> dict:
+    """
+    Map all output frames onto the MICRESS grid.
+
+    Frames that were not converted while the simulation was running are
+    split into contiguous chunks, converted in parallel by the
+    postprocessing pool, and everything is assembled in frame order.
+    """
+    elapsed_time = frame_times(
+        os.path.join(basePath, "output", "output.h5part")
+    )
+    stored = set(stored_frames(basePath))
+    missing = [i for i in range(len(elapsed_time)) if i not in stored]
+    chunks = [
+        chunk.tolist()
+        for chunk in np.array_split(missing, POSTPROCESSING_WORKERS)
+        if len(chunk)
+    ]
+    for _ in _get_postprocessing_executor().map(
+        store_frames, repeat(basePath), chunks
+    ):
+        pass
+
+    result = {"elapsed_time": elapsed_time}
+    for i in range(len(elapsed_time)):
+        for key, values in load_frame(basePath, i).items():
+            if key != "elapsed_time":
+                result.setdefault(key, []).append(values)
+    return result
+
+
+def submit_frames(
+    basePath: str, frames: list, source: str = OUTPUT_FILENAME, offset: int = 0
+):
+    """
+    Convert and store some frames in the background, see `store_frames`.
+
+    Returns the future of the conversion.
+    """
+    return _get_postprocessing_executor().submit(
+        store_frames, basePath, frames, source, offset
+    )
+
+
+def _frame_path(basePath: str, frame: int) -> str:
+    return os.path.join(basePath, "frames", f"frame_{frame:04d}.npz")
+
+
+def store_frames(
+    basePath: str, frames: list, source: str = OUTPUT_FILENAME, offset: int = 0
+) -> list:
+    """
+    Convert some frames and store each of them in the frames folder.
+
+    basePath : str
+        folder of the simulation
+    frames : list
+        indices of the frames to convert, in the source file
+    source : str
+        H5Part file, relative to the folder: the output, or the segment of a
+        resumed run
+    offset : int
+        index in the output of the first frame of the source, the frames of
+        a segment are appended to the output when it ends
+
+    Returns the indices of the stored frames.
+    """
+    elapsed_time = frame_times(os.path.join(basePath, source))
+    values = convert_frames(basePath, frames, source)
+    os.makedirs(os.path.join(basePath, "frames"), exist_ok=True)
+    for j, frame in enumerate(frames):
+        path = _frame_path(basePath, offset + frame)
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(
+                f,
+                elapsed_time=elapsed_time[frame],
+                **{key: np.asarray(value[j]) for key, value in values.items()},
+            )
+        os.replace(f"{path}.tmp", path)
+    return [offset + frame for frame in frames]
+
+
+def stored_frames(basePath: str) -> list:
+    """
+    Indices of the frames already converted, in ascending order.
+    """
+    from simulation_controller import pyramid
+
+    frames = set(range(pyramid.frame_count(basePath)))
+    path = os.path.join(basePath, "frames")
+    if os.path.isdir(path):
+        frames.update(
+            int(name[len("frame_") : -len(".npz")])
+            for name in os.listdir(path)
+            if name.startswith("frame_") and name.endswith(".npz")
+        )
+    return sorted(frames)
+
+
+def load_frame(basePath: str, frame: int) -> dict:
+    """
+    Load the mapped quantities and the time of a converted frame.
+    """
+    from simulation_controller import pyramid
+
+    path = _frame_path(basePath, frame)
+    if not os.path.isfile(path):
+        values = pyramid.load_frame(basePath, frame)
+        return {
+            key: values[name] for name, (key, _) in OUTPUT_PROPERTIES.items()
+        }
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def remove_frames(basePath: str) -> None:
+    """
+    Remove the converted frames of a simulation whose results are stored.
+
+    The frames are then read from level 0 of its pyramid, which holds the
+    same grids, so they are not stored twice.
+    """
+    shutil.rmtree(os.path.join(basePath, "frames"), ignore_errors=True)
+
+
+def convert_frames(
+    basePath: str, frames: list, source: str = OUTPUT_FILENAME
+) -> dict:
+    """
+    Map some output frames onto the MICRESS grid.
+
+    basePath : str
+        folder of the simulation
+    frames : list
+        indices of the frames to convert, in the source file
+    source : str
+        H5Part file, relative to the folder
+
+    Returns the mapped quantities, with one entry per frame.
+    """
+    if POSTPROCESSING_ENGINE == "direct":
+        from simulation_controller.grid_mapping import map_frames
+
+        if WRITE_MICRESS_FILES:
+            create_micress_files(basePath, frames, source)
+        lowerCorner, upperCorner = box_dimensions(
+            os.path.join(basePath, OUTPUT_FILENAME)
+        )
+        with stage("grid_mapping"):
+            return map_frames(
+                os.path.join(basePath, source),
+                frames,
+                lowerCorner,
+                upperCorner,
+            )
+
+    import propartix as px
+
+    vtk_path = create_micress_files(basePath, frames, source)
+    result = {}
+    with stage("vtk_to_dlite"):
+        for i in frames:
+            filename = os.path.join(vtk_path, _vtk_pattern(source) % i)
+            px.vtkToDlite(filename, result)
+            if not KEEP_VTK_FILES:
+                os.remove(filename)
+    return result
+
+
+def _vtk_pattern(source: str) -> str:
+    """Names of the MICRESS VTK files of the output or of a segment."""
+    if source == OUTPUT_FILENAME:
+        return "frame_%04d.vtk"
+    name = os.path.splitext(os.path.basename(source))[0]
+    return f"{name}_frame_%04d.vtk"
+
+
+def create_micress_files(
+    basePath: str, frames: list = None, source: str = OUTPUT_FILENAME
+) -> list:
+    import propartix as px
+
+    micress_path = os.path.join(basePath, "micress")
+    output_path = os.path.join(basePath, OUTPUT_FILENAME)
+    vtk_path = os.path.join(micress_path, _vtk_pattern(source))
+    # frame = px.getH5PartFrames(output_path) - 1
+    if not os.path.isdir(micress_path):
+        os.mkdir(micress_path)
+
+    # default of the conversion window should be extracted from the simulation
+    lowerCorner = px.getH5PartBoxDimensions(output_path, frame=0)[0]
+    upperCorner = px.getH5PartBoxDimensions(output_path, frame=0)[1]
+
+    # Micress asked for a single slice, so reduce the conversion windows
+    # xRange = (upperCorner[0] - lowerCorner[0]) / 8.0
+    # lowerCorner[0] = -xRange
+    # upperCorner[0] = xRange
+
+    # initiate conversion from h5part to vtk
+    with stage("h5part_to_vtk"):
+        px.h5partToVtk(
+            h5partFilename=os.path.join(basePath, source),
+            vtkPattern=vtk_path,
+            isVtkTypeCellData=True,
+            frames=frames,
+            lowerCorner=lowerCorner,
+            upperCorner=upperCorner,
+            makeAverage=False,
+            smoothingLength=None,
+            particleSpacing=None,
+            density=None,
+            resolution=3.6e-6,
+            isEnforceEqualSpacing=True,
+            isShepardFilter=True,
+            quantitiesToBeMapped=[
+                "Group",
+                "Temperature_SPH",
+                "StateOfMatter_SPH",
+            ],
+            quantitiesToBeMappedByClosestNeighbor=[
+                "Group",
+                "StateOfMatter_SPH",
+            ],
+            defaultInCaseOfAbsenceOfClosestNeighbor=[-1, -1],
+            isBinaryVtk=False,
+            isApplyMicressConvention=True,
+            micressSubstrateThreshold=0,
+            micressLiquidThreshold=1,
+        )
+    return micress_path
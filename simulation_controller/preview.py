@@ -0,0 +1,239 @@
+"""Preview images and animation of the simulations.
+
+Frames are rendered as temperature maps from the grids of the converted
+output frames, see `postprocessing.store_frames`, in a thread
+pool. The frame images, a thumbnail of the latest frame and an animated GIF
+of all frames are cached in the ``preview`` folder of the simulation, and
+rendered again in the background once more frames have been converted.
+"""
+
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from simulation_controller.grid_mapping import DEFAULT_VALUE
+from simulation_controller.metrics import stage
+from simulation_controller.postprocessing import load_frame
+
+PREVIEW_FOLDER = "preview"
+
+PREVIEW_WORKERS = int(
+    os.environ.get("SIMPARTIX_PREVIEW_WORKERS", min(4, os.cpu_count() or 1))
+)
+
+# Temperatures [K] shown with the coldest and the hottest colour, fixed so
+# that all frames of a simulation share the same scale
+TEMPERATURE_RANGE = tuple(
+    float(value)
+    for value in os.environ.get(
+        "SIMPARTIX_PREVIEW_TEMPERATURE_RANGE", "300,3000"
+    ).split(",")
+)
+
+# Pixels per grid cell of the frame images
+SCALE = 4
+
+# Bounding box of the thumbnail
+THUMBNAIL_SIZE = (256, 256)
+
+FRAMES_PER_SECOND = 8
+
+# Colours from cold to hot, interpolated to the palette of the images
+COLORMAP_ANCHORS = (
+    (0, 0, 4),
+    (87, 16, 110),
+    (188, 55, 84),
+    (249, 142, 9),
+    (252, 255, 164),
+)
+
+# Palette index of cells without particles, drawn in black
+BACKGROUND = 255
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _palette() -> list:
+    """RGB palette of the images: 255 colours of the colour map, then the
+    background."""
+    anchors = np.array(COLORMAP_ANCHORS, dtype=float)
+    positions = np.linspace(0.0, 1.0, len(anchors))
+    levels = np.linspace(0.0, 1.0, BACKGROUND)
+    colors = np.column_stack(
+        [np.interp(levels, positions, channel) for channel in anchors.T]
+    )
+    colors = np.vstack((colors, [0, 0, 0]))
+    return colors.round().astype(np.uint8).ravel().tolist()
+
+
+PALETTE = _palette()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=PREVIEW_WORKERS, thread_name_prefix="preview"
+            )
+        return _executor
+
+
+def _path(basePath: str, name: str) -> str:
+    return os.path.join(basePath, PREVIEW_FOLDER, name)
+
+
+def frame_path(basePath: str, frame: int) -> str:
+    return _path(basePath, f"frame_{frame:04d}.png")
+
+
+def thumbnail_path(basePath: str) -> str:
+    return _path(basePath, "thumbnail.png")
+
+
+def animation_path(basePath: str) -> str:
+    return _path(basePath, "animation.gif")
+
+
+def _save(image: Image.Image, path: str, **options) -> None:
+    with open(f"{path}.tmp", "wb") as f:
+        image.save(f, format=os.path.splitext(path)[1][1:], **options)
+    os.replace(f"{path}.tmp", path)
+
+
+def render_frame(basePath: str, frame: int) -> Image.Image:
+    """Render the temperature of a converted frame, z pointing up.
+
+    Args:
+        basePath (str): folder of the simulation
+        frame (int): index of the frame
+
+    Returns:
+        PIL.Image.Image: palette image of the frame
+    """
+    temperature = load_frame(basePath, frame)["Temperature_SPH"]
+    low, high = TEMPERATURE_RANGE
+    indices = np.clip(
+        (temperature - low) / (high - low) * (BACKGROUND - 1),
+        0,
+        BACKGROUND - 1,
+    ).astype(np.uint8)
+    indices[temperature == DEFAULT_VALUE] = BACKGROUND
+    image = Image.fromarray(np.ascontiguousarray(indices.T[::-1]))
+    image.putpalette(PALETTE)
+    return image.resize(
+        (image.width * SCALE, image.height * SCALE), Image.NEAREST
+    )
+
+
+def _frame_image(basePath: str, frame: int) -> Image.Image:
+    """Image of a frame, rendered unless it is cached."""
+    path = frame_path(basePath, frame)
+    if os.path.isfile(path):
+        with Image.open(path) as image:
+            return image.copy()
+    image = render_frame(basePath, frame)
+    _save(image, path)
+    return image
+
+
+def _rendered_frames(basePath: str):
+    """Frames of the cached thumbnail and animation, None if missing."""
+    try:
+        with open(_path(basePath, "preview.json")) as f:
+            return json.load(f)["frames"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _generate(basePath: str, frames: list) -> None:
+    """Render the missing frame images, the thumbnail and the animation."""
+    try:
+        with stage("preview"):
+            os.makedirs(os.path.join(basePath, PREVIEW_FOLDER), exist_ok=True)
+            images = list(
+                _get_executor().map(
+                    lambda frame: _frame_image(basePath, frame), frames
+                )
+            )
+            thumbnail = images[-1].copy()
+            thumbnail.thumbnail(THUMBNAIL_SIZE)
+            _save(thumbnail, thumbnail_path(basePath))
+            _save(
+                images[0],
+                animation_path(basePath),
+                save_all=True,
+                append_images=images[1:],
+                duration=1000 // FRAMES_PER_SECOND,
+                loop=0,
+            )
+            with open(_path(basePath, "preview.json.tmp"), "w") as f:
+                json.dump({"frames": frames}, f)
+            os.replace(
+                _path(basePath, "preview.json.tmp"),
+                _path(basePath, "preview.json"),
+            )
+        logging.info(f"Preview of {len(frames)} frames in {basePath} ready.")
+    except Exception as e:
+        logging.error(
+            f"Error while rendering the preview in {basePath}. "
+            f"Error message: {e}"
+        )
+    finally:
+        with _lock:
+            _pending.discard(basePath)
+
+
+def submit(basePath: str, frames: list) -> None:
+    """Render the preview of some frames in the background, unless it is
+    already being rendered.
+
+    Args:
+        basePath (str): folder of the simulation
+        frames (list): indices of the converted frames
+    """
+    with _lock:
+        if basePath in _pending:
+            return
+        _pending.add(basePath)
+    threading.Thread(
+        target=_generate,
+        args=(basePath, list(frames)),
+        name=f"preview_{os.path.basename(basePath)}",
+        daemon=True,
+    ).start()
+
+
+def cached(basePath: str, frames: list, kind: str, frame: int = None):
+    """Get a cached preview, rendering it again if outdated.
+
+    Outdated previews are still returned while they are rendered again.
+
+    Args:
+        basePath (str): folder of the simulation
+        frames (list): indices of the converted frames
+        kind (str): "thumbnail" or "animation", ignored if `frame` is given
+        frame (int): index of a frame to get the image of
+
+    Returns:
+        str: path of the image, None if it is being rendered
+    """
+    if frame is not None:
+        path = frame_path(basePath, frame)
+    elif kind == "animation":
+        path = animation_path(basePath)
+    else:
+        path = thumbnail_path(basePath)
+    exists = os.path.isfile(path)
+    if not exists or (
+        frame is None and _rendered_frames(basePath) != list(frames)
+    ):
+        submit(basePath, frames)
+    return path if exists else None
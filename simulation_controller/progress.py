@@ -0,0 +1,148 @@
+"""Progress of running simulations, from their configuration and output."""
+
+import math
+import os
+import threading
+import time
+
+from simulation_controller.restart import (
+    CONFIG_FILENAME,
+    ORIGINAL_CONFIG_FILENAME,
+    OUTPUT_FILENAME,
+    SEGMENT_FILENAME,
+)
+
+# Latest simulated time per output file, with the size and modification
+# time of the file it was read at
+_latest_times: dict = {}
+_latest_times_lock = threading.Lock()
+
+
+def _read_settings(basePath: str, filename: str = CONFIG_FILENAME) -> dict:
+    """Settings of a SimPARTIX configuration file, by name."""
+    settings = {}
+    with open(os.path.join(basePath, filename)) as f:
+        for line in f:
+            name, _, value = line.split("#", 1)[0].partition("=")
+            if value:
+                settings[name.strip()] = value.strip()
+    return settings
+
+
+def read_time_settings(
+    basePath: str, filename: str = CONFIG_FILENAME
+) -> tuple:
+    """Read the start and end time of a simulation from `simulation.conf`.
+
+    Args:
+        basePath (str): folder of the simulation
+        filename (str): configuration file, relative to the folder
+
+    Raises:
+        KeyError: if the configuration has no `endTime`
+
+    Returns:
+        tuple: start time and end time [s]
+    """
+    settings = _read_settings(basePath, filename)
+    return float(settings.get("startTime", 0.0)), float(settings["endTime"])
+
+
+def latest_time(basePath: str):
+    """Simulated time of the latest frame written to `output.h5part`, or to
+    the segment of a resumed run.
+
+    The value is cached until the file changes, so frequent polling does not
+    read the file again.
+
+    Args:
+        basePath (str): folder of the simulation
+
+    Returns:
+        float: simulated time [s], or None if no frame was written yet
+    """
+    path = os.path.join(basePath, SEGMENT_FILENAME)
+    if not os.path.isfile(path):
+        path = os.path.join(basePath, OUTPUT_FILENAME)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    version = (stat.st_size, stat.st_mtime_ns)
+    with _latest_times_lock:
+        cached = _latest_times.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    from simulation_controller.h5part import frame_times
+
+    try:
+        times = frame_times(path)
+    except Exception:
+        # The file is being written, keep the last known value
+        return None if cached is None else cached[1]
+    value = float(times[-1]) if len(times) else None
+    with _latest_times_lock:
+        _latest_times[path] = (version, value)
+    return value
+
+
+def reached_end(basePath: str) -> bool:
+    """Whether the output of a run reaches its end time.
+
+    The last frame may be written up to one `outputTime` before `endTime`,
+    both being rounded in `simulation.conf`.
+
+    Args:
+        basePath (str): folder of the simulation
+
+    Returns:
+        bool: False if the run was interrupted, or its output is unreadable
+    """
+    try:
+        settings = _read_settings(basePath)
+        end = float(settings["endTime"])
+        interval = float(settings.get("outputTime", 0.0))
+    except (OSError, KeyError, ValueError):
+        return False
+    simulated = latest_time(basePath)
+    return simulated is not None and (
+        simulated >= end - interval or math.isclose(simulated, end)
+    )
+
+
+def estimate_progress(basePath: str, started_at: float) -> dict:
+    """Fraction done, throughput and estimated completion of a run.
+
+    The throughput of a resumed run is measured from the frame it was
+    resumed from.
+
+    Args:
+        basePath (str): folder of the simulation
+        started_at (float): Unix time at which the run was started
+
+    Returns:
+        dict: simulated time, end time, fraction done, throughput
+            (simulated seconds per wall-clock second) and estimated
+            completion as Unix time, None where unknown
+    """
+    start, end = read_time_settings(basePath)
+    first = start
+    if os.path.isfile(os.path.join(basePath, ORIGINAL_CONFIG_FILENAME)):
+        first, _ = read_time_settings(basePath, ORIGINAL_CONFIG_FILENAME)
+    simulated = latest_time(basePath)
+    progress = {
+        "simulated_time": simulated,
+        "end_time": end,
+        "fraction": None,
+        "throughput": None,
+        "eta": None,
+    }
+    if simulated is None:
+        return progress
+    progress["fraction"] = min(max((simulated - first) / (end - first), 0), 1)
+    now = time.time()
+    if started_at is not None and now > started_at and simulated > start:
+        throughput = (simulated - start) / (now - started_at)
+        progress["throughput"] = throughput
+        progress["eta"] = now + max(end - simulated, 0) / throughput
+    return progress
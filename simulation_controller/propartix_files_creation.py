@@ -1,23 +1,61 @@
+import json
+import logging
 import os
 
 import numpy as np
 import propartix as px
 
-from models.transformation import TransformationInput
+from models.transformation import PackingBackend, TransformationInput
+from simulation_controller import packing
+from simulation_controller.input_cache import (
+    TEMPLATES_PATH,
+    InputCache,
+    parameters_key,
+)
+from simulation_controller.metrics import stage
+
+input_cache = InputCache()
+
+# Shortfall of the covered fraction of the powder bed that is logged
+PHI_TOLERANCE = 0.01
 
 
 def create_input_files(foldername: str, simulation_input: TransformationInput):
     """
     Function to create the start configuration for the MarketPlace simulation.
 
+    Inputs with an explicit seed are taken from the input cache when they
+    were generated before.
+
     simulation_input : TransformationInput
         instance with the specific configuration values for a run
     """
-    if not os.path.isdir(foldername):
-        os.mkdir(foldername)
     inputPath = os.path.join(foldername, "input")
-    if not os.path.isdir(inputPath):
-        os.mkdir(inputPath)
+    with stage("input_files"):
+        if simulation_input.seed is not None and input_cache.enabled:
+            input_cache.fetch(
+                parameters_key(simulation_input),
+                inputPath,
+                lambda path: generate_input_files(path, simulation_input),
+            )
+        else:
+            os.makedirs(inputPath, exist_ok=True)
+            generate_input_files(inputPath, simulation_input)
+
+
+def generate_input_files(
+    inputPath: str, simulation_input: TransformationInput
+):
+    """
+    Generate the powder bed and configuration files into a directory.
+
+    inputPath : str
+        directory receiving the input files
+    simulation_input : TransformationInput
+        instance with the specific configuration values for a run
+    """
+    if simulation_input.seed is not None:
+        np.random.seed(simulation_input.seed)
     particlesSPH = px.Particles("SPH")
 
     # particle spacing
@@ -30,21 +68,45 @@ def create_input_files(foldername: str, simulation_input: TransformationInput):
     medianRadius = 0.5 * simulation_input.sphereDiameter
     sigma = 0.2
 
-    centers, radii = px.createRandomFortran(
-        lowerCorner=[-0.5 * PowderBedLength, -0.5 * PowderBedLength, 0.0],
-        upperCorner=[
-            0.5 * PowderBedLength,
-            0.5 * PowderBedLength,
-            PowderBedLength,
-        ],
-        volumeFraction=simulation_input.phi,
-        distributionType="lognormal",
-        mean=medianRadius,
-        width=sigma,
-        is2d=True,
-        isPeriodic=False,
-        tryLimit=1000000,
-    )
+    packingLowerCorner = [-0.5 * PowderBedLength, -0.5 * PowderBedLength, 0.0]
+    packingUpperCorner = [
+        0.5 * PowderBedLength,
+        0.5 * PowderBedLength,
+        PowderBedLength,
+    ]
+    useGrid = simulation_input.packing == PackingBackend.GRID
+
+    with stage("packing_create_random"):
+        if useGrid:
+            centers, radii, phi = packing.create_random(
+                lowerCorner=packingLowerCorner,
+                upperCorner=packingUpperCorner,
+                volumeFraction=simulation_input.phi,
+                mean=medianRadius,
+                width=sigma,
+            )
+        else:
+            centers, radii = px.createRandomFortran(
+                lowerCorner=packingLowerCorner,
+                upperCorner=packingUpperCorner,
+                volumeFraction=simulation_input.phi,
+                distributionType="lognormal",
+                mean=medianRadius,
+                width=sigma,
+                is2d=True,
+                isPeriodic=False,
+                tryLimit=1000000,
+            )
+            phi = packing.covered_fraction(
+                packingLowerCorner, packingUpperCorner, radii
+            )
+    if phi < simulation_input.phi - PHI_TOLERANCE:
+        logging.warning(
+            f"The powder bed covers {phi:.3f} of its area instead of "
+            f"{simulation_input.phi:.3f}."
+        )
+    with open(os.path.join(inputPath, packing.PACKING_FILENAME), "w") as f:
+        json.dump({"phi": phi}, f)
 
     # bounding box for creating SPH particles
     lowerCorner = [-0.5 * PowderBedLength + 0.5 * dp, 0.0, 0.0]
@@ -80,15 +142,21 @@ def create_input_files(foldername: str, simulation_input: TransformationInput):
         is2d=True,
     )
 
-    positions, group = px.cutSpheres(
-        data=positions,
-        positions=positions,
-        radius=radiiInBox * radiusScaling,
-        centers=centersInBox,
-        shell=0.0,
-        inner=True,
-        sphereIndex=True,
-    )
+    with stage("packing_cut_spheres"):
+        if useGrid:
+            positions, group = packing.cut_spheres(
+                positions, centersInBox, radiiInBox * radiusScaling
+            )
+        else:
+            positions, group = px.cutSpheres(
+                data=positions,
+                positions=positions,
+                radius=radiiInBox * radiusScaling,
+                centers=centersInBox,
+                shell=0.0,
+                inner=True,
+                sphereIndex=True,
+            )
 
     particlesSPH = px.Particles("SPH")
     particlesSPH.activate(whichQuantity=px.quantity["group"])
@@ -131,19 +199,20 @@ def create_input_files(foldername: str, simulation_input: TransformationInput):
 
     particlesSPH.centerPosition()
 
-    px.writeH5Part(foldername + "/input/startconf.h5part", particlesSPH)
+    with stage("packing_write_h5part"):
+        px.writeH5Part(
+            os.path.join(inputPath, "startconf.h5part"), particlesSPH
+        )
 
     # compute intermediate variables
     simulationTime = PowderBedLength / simulation_input.laserSpeed
 
     spread = particlesSPH.getSpread()
 
-    templateDirPath = os.path.relpath(
-        "/app/simulation_controller/templates", start=os.curdir
-    )
+    templateDirPath = TEMPLATES_PATH
 
     # Create simulation.conf
-    fout = open(foldername + "/input/simulation.conf", "w")
+    fout = open(os.path.join(inputPath, "simulation.conf"), "w")
     with open(
         os.path.join(templateDirPath, "simulation.template")
     ) as simulationContent:
@@ -158,13 +227,13 @@ def create_input_files(foldername: str, simulation_input: TransformationInput):
     fout.close()
 
     # Create sph.conf
-    fout = open(foldername + "/input/sph.conf", "w")
+    fout = open(os.path.join(inputPath, "sph.conf"), "w")
     with open(os.path.join(templateDirPath, "sph.template")) as sphConfContent:
         fout.write(sphConfContent.read())
     fout.close()
 
     # Create sphMaterialProperties.csv
-    fout = open(foldername + "/input/sphMaterialProperties.csv", "w")
+    fout = open(os.path.join(inputPath, "sphMaterialProperties.csv"), "w")
     with open(
         os.path.join(templateDirPath, "sphMaterialProperties.template")
     ) as sphMaterialPropertiesContent:
@@ -172,7 +241,7 @@ def create_input_files(foldername: str, simulation_input: TransformationInput):
     fout.close()
 
     # Create laser.dat
-    fout = open(foldername + "/input/laser.dat", "w")
+    fout = open(os.path.join(inputPath, "laser.dat"), "w")
     with open(os.path.join(templateDirPath, "laser.template")) as laserContent:
         fout.write(
             f"{laserContent.read()}".format(
@@ -186,88 +255,9 @@ def create_input_files(foldername: str, simulation_input: TransformationInput):
     fout.close()
 
     # Create surfaceTension.dat
-    fout = open(foldername + "/input/surfaceTension.dat", "w")
+    fout = open(os.path.join(inputPath, "surfaceTension.dat"), "w")
     with open(
         os.path.join(templateDirPath, "surfaceTension.template")
     ) as surfaceTensionContent:
         fout.write(surfaceTensionContent.read())
     fout.close()
-
-
-def get_output_values(basePath: str) -> dict:
-    vtk_path = create_micress_files(basePath)
-
-    elapsed_time = px.getH5PartTime(
-        filename=os.path.join(basePath, "output", "output.h5part"),
-        allFrames=True,
-    )
-    result = {"elapsed_time": elapsed_time}
-    for i in range(len(elapsed_time)):
-        px.vtkToDlite(os.path.join(vtk_path, f"frame_{i:04d}.vtk"), result)
-    return result
-
-
-def create_micress_files(basePath: str) -> list:
-    micress_path = os.path.join(basePath, "micress")
-    output_path = os.path.join(basePath, "output", "output.h5part")
-    vtk_path = os.path.join(micress_path, "frame_%04d.vtk")
-    # frame = px.getH5PartFrames(output_path) - 1
-    if not os.path.isdir(micress_path):
-        os.mkdir(micress_path)
-
-    # default of the conversion window should be extracted from the simulation
-    lowerCorner = px.getH5PartBoxDimensions(output_path, frame=0)[0]
-    upperCorner = px.getH5PartBoxDimensions(output_path, frame=0)[1]
-
-    # Micress asked for a single slice, so reduce the conversion windows
-    # xRange = (upperCorner[0] - lowerCorner[0]) / 8.0
-    # lowerCorner[0] = -xRange
-    # upperCorner[0] = xRange
-
-    # initiate conversion from h5part to vtk
-    px.h5partToVtk(
-        h5partFilename=output_path,
-        vtkPattern=vtk_path,
-        isVtkTypeCellData=True,
-        # frames=[0, 1],
-        lowerCorner=lowerCorner,
-        upperCorner=upperCorner,
-        makeAverage=False,
-        smoothingLength=None,
-        particleSpacing=None,
-        density=None,
-        resolution=3.6e-6,
-        isEnforceEqualSpacing=True,
-        isShepardFilter=True,
-        quantitiesToBeMapped=["Group", "Temperature_SPH", "StateOfMatter_SPH"],
-        quantitiesToBeMappedByClosestNeighbor=["Group", "StateOfMatter_SPH"],
-        defaultInCaseOfAbsenceOfClosestNeighbor=[-1, -1],
-        isBinaryVtk=False,
-        isApplyMicressConvention=True,
-        micressSubstrateThreshold=0,
-        micressLiquidThreshold=1,
-    )
-    return micress_path
-
-
-def generate_preview(basepath: str):
-    path = os.path.join(basepath, "pic")
-    if not os.path.isdir(path):
-        os.mkdir(path)
-    os.chdir(path)
-
-    px.h5partToVtk(
-        h5partFilename="output/output.h5part",
-        vtkPattern="output/converted-%04d.vtk",
-        quantitiesToBeMapped=["Temperature_SPH"],
-    )
-
-    px.vtkToPng(
-        vtkRegExPattern=r"output/converted-\d*.vtk",
-        pngPattern="pic/output-%04d.png",
-        quantityName="Temperature_SPH",
-    )
-
-    os.system(
-        r"mencoder -of avi -ovc x264 -fps 8 -nosound -o movie.avi mf://pic/\*.png"
-    )
@@ -0,0 +1,270 @@
+"""Multi-resolution copies of the output grids, for partial result queries.
+
+Level 0 holds the grids at the output resolution, and every further level
+halves both dimensions, so that level `k` has cells `2**k` times as large.
+Temperatures are averaged over the valid cells of a block, labels such as
+the group and the state of matter are sampled at its first cell. Every
+level of every field is a ``.npy`` array of shape ``[time, X, Z]``, read
+memory-mapped, so a query only reads the frames and cells it returns.
+"""
+
+import io
+import os
+import shutil
+
+import numpy as np
+
+from simulation_controller.input_cache import link_or_copy
+
+PYRAMID_FOLDER = "pyramid"
+
+# Fields averaged over the cells of a block, the others are sampled
+AVERAGED_FIELDS = ("temperature",)
+
+# Value of cells without any particle in their neighbourhood, see
+# `grid_mapping.DEFAULT_VALUE`
+DEFAULT_VALUE = -1
+
+
+def _level_path(basePath: str, level: int, field: str) -> str:
+    return os.path.join(basePath, PYRAMID_FOLDER, str(level), f"{field}.npy")
+
+
+def _block_sums(values: np.ndarray) -> np.ndarray:
+    """Sum the values over blocks of 2 x 2 cells of the last two axes."""
+    for axis in (1, 2):
+        values = np.add.reduceat(
+            values, np.arange(0, values.shape[axis], 2), axis=axis
+        )
+    return values
+
+
+def _levels(grid: np.ndarray, averaged: bool):
+    """Yield the levels above 0 of a [time, X, Z] grid, coarsest last."""
+    if averaged:
+        valid = grid != DEFAULT_VALUE
+        sums = np.where(valid, grid, 0.0)
+        counts = valid.astype(np.int64)
+    while grid.shape[1] > 1 or grid.shape[2] > 1:
+        if averaged:
+            sums, counts = _block_sums(sums), _block_sums(counts)
+            grid = np.full(sums.shape, float(DEFAULT_VALUE))
+            np.divide(sums, counts, out=grid, where=counts > 0)
+        else:
+            grid = grid[:, ::2, ::2]
+        yield grid
+
+
+def _save(path: str, values: np.ndarray) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        np.save(f, np.ascontiguousarray(values))
+
+
+def build(
+    basePath: str, elapsed_time, grids: dict, sources: dict = None
+) -> None:
+    """Write the pyramid of the output of a simulation.
+
+    Args:
+        basePath (str): folder of the simulation
+        elapsed_time (np.ndarray): time of each frame
+        grids (dict): [time, X, Z] arrays, by field
+        sources (dict): stored .npy arrays of some fields at the output
+            resolution, by field, linked as level 0 instead of written
+    """
+    sources = sources or {}
+    staging = os.path.join(basePath, f"{PYRAMID_FOLDER}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    _save(os.path.join(staging, "elapsed_time.npy"), elapsed_time)
+    for field, grid in grids.items():
+        level0 = os.path.join(staging, "0", f"{field}.npy")
+        if field in sources:
+            os.makedirs(os.path.dirname(level0), exist_ok=True)
+            link_or_copy(sources[field], level0)
+        else:
+            _save(level0, grid)
+        for level, values in enumerate(
+            _levels(grid, field in AVERAGED_FIELDS), start=1
+        ):
+            _save(os.path.join(staging, str(level), f"{field}.npy"), values)
+    target = os.path.join(basePath, PYRAMID_FOLDER)
+    shutil.rmtree(target, ignore_errors=True)
+    os.rename(staging, target)
+
+
+def files(basePath: str) -> list:
+    """Paths of the files of a pyramid, relative to the simulation folder."""
+    return [
+        os.path.relpath(os.path.join(root, name), basePath)
+        for root, _, names in os.walk(os.path.join(basePath, PYRAMID_FOLDER))
+        for name in names
+    ]
+
+
+def exists(basePath: str) -> bool:
+    return os.path.isfile(
+        os.path.join(basePath, PYRAMID_FOLDER, "elapsed_time.npy")
+    )
+
+
+def frame_count(basePath: str) -> int:
+    """Number of frames of a pyramid, 0 if it does not exist."""
+    if not exists(basePath):
+        return 0
+    return len(
+        np.load(
+            os.path.join(basePath, PYRAMID_FOLDER, "elapsed_time.npy"),
+            mmap_mode="r",
+        )
+    )
+
+
+def load_frame(basePath: str, frame: int) -> dict:
+    """Read a frame of the output grids at the output resolution.
+
+    Args:
+        basePath (str): folder of the simulation
+        frame (int): index of the frame
+
+    Returns:
+        dict: elapsed time and [X, Z] grids of the frame, by field
+    """
+    path = os.path.join(basePath, PYRAMID_FOLDER, "0")
+    values = {
+        "elapsed_time": np.load(
+            os.path.join(basePath, PYRAMID_FOLDER, "elapsed_time.npy"),
+            mmap_mode="r",
+        )[frame]
+    }
+    for name in os.listdir(path):
+        field = name[: -len(".npy")]
+        values[field] = np.array(
+            np.load(_level_path(basePath, 0, field), mmap_mode="r")[frame]
+        )
+    return values
+
+
+def parse_range(value: str, step: bool = False) -> slice:
+    """Parse a range of indices such as "10:20", "5:" or "7".
+
+    Args:
+        value (str): `start:stop`, with an optional `:step` if `step` is
+            set, or a single index
+        step (bool): whether a step may be given
+
+    Raises:
+        ValueError: if the range is malformed
+
+    Returns:
+        slice: the range, all indices if `value` is None
+    """
+    if value is None:
+        return slice(None)
+    parts = value.split(":")
+    try:
+        if len(parts) == 1:
+            index = int(parts[0])
+            return slice(index, index + 1 if index != -1 else None)
+        if len(parts) > (3 if step else 2):
+            raise ValueError
+        bounds = [int(part) if part.strip() else None for part in parts]
+    except ValueError:
+        raise ValueError(
+            f"Invalid range '{value}', expected "
+            f"{'start:stop[:step]' if step else 'start:stop'}."
+        )
+    if len(bounds) == 3 and bounds[2] is not None and bounds[2] < 1:
+        raise ValueError(f"Invalid range '{value}', the step must be >= 1.")
+    return slice(*bounds)
+
+
+def _window(cells: slice, size: int, factor: int, step: int) -> slice:
+    """Cells of a level covering a window of the output grid.
+
+    Args:
+        cells (slice): window, in cells of the output grid
+        size (int): number of cells of the output grid
+        factor (int): size of the cells of the level, in output cells
+        step (int): step between the returned cells of the level
+
+    Returns:
+        slice: cells of the level
+    """
+    start, stop, _ = cells.indices(size)
+    if start >= stop:
+        raise ValueError(f"Empty window {start}:{stop}.")
+    return slice(start // factor, -(-stop // factor), step)
+
+
+def query(
+    basePath: str,
+    fields: list,
+    frames: slice = slice(None),
+    x: slice = slice(None),
+    z: slice = slice(None),
+    stride: int = 1,
+) -> dict:
+    """Read some frames of a window of some fields, on a coarser grid.
+
+    The grid has cells `stride` times as large as the output cells, and is
+    read from the level of that cell size, or every n-th cell of the
+    coarsest level for larger strides. The window is widened to whole cells
+    of the level.
+
+    Args:
+        basePath (str): folder of the simulation
+        fields (list): fields to read
+        frames (slice): frames to read
+        x (slice): window in x, in cells of the output grid
+        z (slice): window in z, in cells of the output grid
+        stride (int): cell size of the returned grid, in output cells, a
+            power of two
+
+    Raises:
+        ValueError: if the window is empty or the stride is not a power of
+            two
+
+    Returns:
+        dict: frame indices, their time, the returned cells of the output
+            grid as (start, stop, step) in x and z, and the arrays of the
+            fields
+    """
+    # Only the levels average their cells, other strides would sample them
+    if stride < 1 or stride & (stride - 1):
+        raise ValueError(f"Invalid stride {stride}, expected a power of two.")
+    elapsed_time = np.load(
+        os.path.join(basePath, PYRAMID_FOLDER, "elapsed_time.npy")
+    )
+    frames = slice(*frames.indices(len(elapsed_time)))
+    result = {
+        "frames": list(range(len(elapsed_time)))[frames],
+        "elapsed_time": elapsed_time[frames],
+    }
+    for field in fields:
+        size = np.load(_level_path(basePath, 0, field), mmap_mode="r").shape
+        level = stride.bit_length() - 1
+        while not os.path.isfile(_level_path(basePath, level, field)):
+            level -= 1
+        factor = 2**level
+        windows = [
+            _window(cells, size[axis], factor, stride // factor)
+            for axis, cells in ((1, x), (2, z))
+        ]
+        grid = np.load(_level_path(basePath, level, field), mmap_mode="r")
+        result[field] = np.array(grid[frames, windows[0], windows[1]])
+        for name, window, axis in (("x", windows[0], 1), ("z", windows[1], 2)):
+            result[name] = (
+                window.start * factor,
+                min(window.stop * factor, size[axis]),
+                stride,
+            )
+    return result
+
+
+def to_npy(values: np.ndarray) -> bytes:
+    """Serialize an array in the .npy format."""
+    buffer = io.BytesIO()
+    np.save(buffer, values)
+    return buffer.getvalue()
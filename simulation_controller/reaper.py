@@ -0,0 +1,208 @@
+"""Single watcher thread reporting the exit of SimPARTIX processes."""
+
+import logging
+import os
+import selectors
+import signal
+import threading
+import time
+
+# Polling interval used when pidfds are not supported by the platform.
+POLL_INTERVAL = 0.5
+
+# Seconds a terminated process group gets to exit before it is killed
+KILL_TIMEOUT = float(os.environ.get("SIMPARTIX_KILL_TIMEOUT", 30))
+
+
+class ProcessReaper:
+    """Wait for the exit of child processes from one background thread.
+
+    On Linux every watched process is represented by a pidfd, so the thread
+    sleeps in ``select`` until a process exits. On other platforms the
+    watched processes are polled every `POLL_INTERVAL` seconds instead.
+    """
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._polled: dict = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def watch(self, process, callback) -> None:
+        """Call `callback(process)` once the process has exited.
+
+        The process is reaped before the callback runs, so its returncode is
+        set. Callbacks run on the reaper thread and must not block.
+
+        Args:
+            process (subprocess.Popen): child process to watch
+            callback (callable): called with the process once it exited
+        """
+        with self._lock:
+            try:
+                pidfd = os.pidfd_open(process.pid)
+            except (AttributeError, OSError):
+                self._polled[process.pid] = (process, callback)
+            else:
+                self._selector.register(
+                    pidfd, selectors.EVENT_READ, (process, callback)
+                )
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="process_reaper", daemon=True
+                )
+                self._thread.start()
+        os.write(self._wake_w, b"\0")
+
+    def _run(self) -> None:
+        while True:
+            timeout = POLL_INTERVAL if self._polled else None
+            for key, _ in self._selector.select(timeout):
+                if key.fd == self._wake_r:
+                    self._drain_wakeups()
+                    continue
+                with self._lock:
+                    self._selector.unregister(key.fd)
+                os.close(key.fd)
+                process, callback = key.data
+                process.wait()
+                self._dispatch(process, callback)
+            self._poll()
+
+    def _drain_wakeups(self) -> None:
+        try:
+            while os.read(self._wake_r, 512):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _poll(self) -> None:
+        with self._lock:
+            exited = [
+                (process, callback)
+                for process, callback in self._polled.values()
+                if process.poll() is not None
+            ]
+            for process, _ in exited:
+                del self._polled[process.pid]
+        for process, callback in exited:
+            self._dispatch(process, callback)
+
+    @staticmethod
+    def _dispatch(process, callback) -> None:
+        try:
+            callback(process)
+        except Exception as e:
+            logging.error(
+                f"Error while handling the exit of process {process.pid}. "
+                f"Error message: {e}"
+            )
+
+
+class AdoptedProcess:
+    """Stand-in for `subprocess.Popen` for a process started by an earlier
+    instance of the app.
+
+    The process is not a child of this one, so its exit status cannot be
+    collected. Once it has exited, it is reported with return code 0, and
+    the run is only completed if its output reaches the end time, see
+    `Simulation._finish_adopted`.
+    """
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.returncode = None
+
+    @staticmethod
+    def is_alive(pid: int, name: str = "SimPARTIX") -> bool:
+        """Whether a process with this PID runs the program `name`.
+
+        Args:
+            pid (int): process id
+            name (str): expected program, guards against PID reuse
+
+        Returns:
+            bool: True if the process is running
+        """
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                return name.encode() in f.read()
+        except OSError:
+            return False
+
+    def poll(self):
+        if self.returncode is None and not self.is_alive(self.pid):
+            self.returncode = 0
+        return self.returncode
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.poll() is None:
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Process {self.pid} is still running.")
+            time.sleep(POLL_INTERVAL)
+        return self.returncode
+
+    def terminate(self):
+        try:
+            os.kill(self.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+def _signal_group(pid: int, signum: int) -> None:
+    """Send a signal to the process group led by `pid`, or to the process
+    alone if it does not lead a group."""
+    try:
+        os.killpg(pid, signum)
+    except ProcessLookupError:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+def terminate_group(process, timeout: float = KILL_TIMEOUT) -> None:
+    """Terminate a process and the processes it started.
+
+    SimPARTIX processes lead their own process group. The group gets
+    SIGTERM, and SIGKILL if any of its processes is still running after
+    `timeout` seconds. The process must be watched by the reaper, which
+    reaps it.
+
+    Args:
+        process (subprocess.Popen): process to terminate
+        timeout (float): seconds before SIGKILL is sent
+    """
+    _signal_group(process.pid, signal.SIGTERM)
+
+    def _escalate():
+        try:
+            os.killpg(process.pid, 0)
+        except ProcessLookupError:
+            if process.poll() is not None:
+                return
+        logging.warning(
+            f"Process {process.pid} did not exit after SIGTERM, killing it."
+        )
+        _signal_group(process.pid, signal.SIGKILL)
+
+    timer = threading.Timer(timeout, _escalate)
+    timer.daemon = True
+    timer.start()
+
+
+def kill_group(process) -> None:
+    """Kill a process and the processes it started, and reap it.
+
+    Args:
+        process (subprocess.Popen): process to kill
+    """
+    _signal_group(process.pid, signal.SIGKILL)
+    process.wait()
+
+
+reaper = ProcessReaper()
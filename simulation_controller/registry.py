@@ -0,0 +1,366 @@
+"""Durable record of the simulations, kept in SQLite.
+
+The registry is shared by all workers and replicas of the app on one host.
+Each simulation is owned by one worker, which runs its SimPARTIX process and
+is the only one writing its state. Other workers read the state from the
+registry and hand run and stop requests over to the owner through it.
+
+SQLite in WAL mode and the `fcntl` locks need a local file system, the
+registry can not be shared between hosts through a network volume.
+"""
+
+import contextlib
+import fcntl
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+REGISTRY_PATH = os.environ.get(
+    "SIMPARTIX_REGISTRY_PATH", "/app/simulation_files/registry.sqlite"
+)
+
+# Seconds after which a worker without heartbeat is considered dead, and its
+# simulations are taken over by the other workers
+WORKER_LEASE = float(os.environ.get("SIMPARTIX_WORKER_LEASE", 10))
+
+HOST = socket.gethostname()
+
+# Identity of this worker process. The random suffix tells apart processes
+# that reuse the PID of a previous one, e.g. after a container restart.
+WORKER_ID = f"{HOST}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS simulations (
+    id TEXT PRIMARY KEY,
+    parameters TEXT NOT NULL,
+    state TEXT NOT NULL,
+    inputs_ready INTEGER NOT NULL,
+    output_status INTEGER NOT NULL,
+    error TEXT,
+    pid INTEGER,
+    priority INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    updated_at REAL NOT NULL,
+    owner TEXT,
+    requested_state TEXT,
+    version INTEGER NOT NULL DEFAULT 0,
+    deleted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS simulations_version ON simulations (version);
+CREATE TABLE IF NOT EXISTS sweeps (
+    id TEXT PRIMARY KEY,
+    members TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+"""
+
+# Columns added after the first version of the schema
+MIGRATIONS = {
+    "owner": "TEXT",
+    "requested_state": "TEXT",
+    "version": "INTEGER NOT NULL DEFAULT 0",
+    "deleted": "INTEGER NOT NULL DEFAULT 0",
+}
+
+# Every write takes the next version, so that workers can fetch the rows
+# changed since they last looked
+NEXT_VERSION = "(SELECT COALESCE(MAX(version), 0) + 1 FROM simulations)"
+
+
+class SimulationRegistry:
+    """Persist the state of every simulation across restarts.
+
+    Each simulation is a row holding its parameters, state, whether its
+    input files are ready, output status, error message, the PID of its
+    SimPARTIX process, the priority of a requested run and timestamps,
+    along with the worker owning it and a run or stop request for that
+    worker. Parameter sweeps are recorded as the list of their members.
+    """
+
+    def __init__(self, path: str = REGISTRY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connection = sqlite3.connect(
+            path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        columns = {
+            row["name"]
+            for row in self._connection.execute(
+                "PRAGMA table_info(simulations)"
+            )
+        }
+        if columns:
+            for name, definition in MIGRATIONS.items():
+                if name not in columns:
+                    self._connection.execute(
+                        f"ALTER TABLE simulations ADD {name} {definition}"
+                    )
+        self._connection.executescript(SCHEMA)
+
+    def _lock_path(self, id: str) -> str:
+        return os.path.join(
+            os.path.dirname(self.path) or ".", "locks", f"{id}.lock"
+        )
+
+    @contextlib.contextmanager
+    def lock(self, id: str):
+        """Hold an exclusive lock on a simulation across processes.
+
+        The lock file of a deleted simulation is removed by `delete`, with
+        the lock held, so a lock taken on a removed file is taken again.
+
+        Args:
+            id (str): id of the simulation
+        """
+        path = self._lock_path(id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        while True:
+            f = open(path, "a")
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                if os.path.samestat(os.fstat(f.fileno()), os.stat(path)):
+                    break
+            except FileNotFoundError:
+                pass
+            f.close()
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+            f.close()
+
+    def _execute(self, sql: str, parameters=()) -> int:
+        """Run a write statement, returning the number of changed rows."""
+        with self._lock:
+            return self._connection.execute(sql, parameters).rowcount
+
+    def _query(self, sql: str, parameters=()) -> list:
+        """Run a query, returning the rows as dictionaries."""
+        with self._lock:
+            rows = self._connection.execute(sql, parameters).fetchall()
+        return [dict(row) for row in rows]
+
+    def save(self, simulation) -> None:
+        """Insert or update the row of a simulation.
+
+        A pending run or stop request is kept.
+
+        Args:
+            simulation (Simulation): simulation to persist
+        """
+        process = simulation.process
+        self._execute(
+            "INSERT INTO simulations (id, parameters, state, inputs_ready, "
+            "output_status, error, pid, priority, created_at, started_at, "
+            "updated_at, owner, version) VALUES "
+            f"(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, {NEXT_VERSION}) "
+            "ON CONFLICT (id) DO UPDATE SET state = excluded.state, "
+            "inputs_ready = excluded.inputs_ready, "
+            "output_status = excluded.output_status, "
+            "error = excluded.error, pid = excluded.pid, "
+            "priority = excluded.priority, "
+            "started_at = excluded.started_at, "
+            "updated_at = excluded.updated_at, owner = excluded.owner, "
+            "version = excluded.version",
+            (
+                simulation.id,
+                json.dumps(simulation.parameters.dict()),
+                simulation.status.value,
+                simulation.inputs_ready,
+                simulation.output_status.value,
+                simulation.error,
+                None if process is None else process.pid,
+                simulation.priority,
+                simulation.created_at,
+                simulation.started_at,
+                time.time(),
+                simulation.owner,
+            ),
+        )
+
+    def delete(self, id: str) -> None:
+        """Mark the row of a simulation as deleted, and remove its lock file.
+
+        The row is kept, so that other workers learn about the deletion.
+        The lock of the simulation must be held.
+
+        Args:
+            id (str): id of the simulation
+        """
+        self._execute(
+            "UPDATE simulations SET deleted = 1, requested_state = NULL, "
+            f"updated_at = ?, version = {NEXT_VERSION} WHERE id = ?",
+            (time.time(), id),
+        )
+        try:
+            os.remove(self._lock_path(id))
+        except FileNotFoundError:
+            pass
+
+    def changes(self, since: int) -> list:
+        """Return the rows written after a version, deleted ones included.
+
+        Args:
+            since (int): last version already seen
+
+        Returns:
+            list: rows as dictionaries, by increasing version
+        """
+        return self._query(
+            "SELECT * FROM simulations WHERE version > ? ORDER BY version",
+            (since,),
+        )
+
+    def request(self, id: str, state: str, priority: int = None) -> None:
+        """Ask the owner of a simulation to run, stop or pause it.
+
+        Args:
+            id (str): id of the simulation
+            state (str): "RUNNING", "STOPPED" or "PAUSED"
+            priority (int): queue priority of a run
+        """
+        self._execute(
+            "UPDATE simulations SET requested_state = ?, "
+            "priority = COALESCE(?, priority) WHERE id = ? AND NOT deleted",
+            (state, priority, id),
+        )
+
+    def requests(self, owner: str) -> list:
+        """Return the rows of a worker with a pending request.
+
+        Args:
+            owner (str): id of the worker
+
+        Returns:
+            list: rows as dictionaries
+        """
+        return self._query(
+            "SELECT * FROM simulations WHERE owner = ? AND NOT deleted "
+            "AND requested_state IS NOT NULL",
+            (owner,),
+        )
+
+    def clear_request(self, id: str, state: str) -> bool:
+        """Mark a request as handled, unless it was replaced meanwhile.
+
+        Args:
+            id (str): id of the simulation
+            state (str): the handled request
+
+        Returns:
+            bool: whether the request was still pending
+        """
+        return (
+            self._execute(
+                "UPDATE simulations SET requested_state = NULL "
+                "WHERE id = ? AND requested_state = ?",
+                (id, state),
+            )
+            == 1
+        )
+
+    def save_sweep(self, id: str, members: list, created_at: float) -> None:
+        """Record the members of a parameter sweep.
+
+        Args:
+            id (str): id of the sweep
+            members (list): ids of its simulations, in sweep order
+            created_at (float): Unix time of creation
+        """
+        self._execute(
+            "INSERT INTO sweeps VALUES (?, ?, ?)",
+            (id, json.dumps(members), created_at),
+        )
+
+    def sweep(self, id: str):
+        """Return a parameter sweep.
+
+        Args:
+            id (str): id of the sweep
+
+        Returns:
+            dict: id, member ids and creation time, or None if unknown
+        """
+        rows = self._query("SELECT * FROM sweeps WHERE id = ?", (id,))
+        if not rows:
+            return None
+        return {**rows[0], "members": json.loads(rows[0]["members"])}
+
+    def heartbeat(self, worker: str) -> None:
+        """Record that a worker is alive, and forget long dead ones.
+
+        Args:
+            worker (str): id of the worker
+        """
+        now = time.time()
+        self._execute(
+            "INSERT OR REPLACE INTO workers VALUES (?, ?)", (worker, now)
+        )
+        self._execute(
+            "DELETE FROM workers WHERE heartbeat < ?",
+            (now - 100 * WORKER_LEASE,),
+        )
+
+    def orphans(self, lease: float = WORKER_LEASE) -> list:
+        """Return the rows owned by no live worker, oldest first.
+
+        Args:
+            lease (float): seconds without heartbeat after which a worker
+                is considered dead
+
+        Returns:
+            list: rows as dictionaries
+        """
+        return self._query(
+            "SELECT * FROM simulations WHERE NOT deleted AND (owner IS NULL "
+            "OR owner NOT IN (SELECT id FROM workers WHERE heartbeat > ?)) "
+            "ORDER BY created_at",
+            (time.time() - lease,),
+        )
+
+    def running(self, host: str = HOST) -> list:
+        """Return the rows of the SimPARTIX processes started on a host.
+
+        Args:
+            host (str): host name, as in the worker ids
+
+        Returns:
+            list: rows as dictionaries
+        """
+        return self._query(
+            "SELECT * FROM simulations WHERE NOT deleted AND state = ? "
+            "AND pid IS NOT NULL AND substr(owner, 1, length(?)) = ?",
+            ("RUNNING", f"{host}:", f"{host}:"),
+        )
+
+    def claim(self, id: str, owner: str, previous: str) -> bool:
+        """Take over a simulation, unless another worker was faster.
+
+        Args:
+            id (str): id of the simulation
+            owner (str): id of the new owner
+            previous (str): id of the owner the simulation is taken from
+
+        Returns:
+            bool: whether the simulation is now owned by `owner`
+        """
+        return (
+            self._execute(
+                f"UPDATE simulations SET owner = ?, version = {NEXT_VERSION} "
+                "WHERE id = ? AND owner IS ? AND NOT deleted",
+                (owner, id, previous),
+            )
+            == 1
+        )
@@ -0,0 +1,192 @@
+"""CPU cores, threads and scheduling priority of the SimPARTIX processes.
+
+Every run is pinned to its own set of cores, is told to start as many
+threads as it has cores, and runs at a lower priority than the API and the
+postprocessing, so that concurrent runs do not oversubscribe the node.
+"""
+
+import logging
+import os
+import threading
+
+from simulation_controller.scheduler import CORES_PER_SIMULATION
+
+
+def _parse_cores(value: str) -> list:
+    """Parse a list of cores such as "0-7,16-23"."""
+    cores = set()
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        first, _, last = part.partition("-")
+        cores.update(range(int(first), int(last or first) + 1))
+    return sorted(cores)
+
+
+# Cores shared out between the runs, by default all cores the app may run
+# on. The cores of the runs of other workers on the host are left out.
+SIMULATION_CORES = [
+    core
+    for core in _parse_cores(os.environ.get("SIMPARTIX_SIMULATION_CORES", ""))
+    if core in os.sched_getaffinity(0)
+] or sorted(os.sched_getaffinity(0))
+
+# Niceness of the SimPARTIX processes
+SIMULATION_NICE = int(os.environ.get("SIMPARTIX_SIMULATION_NICE", 10))
+
+# Variables setting the number of threads of the usual parallel runtimes
+THREAD_VARIABLES = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+)
+
+
+class CoreAllocator:
+    """Hand out disjoint sets of cores to the running simulations.
+
+    Cores the processes of other workers are pinned to are not handed out.
+    When all cores are taken, e.g. because more concurrent simulations are
+    allowed than there are cores, further runs share all cores.
+    """
+
+    def __init__(
+        self,
+        cores: list = SIMULATION_CORES,
+        cores_per_simulation: int = CORES_PER_SIMULATION,
+    ):
+        self.cores = list(cores)
+        self.cores_per_simulation = cores_per_simulation
+        self._used: dict = {}
+        self._excluded: set = set()
+        self._lock = threading.Lock()
+
+    def allocate(self) -> list:
+        """Reserve the cores of a new run.
+
+        Returns:
+            list: cores of the run, by preference contiguous
+        """
+        with self._lock:
+            free = [
+                core
+                for core in self.cores
+                if not self._used.get(core) and core not in self._excluded
+            ]
+            if not free:
+                logging.warning(
+                    "No free cores left, the run shares all cores."
+                )
+                chosen = list(self.cores)
+            else:
+                chosen = free[: self.cores_per_simulation]
+            for core in chosen:
+                self._used[core] = self._used.get(core, 0) + 1
+            return chosen
+
+    def reserve(self, pid: int) -> list:
+        """Reserve the cores a running process is pinned to, e.g. a process
+        started by an earlier instance of the app.
+
+        Args:
+            pid (int): process id
+
+        Returns:
+            list: cores of the process
+        """
+        try:
+            cores = sorted(os.sched_getaffinity(pid) & set(self.cores))
+        except OSError:
+            return []
+        with self._lock:
+            for core in cores:
+                self._used[core] = self._used.get(core, 0) + 1
+        return cores
+
+    def exclude(self, pids: list) -> None:
+        """Keep the cores of processes outside this worker out of new runs.
+
+        Args:
+            pids (list): ids of the processes, replacing the previous ones
+        """
+        excluded = set()
+        for pid in pids:
+            try:
+                excluded |= os.sched_getaffinity(pid)
+            except OSError:
+                continue
+        with self._lock:
+            self._excluded = excluded
+
+    def release(self, cores: list) -> None:
+        """Give back the cores of a run that has exited.
+
+        Args:
+            cores (list): cores returned by `allocate` or `reserve`
+        """
+        with self._lock:
+            for core in cores:
+                if self._used.get(core):
+                    self._used[core] -= 1
+
+
+def environment(cores: list) -> dict:
+    """Environment of a SimPARTIX process running on `cores`.
+
+    Args:
+        cores (list): cores of the run
+
+    Returns:
+        dict: environment of the app, with the thread counts set
+    """
+    threads = str(max(len(cores), 1))
+    return {**os.environ, **{name: threads for name in THREAD_VARIABLES}}
+
+
+def restrict(cores: list):
+    """Function pinning the calling process to `cores` and lowering its
+    priority.
+
+    It is the `preexec_fn` of the SimPARTIX processes: it runs in the child
+    before exec, so every thread the solver starts inherits the affinity
+    and the niceness. It must not log, failures are reported by `check`.
+
+    Args:
+        cores (list): cores of the run
+
+    Returns:
+        callable: function without arguments
+    """
+
+    def _restrict():
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError:
+            pass
+        try:
+            os.setpriority(os.PRIO_PROCESS, 0, SIMULATION_NICE)
+        except OSError:
+            pass
+
+    return _restrict
+
+
+def check(pid: int, cores: list) -> None:
+    """Log if a process started with `restrict` runs without the
+    restriction.
+
+    Args:
+        pid (int): process id
+        cores (list): cores of the run
+    """
+    try:
+        if os.sched_getaffinity(pid) != set(cores):
+            logging.warning(f"Could not pin process {pid} to cores {cores}.")
+        if os.getpriority(os.PRIO_PROCESS, pid) < SIMULATION_NICE:
+            logging.warning(f"Could not lower the priority of process {pid}.")
+    except OSError:
+        # The process has exited already
+        pass
+
+
+core_allocator = CoreAllocator()
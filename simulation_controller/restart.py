@@ -0,0 +1,192 @@
+"""Resume paused SimPARTIX runs from their last complete output frame.
+
+A resumed run is a new segment: SimPARTIX restarts from the last complete
+frame of ``output/output.h5part`` and writes to ``output/segment.h5part``.
+When the segment ends, its frames are appended to ``output/output.h5part``,
+so postprocessing always sees one continuous sequence of frames.
+
+The restart settings are written to ``input/simulation.conf``, which
+SimPARTIX reads, and the original configuration is kept aside to run the
+simulation from the start again. Input files may be hard links into the
+input cache, so they are replaced, never modified in place.
+"""
+
+import logging
+import os
+
+OUTPUT_FILENAME = os.path.join("output", "output.h5part")
+SEGMENT_FILENAME = os.path.join("output", "segment.h5part")
+CONFIG_FILENAME = os.path.join("input", "simulation.conf")
+ORIGINAL_CONFIG_FILENAME = os.path.join("input", "simulation.conf.orig")
+
+# Marks a simulation whose next run resumes the paused one
+PAUSED_FILENAME = "paused"
+
+
+def mark_paused(basePath: str) -> None:
+    """Resume from the last complete frame on the next run."""
+    open(os.path.join(basePath, PAUSED_FILENAME), "w").close()
+
+
+def clear_paused(basePath: str) -> None:
+    """Start from the beginning on the next run."""
+    try:
+        os.remove(os.path.join(basePath, PAUSED_FILENAME))
+    except FileNotFoundError:
+        pass
+
+
+def is_paused(basePath: str) -> bool:
+    return os.path.isfile(os.path.join(basePath, PAUSED_FILENAME))
+
+
+def _is_complete(step) -> bool:
+    """Whether all datasets of a frame were written for all particles."""
+    import h5py
+
+    lengths = {
+        len(dataset)
+        for dataset in step.values()
+        if isinstance(dataset, h5py.Dataset)
+    }
+    return "x" in step and len(lengths) == 1
+
+
+def complete_frames(path: str) -> int:
+    """Number of leading complete frames of an H5Part file.
+
+    Args:
+        path (str): H5Part file
+
+    Returns:
+        int: number of frames, 0 if the file is missing or unreadable
+    """
+    import h5py
+
+    from simulation_controller.h5part import step_names
+
+    try:
+        with h5py.File(path, "r") as f:
+            count = 0
+            for name in step_names(f):
+                if not _is_complete(f[name]):
+                    break
+                count += 1
+            return count
+    except (OSError, KeyError) as e:
+        logging.warning(f"Could not read the frames of '{path}': {e}")
+        return 0
+
+
+def stitch(basePath: str) -> int:
+    """Append the complete frames of a segment to the output, and remove
+    the segment.
+
+    The first frame of a segment repeats the frame it restarted from and is
+    skipped.
+
+    Args:
+        basePath (str): folder of the simulation
+
+    Returns:
+        int: number of appended frames
+    """
+    import h5py
+
+    from simulation_controller.h5part import frame_times, step_names
+
+    segment = os.path.join(basePath, SEGMENT_FILENAME)
+    if not os.path.isfile(segment):
+        return 0
+    output = os.path.join(basePath, OUTPUT_FILENAME)
+    frames = complete_frames(segment)
+    appended = 0
+    if frames:
+        last_time = frame_times(output)[-1]
+        times = frame_times(segment)
+        with h5py.File(output, "a") as out, h5py.File(segment, "r") as seg:
+            frame = len(step_names(out))
+            for name, time in zip(step_names(seg)[:frames], times):
+                if time <= last_time:
+                    continue
+                seg.copy(seg[name], out, name=f"Step#{frame + appended}")
+                appended += 1
+    os.remove(segment)
+    logging.info(f"{appended} frames of a resumed run stitched in {basePath}.")
+    return appended
+
+
+def _write_config(basePath: str, settings: dict) -> None:
+    """Write `simulation.conf` as the original one with some settings
+    replaced or added."""
+    original = os.path.join(basePath, ORIGINAL_CONFIG_FILENAME)
+    config = os.path.join(basePath, CONFIG_FILENAME)
+    settings = dict(settings)
+    lines = []
+    with open(original) as f:
+        for line in f:
+            name, equal, _ = line.split("#", 1)[0].partition("=")
+            if equal and name.strip() in settings:
+                name = name.strip()
+                line = f"{name} = {settings.pop(name)}\n"
+            lines.append(line)
+    if lines and not lines[-1].endswith("\n"):
+        lines.append("\n")
+    lines.extend(f"{name} = {value}\n" for name, value in settings.items())
+    with open(f"{config}.tmp", "w") as f:
+        f.writelines(lines)
+    os.replace(f"{config}.tmp", config)
+
+
+def prepare_restart(basePath: str):
+    """Configure SimPARTIX to continue a paused run.
+
+    The output is cut after its last complete frame, and the run restarts
+    from that frame and time, reading the particle velocities back.
+
+    Args:
+        basePath (str): folder of the simulation
+
+    Returns:
+        int: frame the run restarts from, or None if there is no complete
+            frame to restart from
+    """
+    import h5py
+
+    from simulation_controller.h5part import frame_times, step_names
+
+    stitch(basePath)
+    output = os.path.join(basePath, OUTPUT_FILENAME)
+    frames = complete_frames(output)
+    if frames == 0:
+        return None
+    with h5py.File(output, "a") as f:
+        for name in step_names(f)[frames:]:
+            del f[name]
+    frame = frames - 1
+    time = frame_times(output)[frame]
+    original = os.path.join(basePath, ORIGINAL_CONFIG_FILENAME)
+    if not os.path.isfile(original):
+        os.link(os.path.join(basePath, CONFIG_FILENAME), original)
+    _write_config(
+        basePath,
+        {
+            "startTime": f"{time:.10e}",
+            "inputFrame": frame,
+            "h5PartInputFilename": OUTPUT_FILENAME,
+            "h5PartOutputFilename": SEGMENT_FILENAME,
+            "isReadVelocity": "true",
+        },
+    )
+    return frame
+
+
+def reset(basePath: str) -> None:
+    """Restore the original configuration, to run from the start."""
+    original = os.path.join(basePath, ORIGINAL_CONFIG_FILENAME)
+    if os.path.isfile(original):
+        os.replace(original, os.path.join(basePath, CONFIG_FILENAME))
+    segment = os.path.join(basePath, SEGMENT_FILENAME)
+    if os.path.isfile(segment):
+        os.remove(segment)
+    clear_paused(basePath)
@@ -0,0 +1,231 @@
+"""Admission control for SimPARTIX runs."""
+
+import contextlib
+import heapq
+import itertools
+import logging
+import os
+import queue
+import threading
+
+from models.transformation import SimulationState
+from simulation_controller.metrics import QUEUE_DEPTH, RUNNING_PROCESSES
+
+# Number of cores requested by a single run (see `cores.x` in
+# templates/simulation.template).
+CORES_PER_SIMULATION = 8
+
+MAX_CONCURRENT_SIMULATIONS = int(
+    os.environ.get(
+        "SIMPARTIX_MAX_CONCURRENT_SIMULATIONS",
+        max(1, (os.cpu_count() or 1) // CORES_PER_SIMULATION),
+    )
+)
+
+
+class Scheduler:
+    """Start simulations up to a concurrency limit and queue the rest.
+
+    Queued simulations are started by descending priority and, for equal
+    priorities, in the order they were submitted.
+
+    The limit applies to the whole host when the runs of the other workers
+    of the host are known: admissions are then serialized with `host_lock`,
+    and the runs and cores of the other workers are counted against the
+    limit and kept out of new runs.
+
+    Runs exiting only hand their slot back, queued simulations are then
+    started by an admission thread, so that starting a run, e.g. copying
+    the frames of a restart, does not hold up the process reaper.
+
+    Args:
+        max_concurrent (int): runs allowed at once
+        host_lock (callable): returns a context manager holding admission
+            for the host, across the workers
+        host_runs (callable): returns the PIDs of the runs of the other
+            workers of the host
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT_SIMULATIONS,
+        host_lock=None,
+        host_runs=None,
+    ):
+        if max_concurrent < 1:
+            raise ValueError("At least one concurrent simulation is required.")
+        self.max_concurrent = max_concurrent
+        self._host_lock = host_lock or contextlib.nullcontext
+        self._host_runs = host_runs or list
+        self._lock = threading.RLock()
+        self._counter = itertools.count()
+        self._queue: list = []
+        self._queued: dict = {}
+        self._running: dict = {}
+        self._admitting = False
+        self._released = queue.SimpleQueue()
+        self._wakeup = threading.Event()
+        threading.Thread(
+            target=self._admission_loop, name="admission", daemon=True
+        ).start()
+
+    def submit(self, simulation, priority: int = 0) -> None:
+        """Start a simulation now or queue it until a slot is free.
+
+        Args:
+            simulation (Simulation): simulation to run
+            priority (int): higher values are started first
+
+        Raises:
+            RuntimeError: when the simulation is already queued or running
+        """
+        with self._lock:
+            self._free_slots()
+            if simulation.id in self._queued or simulation.id in self._running:
+                msg = f"Simulation '{simulation.id}' already in progress."
+                logging.error(msg)
+                raise RuntimeError(msg)
+            entry = [-priority, next(self._counter), simulation]
+            self._queued[simulation.id] = entry
+            heapq.heappush(self._queue, entry)
+            simulation.status = SimulationState.QUEUED
+            logging.info(
+                f"Simulation '{simulation.id}' queued with priority "
+                f"{priority}."
+            )
+            self._admit()
+            self._update_metrics()
+
+    def adopt(self, simulation) -> None:
+        """Count a simulation restored in RUNNING state against the limit.
+
+        Args:
+            simulation (Simulation): simulation whose process is running
+        """
+        with self._lock:
+            self._running[simulation.id] = simulation
+            simulation.adopt(on_exit=self.release)
+            self._update_metrics()
+
+    def cancel(self, simulation) -> bool:
+        """Remove a simulation from the queue.
+
+        Args:
+            simulation (Simulation): simulation to remove
+
+        Returns:
+            bool: whether the simulation was waiting in the queue
+        """
+        with self._lock:
+            entry = self._queued.pop(simulation.id, None)
+            if entry is None:
+                return False
+            # Lazy deletion, the entry is skipped when popped
+            entry[-1] = None
+            self._update_metrics()
+            return True
+
+    def release(self, simulation) -> None:
+        """Free the slot held by a simulation and start queued ones.
+
+        Called by the process reaper, the queued simulations are started by
+        the admission thread.
+
+        Args:
+            simulation (Simulation): simulation that stopped running
+        """
+        self._released.put(simulation)
+        self._wakeup.set()
+
+    def admit(self) -> None:
+        """Start queued simulations if slots are free, e.g. after runs of
+        other workers of the host have exited."""
+        self._wakeup.set()
+
+    def queue_position(self, simulation):
+        """Position of a simulation in the queue.
+
+        Args:
+            simulation (Simulation): queued simulation
+
+        Returns:
+            int: 1-based position, or None if the simulation is not queued
+        """
+        with self._lock:
+            entry = self._queued.get(simulation.id)
+            if entry is None:
+                return None
+            return 1 + sum(
+                1 for other in self._queued.values() if other[:2] < entry[:2]
+            )
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queued)
+
+    @property
+    def running_count(self) -> int:
+        return len(self._running)
+
+    def _admission_loop(self) -> None:
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                with self._lock:
+                    self._admit()
+                    self._update_metrics()
+            except Exception as e:
+                logging.error(
+                    "Error while starting queued simulations. "
+                    f"Error message: {e}"
+                )
+
+    def _free_slots(self) -> None:
+        """Forget the released runs, with the lock held."""
+        while True:
+            try:
+                simulation = self._released.get_nowait()
+            except queue.Empty:
+                return
+            self._running.pop(simulation.id, None)
+
+    def _admit(self) -> None:
+        from simulation_controller.resources import core_allocator
+
+        self._free_slots()
+        # The host lock is not reentrant, and the loop below goes on anyway
+        if self._admitting or not self._queue:
+            return
+        self._admitting = True
+        try:
+            with self._host_lock():
+                others = self._host_runs()
+                core_allocator.exclude(others)
+                while (
+                    self._queue
+                    and len(self._running) + len(others) < self.max_concurrent
+                ):
+                    self._start(heapq.heappop(self._queue)[-1])
+        finally:
+            self._admitting = False
+
+    def _start(self, simulation) -> None:
+        if simulation is None:
+            return
+        del self._queued[simulation.id]
+        self._running[simulation.id] = simulation
+        try:
+            simulation.run(on_exit=self.release)
+        except Exception as e:
+            del self._running[simulation.id]
+            simulation.error = f"SimPARTIX could not be started: {e}"
+            simulation.status = SimulationState.FAILED
+            logging.error(
+                f"Simulation '{simulation.id}' could not be started. "
+                f"Error message: {e}"
+            )
+
+    def _update_metrics(self) -> None:
+        QUEUE_DEPTH.set(len(self._queued))
+        RUNNING_PROCESSES.set(len(self._running))
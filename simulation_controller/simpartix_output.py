@@ -1,5 +1,14 @@
 """Model for the output of a SimPARTIX simulation."""
 
+# Properties of the SimPARTIXOutput entity, with the key of the postprocessing
+# result they are read from and their dtype
+OUTPUT_PROPERTIES = {
+    "elapsed_time": ("elapsed_time", "float64"),
+    "temperature": ("Temperature_SPH", "float64"),
+    "group": ("Group", "int64"),
+    "state_of_matter": ("StateOfMatter_SPH", "float64"),
+}
+
 
 class SimPARTIXOutput:
     def __init__(self, id, elapsed_time, temperature, group, state_of_matter):
@@ -1,4 +1,5 @@
 import enum
+import functools
 import json
 import logging
 import os
@@ -8,19 +9,73 @@ import threading
 import time
 import uuid
 
-import dlite
-from marketplace_standard_app_api.models.transformation import (
-    TransformationState,
+from models.transformation import SimulationState, TransformationInput
+from simulation_controller import restart, storage
+from simulation_controller.frame_follower import frame_follower
+from simulation_controller.input_cache import link_or_copy
+from simulation_controller.log_capture import log_path, log_rotator, open_log
+from simulation_controller.metrics import STAGE_FAILURES, STAGE_SECONDS, stage
+from simulation_controller.progress import estimate_progress, reached_end
+from simulation_controller.reaper import (
+    AdoptedProcess,
+    kill_group,
+    reaper,
+    terminate_group,
+)
+from simulation_controller.resources import (
+    check,
+    core_allocator,
+    environment,
+    restrict,
+)
+from simulation_controller.simpartix_output import (
+    OUTPUT_PROPERTIES,
+    SimPARTIXOutput,
 )
 
-from models.transformation import TransformationInput
-from simulation_controller.propartix_files_creation import (
-    create_input_files,
-    get_output_values,
+SIMULATIONS_FOLDER_PATH = os.environ.get(
+    "SIMPARTIX_SIMULATIONS_PATH", "/app/simulation_files"
 )
-from simulation_controller.simpartix_output import SimPARTIXOutput
 
-SIMULATIONS_FOLDER_PATH = "/app/simulation_files"
+# Formats in which the output is stored: DLite JSON and/or one NumPy .npy
+# array per property
+OUTPUT_FORMATS = set(
+    os.environ.get("SIMPARTIX_OUTPUT_FORMATS", "json,npy").split(",")
+)
+
+# Folder of the cached previews, see `preview.PREVIEW_FOLDER`
+PREVIEW_FOLDER = "preview"
+
+# Folder of the output grids, see `pyramid.PYRAMID_FOLDER`
+PYRAMID_FOLDER = "pyramid"
+
+# Command starting the solver in the folder of a simulation
+SIMPARTIX_COMMAND = ["SimPARTIX"]
+
+
+def create_input_files(foldername: str, simulation_input: TransformationInput):
+    """Generate the input files of a simulation, see
+    `propartix_files_creation.create_input_files`.
+
+    ProPARTIX is imported by the process running the generation, so that
+    the API starts without it.
+    """
+    from simulation_controller import propartix_files_creation
+
+    propartix_files_creation.create_input_files(foldername, simulation_input)
+
+
+@functools.lru_cache(maxsize=None)
+def _dlite_output_class():
+    """DLite class of the SimPARTIXOutput entity, built on first use."""
+    import dlite
+
+    dlite_schema_path = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "SimPARTIXOutput.yml"
+    )
+    return dlite.classfactory(
+        SimPARTIXOutput, url=f"yaml://{dlite_schema_path}"
+    )
 
 
 class OutputStatus(enum.Enum):
@@ -32,51 +87,100 @@ class OutputStatus(enum.Enum):
 class Simulation:
     """Manage a single simulation."""
 
-    def __init__(self, simulation_input: TransformationInput):
-        self.id: str = str(uuid.uuid4())
+    def __init__(self, simulation_input: TransformationInput, id: str = None):
+        self.id: str = id if id is not None else str(uuid.uuid4())
         self.simulationPath = os.path.join(SIMULATIONS_FOLDER_PATH, self.id)
-        create_input_files(self.simulationPath, simulation_input)
         self.parameters = simulation_input
-        self._status: TransformationState = TransformationState.CREATED
+        self._status: SimulationState = SimulationState.PREPARING
+        self.error = None
+        self.inputs_ready = False
+        # Priority of the requested run, None if no run was requested
+        self.priority = None
+        self.created_at = time.time()
+        self.started_at = None
+        # Worker running the simulation, see `registry.WORKER_ID`
+        self.owner = None
         self._process = None
+        self._on_exit = None
+        # Whether the process was terminated to pause the simulation
+        self._pausing = False
+        # Cores of the processes of the simulation, by PID
+        self._cores: dict = {}
+        self._listeners = []
+        self._lock = threading.Lock()
         self.output_status = OutputStatus.MISSING
         logging.info(
             f"Simulation '{self.id}' with "
             f"configuration {simulation_input} created."
         )
 
+    @classmethod
+    def restore(cls, record: dict) -> "Simulation":
+        """Rebuild a simulation from its registry record.
+
+        The process and output preparation are not resumed, see `adopt`
+        and `resume_output`.
+
+        Args:
+            record (dict): row of the simulation registry
+
+        Returns:
+            Simulation: the simulation, in its recorded state
+        """
+        simulation = cls(
+            TransformationInput.parse_raw(record["parameters"]), record["id"]
+        )
+        simulation.created_at = record["created_at"]
+        simulation.refresh(record)
+        return simulation
+
+    def refresh(self, record: dict) -> None:
+        """Update the simulation from its registry record.
+
+        Listeners are not called, the record is written by another worker.
+
+        Args:
+            record (dict): row of the simulation registry
+        """
+        self._status = SimulationState(record["state"])
+        self.output_status = OutputStatus(record["output_status"])
+        self.error = record["error"]
+        self.priority = record["priority"]
+        self.started_at = record["started_at"]
+        self.inputs_ready = bool(record["inputs_ready"])
+        self.owner = record["owner"]
+        pid = record["pid"]
+        if pid is None:
+            self._process = None
+        elif self._process is None or self._process.pid != pid:
+            self._process = AdoptedProcess(pid)
+
     @property
-    def status(self) -> TransformationState:
+    def status(self) -> SimulationState:
         """Getter for the status.
 
-        If the simulation is running, the process is checked for completion.
+        Transitions of running simulations are driven by the process reaper,
+        so reading the status never blocks or polls the process.
 
         Returns:
-            TransformationState: status of the simulation
-        """
-        if self._status == TransformationState.RUNNING:
-            if self.output_status == OutputStatus.MISSING:
-                process_status = self.process.poll()
-                if process_status is None:
-                    return TransformationState.RUNNING
-                elif process_status == 0:
-                    logging.info(
-                        f"Simulation '{self.id}' is finished computing."
-                    )
-                    self.output_status = OutputStatus.COMPUTING
-                    threading.Thread(
-                        target=self._prepare_output, name=f"output_{self.id}"
-                    ).start()
-                else:
-                    logging.error(f"Error occurred in simulation '{self.id}'.")
-                    self.status = TransformationState.FAILED
-            elif self.output_status == OutputStatus.READY:
-                self.status = TransformationState.COMPLETED
+            SimulationState: status of the simulation
+        """
         return self._status
 
     @status.setter
-    def status(self, value: TransformationState):
+    def status(self, value: SimulationState):
         self._status = value
+        for listener in self._listeners:
+            listener(self, value)
+
+    def add_listener(self, listener) -> None:
+        """Register a callback for state transitions.
+
+        Args:
+            listener (callable): called with the simulation and its new state
+                every time the state is set
+        """
+        self._listeners.append(listener)
 
     @property
     def process(self):
@@ -86,45 +190,263 @@ class Simulation:
     def process(self, value):
         self._process = value
 
-    def run(self):
+    def prepare(self, executor, on_ready=None) -> None:
+        """Generate the input files of the simulation in the background.
+
+        The simulation stays PREPARING until the input files are written,
+        and is then CREATED, or FAILED if the generation raised an error.
+
+        Args:
+            executor (concurrent.futures.Executor): executor running the
+                input generation
+            on_ready (callable): called with the simulation once the
+                preparation has finished
+        """
+
+        def _done(future):
+            error = future.exception()
+            if error is None:
+                self.inputs_ready = True
+                self.status = SimulationState.CREATED
+                logging.info(f"Input files of simulation '{self.id}' ready.")
+            else:
+                self.error = f"Input generation failed: {error}"
+                self.status = SimulationState.FAILED
+                logging.error(
+                    f"Error while creating the input files of simulation "
+                    f"'{self.id}'. Error message: {error}"
+                )
+            if on_ready is not None:
+                on_ready(self)
+
+        future = executor.submit(
+            create_input_files, self.simulationPath, self.parameters
+        )
+        future.add_done_callback(_done)
+
+    def run(self, on_exit=None):
         """
         Start running a simulation.
 
         A new process that calls the SimPARTIX binary is spawned,
-        and the output is stored in a separate directory
+        and the output is stored in a separate directory. A PAUSED
+        simulation continues from its last complete output frame.
+
+        Args:
+            on_exit (callable): called with the simulation once the process
+                has exited or was stopped
 
         Raises:
             RuntimeError: when the simulation is already in progress
         """
-        if self.status == TransformationState.RUNNING:
+        if self.status == SimulationState.RUNNING:
             msg = f"Simulation '{self.id}' already in progress."
             logging.error(msg)
             raise RuntimeError(msg)
+        if not self.inputs_ready:
+            msg = (
+                f"Simulation '{self.id}' cannot be started, "
+                "its input files are not available."
+            )
+            logging.error(msg)
+            raise RuntimeError(msg)
         outputPath = os.path.join(self.simulationPath, "output")
         if not os.path.isdir(outputPath):
             os.mkdir(outputPath)
-        os.chdir(self.simulationPath)
-        self.process = subprocess.Popen(["SimPARTIX"], stdout=subprocess.PIPE)
-        self.status = TransformationState.RUNNING
-        logging.info(f"Simulation '{self.id}' started successfully.")
-        self._refresh_status()
+        frame = None
+        if restart.is_paused(self.simulationPath):
+            frame = restart.prepare_restart(self.simulationPath)
+        if frame is None:
+            restart.reset(self.simulationPath)
+            storage.remove_compressed(self.simulationPath)
+            # Frames converted during a previous run are outdated, and are
+            # read from its output once their folder is removed
+            for folder in ("frames", PREVIEW_FOLDER, PYRAMID_FOLDER):
+                shutil.rmtree(
+                    os.path.join(self.simulationPath, folder),
+                    ignore_errors=True,
+                )
+        cores = core_allocator.allocate()
+        process = None
+        try:
+            with self._lock, open_log(self.simulationPath) as log:
+                # In its own process group, so that stopping the simulation
+                # terminates every process SimPARTIX started
+                process = subprocess.Popen(
+                    SIMPARTIX_COMMAND,
+                    stdout=log,
+                    stderr=subprocess.STDOUT,
+                    cwd=self.simulationPath,
+                    env=environment(cores),
+                    preexec_fn=restrict(cores),
+                    start_new_session=True,
+                )
+                self._cores[process.pid] = cores
+                self.process = process
+                check(process.pid, cores)
+                self._on_exit = on_exit
+                self._pausing = False
+                self.output_status = OutputStatus.MISSING
+                self.error = None
+                self.started_at = time.time()
+                self.status = SimulationState.RUNNING
+            reaper.watch(process, self._on_process_exit)
+            frame_follower.follow(self.simulationPath)
+            log_rotator.watch(self.simulationPath)
+        except Exception:
+            if process is None:
+                core_allocator.release(cores)
+            else:
+                self._abort_run(process)
+            raise
+        restart.clear_paused(self.simulationPath)
+        if frame is None:
+            logging.info(f"Simulation '{self.id}' started successfully.")
+        else:
+            logging.info(f"Simulation '{self.id}' resumed from frame {frame}.")
+
+    def _abort_run(self, process) -> None:
+        """Kill a SimPARTIX process whose start could not be completed.
+
+        The process is forgotten, so that its exit is ignored, and the
+        caller reports the error.
+
+        Args:
+            process (subprocess.Popen): the started process
+        """
+        with self._lock:
+            if self.process is process:
+                self.process = None
+            self._on_exit = None
+            core_allocator.release(self._cores.pop(process.pid, []))
+        frame_follower.unfollow(self.simulationPath)
+        log_rotator.unwatch(self.simulationPath)
+        kill_group(process)
+        logging.error(
+            f"Start of simulation '{self.id}' aborted, process {process.pid} "
+            "killed."
+        )
+
+    def adopt(self, on_exit=None) -> None:
+        """Watch the SimPARTIX process of a restored RUNNING simulation.
+
+        Args:
+            on_exit (callable): called with the simulation once the process
+                has exited or was stopped
+        """
+        self._on_exit = on_exit
+        self._cores[self.process.pid] = core_allocator.reserve(
+            self.process.pid
+        )
+        reaper.watch(self.process, self._on_process_exit)
+        frame_follower.follow(self.simulationPath)
+        log_rotator.watch(self.simulationPath)
+        logging.info(
+            f"Simulation '{self.id}' adopted with process {self.process.pid}."
+        )
 
-    def _refresh_status(self) -> None:
-        """Utility function that periodically triggers the status check.
+    def resume_output(self) -> None:
+        """Prepare the output of a restored run whose process has exited.
 
-        The purpose of this function is to generate the output files without
-        having to wait for a request from the user. It is only relevant for
-        running simulations, to know when they are done.
+        The exit status of the process is unknown, see `_finish_adopted`.
         """
+        self.output_status = OutputStatus.COMPUTING
+        threading.Thread(
+            target=self._finish_adopted, name=f"output_{self.id}"
+        ).start()
 
-        def _check_status():
-            while self.status != TransformationState.COMPLETED:
-                time.sleep(5)
+    def _finish_adopted(self) -> None:
+        """Complete a run whose exit status is unknown, if its output
+        reaches the end time.
 
-        status_thread = threading.Thread(
-            target=_check_status, name="status_checker"
+        Otherwise the run was interrupted, e.g. its process was killed with
+        the container, and it is PAUSED to be resumed.
+        """
+        if reached_end(self.simulationPath):
+            self._prepare_output()
+            return
+        logging.warning(
+            f"Run of simulation '{self.id}' ended before its end time, "
+            "it is paused."
         )
-        status_thread.start()
+        self.output_status = OutputStatus.MISSING
+        self._finish_pause()
+
+    def _notify_exit(self) -> None:
+        """Call the exit callback registered in `run`, at most once."""
+        on_exit, self._on_exit = self._on_exit, None
+        if on_exit is not None:
+            on_exit(self)
+
+    def _on_process_exit(self, process) -> None:
+        """Move the simulation on once its SimPARTIX process has exited.
+
+        Called by the process reaper. A successful run is handed over to the
+        output preparation, a paused one is made resumable whatever its exit
+        status, and a failed one is marked as FAILED. Processes that were
+        stopped in the meantime are ignored.
+
+        Args:
+            process (subprocess.Popen): the exited process
+        """
+        with self._lock:
+            core_allocator.release(self._cores.pop(process.pid, []))
+            if process is not self.process:
+                return
+            log_rotator.unwatch(self.simulationPath)
+            if self.started_at is not None:
+                STAGE_SECONDS.labels("solver").observe(
+                    time.time() - self.started_at
+                )
+            if self._pausing:
+                # Checked first, the solver may exit with 0 on SIGTERM and
+                # the exit status of adopted processes is unknown. The slot
+                # is released once the simulation is PAUSED, so that it
+                # cannot be resumed before
+                threading.Thread(
+                    target=self._finish_pause, name=f"pause_{self.id}"
+                ).start()
+                return
+            elif process.returncode == 0:
+                logging.info(f"Simulation '{self.id}' is finished computing.")
+                self.output_status = OutputStatus.COMPUTING
+                threading.Thread(
+                    target=(
+                        self._finish_adopted
+                        if isinstance(process, AdoptedProcess)
+                        else self._prepare_output
+                    ),
+                    name=f"output_{self.id}",
+                ).start()
+            else:
+                STAGE_FAILURES.labels("solver").inc()
+                frame_follower.unfollow(self.simulationPath)
+                logging.error(f"Error occurred in simulation '{self.id}'.")
+                self.error = (
+                    f"SimPARTIX exited with return code {process.returncode}."
+                )
+                self.status = SimulationState.FAILED
+        self._notify_exit()
+
+    def _finish_pause(self) -> None:
+        """Make the output of a paused run resumable."""
+        frame_follower.unfollow(self.simulationPath, wait=True)
+        try:
+            restart.stitch(self.simulationPath)
+        except Exception as e:
+            logging.error(
+                f"Error while stitching the output of simulation "
+                f"'{self.id}'. Error message: {e}"
+            )
+        with self._lock:
+            if self.status == SimulationState.STOPPED:
+                # Stopped meanwhile, the next run starts from the beginning
+                return
+            restart.mark_paused(self.simulationPath)
+            self.process = None
+            self.status = SimulationState.PAUSED
+        logging.info(f"Simulation '{self.id}' paused.")
+        self._notify_exit()
 
     def _prepare_output(self) -> None:
         """
@@ -135,32 +457,153 @@ class Simulation:
         """
         logging.info(f"Preparing output for simulation '{self.id}'.")
         print(f"Preparing output for simulation '{self.id}'.", flush=True)
-        result = get_output_values(self.simulationPath)
-        dlite_schema_path = os.path.join(
-            os.path.dirname(os.path.abspath(__file__)), "SimPARTIXOutput.yml"
-        )
-        DLiteSimPARTIXOutput = dlite.classfactory(
-            SimPARTIXOutput, url=f"yaml://{dlite_schema_path}"
+        frame_follower.unfollow(self.simulationPath, wait=True)
+        try:
+            with stage("output_preparation"):
+                restart.stitch(self.simulationPath)
+                self._save_output()
+        except Exception as e:
+            logging.error(
+                f"Error while preparing the output of simulation "
+                f"'{self.id}'. Error message: {e}"
+            )
+            self.error = f"Output preparation failed: {e}"
+            self.status = SimulationState.FAILED
+            return
+        # The output is complete, uncompressed files are served as well
+        try:
+            with stage("output_compression"):
+                storage.compress_output(self.simulationPath)
+        except Exception as e:
+            logging.error(
+                f"Error while compressing the output of simulation "
+                f"'{self.id}'. Error message: {e}"
+            )
+        self.output_status = OutputStatus.READY
+        self.status = SimulationState.COMPLETED
+
+    def _save_output(self) -> None:
+        """Convert the SimPARTIX output and store it in `OUTPUT_FORMATS`.
+
+        The converted frames are then read from the pyramid, see
+        `postprocessing.remove_frames`.
+        """
+        from simulation_controller.postprocessing import (
+            get_output_values,
+            remove_frames,
         )
-        simpartix_output = DLiteSimPARTIXOutput(
+
+        result = get_output_values(self.simulationPath)
+        if "npy" in OUTPUT_FORMATS:
+            with stage("arrays_save"):
+                self._save_arrays(result)
+        if "json" in OUTPUT_FORMATS:
+            with stage("dlite_save"):
+                self._save_dlite(result)
+        with stage("pyramid_build"):
+            self._save_pyramid(result)
+        remove_frames(self.simulationPath)
+
+    def _save_dlite(self, result: dict) -> None:
+        """Store the output as a DLite instance in JSON format."""
+        simpartix_output = _dlite_output_class()(
             id=self.id,
-            elapsed_time=result["elapsed_time"],
-            temperature=result["Temperature_SPH"],
-            group=result["Group"],
-            state_of_matter=result["StateOfMatter_SPH"],
+            **{
+                name: result[key]
+                for name, (key, _) in OUTPUT_PROPERTIES.items()
+            },
         )
         output_path = os.path.join(self.simulationPath, "output")
         simpartix_output.dlite_inst.save(f"json://{output_path}.json?mode=w")
+
+    def _save_arrays(self, result: dict) -> None:
+        """Store every output property as a memory-mappable .npy file."""
+        import numpy as np
+
+        arrays_path = os.path.join(self.simulationPath, "results")
+        os.makedirs(arrays_path, exist_ok=True)
+        for name, (key, dtype) in OUTPUT_PROPERTIES.items():
+            path = os.path.join(arrays_path, f"{name}.npy")
+            with open(f"{path}.tmp", "wb") as f:
+                np.save(f, np.asarray(result[key], dtype=dtype))
+            os.replace(f"{path}.tmp", path)
+
+    def _save_pyramid(self, result: dict) -> None:
+        """Store the grids at decreasing resolutions, see `pyramid`."""
+        import numpy as np
+
+        from simulation_controller import pyramid
+
+        grids = {}
+        sources = {}
+        for name, (key, dtype) in OUTPUT_PROPERTIES.items():
+            if name == "elapsed_time":
+                continue
+            grids[name] = np.asarray(result[key], dtype=dtype)
+            path = os.path.join(self.simulationPath, "results", f"{name}.npy")
+            if os.path.isfile(path):
+                sources[name] = path
+        pyramid.build(
+            self.simulationPath,
+            np.asarray(result["elapsed_time"], dtype="float64"),
+            grids,
+            sources,
+        )
+
+    def _output_files(self) -> list:
+        """Paths of the stored output files, relative to the folder."""
+        from simulation_controller import pyramid
+
+        files = ["output.json"] + [
+            os.path.join("results", f"{name}.npy")
+            for name in OUTPUT_PROPERTIES
+        ]
+        paths = [
+            storage.stored_path(os.path.join(self.simulationPath, file))
+            for file in files
+        ]
+        return [
+            os.path.relpath(path, self.simulationPath)
+            for path in paths
+            if path is not None
+        ] + pyramid.files(self.simulationPath)
+
+    def adopt_output(self, source: "Simulation") -> None:
+        """Complete the simulation with the output of an identical run.
+
+        The output files are hard-linked when possible, so no data is
+        copied. The DLite instance keeps the id of the source simulation.
+
+        Args:
+            source (Simulation): completed simulation with the same input
+        """
+        for file in source._output_files():
+            target = os.path.join(self.simulationPath, file)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            link_or_copy(os.path.join(source.simulationPath, file), target)
         self.output_status = OutputStatus.READY
+        self.status = SimulationState.COMPLETED
+        logging.info(
+            f"Simulation '{self.id}' completed with the output of "
+            f"simulation '{source.id}'."
+        )
+
+    def get_output_path(self, format: str = "json", field: str = None) -> str:
+        """Get the path of the output of a simulation
 
-    def get_output(self) -> str:
-        """Get the output of a simulation
+        Args:
+            format (str): "json" for the DLite instance, "npy" for the array
+                of a single property
+            field (str): property to get, required for the "npy" format
 
         Raises:
-            RuntimeError: If the simulation has not finished
+            RuntimeError: If the simulation has not finished, or the output
+                is not stored in the requested format
+            ValueError: If the property is unknown
 
         Returns:
-            str: data in json format
+            str: path of the output file, gzip-compressed if it ends with
+                `storage.COMPRESSED_SUFFIX`
         """
         if self.output_status != OutputStatus.READY:
             msg = (
@@ -170,25 +613,276 @@ class Simulation:
             logging.error(msg)
             raise RuntimeError(msg)
 
-        file_path = os.path.join(self.simulationPath, "output.json")
-        with open(file_path) as f:
-            output = json.load(f)
-            return output
+        if format == "npy":
+            if field not in OUTPUT_PROPERTIES:
+                raise ValueError(
+                    f"Unknown field '{field}', expected one of "
+                    f"{list(OUTPUT_PROPERTIES)}."
+                )
+            path = os.path.join(self.simulationPath, "results", f"{field}.npy")
+        else:
+            path = storage.stored_path(
+                os.path.join(self.simulationPath, "output.json")
+            )
+        if path is None or not os.path.isfile(path):
+            msg = (
+                f"Output of simulation '{self.id}' is not available "
+                f"in {format} format."
+            )
+            logging.error(msg)
+            raise RuntimeError(msg)
+        return path
+
+    def query_output(
+        self,
+        fields: list = None,
+        frames: str = None,
+        x: str = None,
+        z: str = None,
+        stride: int = 1,
+    ) -> dict:
+        """Get some frames of a window of the output, on a coarser grid.
+
+        Args:
+            fields (list): properties to get, all if not given
+            frames (str): frames to get, as `start:stop[:step]`
+            x (str): cells to get in x, as `start:stop`
+            z (str): cells to get in z, as `start:stop`
+            stride (int): cell size of the returned grid, in output cells, a
+                power of two
+
+        Raises:
+            RuntimeError: If the simulation has not finished, or its output
+                cannot be queried
+            ValueError: If a property is unknown or a range is invalid
+
+        Returns:
+            dict: frame indices, their elapsed time, the returned cells in x
+                and z as (start, stop, step), and the requested properties
+        """
+        from simulation_controller import pyramid
+
+        if self.output_status != OutputStatus.READY:
+            msg = (
+                f"Cannot query, simulation '{self.id}' "
+                f"has status '{self.status.name}'."
+            )
+            logging.error(msg)
+            raise RuntimeError(msg)
+        if not pyramid.exists(self.simulationPath):
+            msg = f"Output of simulation '{self.id}' cannot be queried."
+            logging.error(msg)
+            raise RuntimeError(msg)
+        names = [name for name in OUTPUT_PROPERTIES if name != "elapsed_time"]
+        for field in fields or []:
+            if field not in names:
+                raise ValueError(
+                    f"Unknown field '{field}', expected one of {names}."
+                )
+        return pyramid.query(
+            self.simulationPath,
+            fields or names,
+            pyramid.parse_range(frames, step=True),
+            pyramid.parse_range(x),
+            pyramid.parse_range(z),
+            stride,
+        )
+
+    def get_frames(self) -> list:
+        """List the output frames converted so far.
 
-    def stop(self):
-        """Stop a running process.
+        Frames are converted while the simulation is running, so they are
+        available before the output is complete.
+
+        Returns:
+            list: index and elapsed time of each converted frame
+        """
+        from simulation_controller.postprocessing import (
+            load_frame,
+            stored_frames,
+        )
+
+        return [
+            {
+                "frame": frame,
+                "elapsed_time": float(
+                    load_frame(self.simulationPath, frame)["elapsed_time"]
+                ),
+            }
+            for frame in stored_frames(self.simulationPath)
+        ]
+
+    def get_frame(self, frame: int) -> dict:
+        """Get the output properties of a single converted frame.
+
+        Args:
+            frame (int): index of the frame
 
         Raises:
-            RuntimeError: if the simulation is not running
+            KeyError: if the frame has not been converted (yet)
+
+        Returns:
+            dict: elapsed time and grids of the frame
+        """
+        from simulation_controller.postprocessing import (
+            load_frame,
+            stored_frames,
+        )
+
+        if frame not in stored_frames(self.simulationPath):
+            msg = f"Frame {frame} of simulation '{self.id}' not available."
+            logging.error(msg)
+            raise KeyError(msg)
+        values = load_frame(self.simulationPath, frame)
+        return {
+            "frame": frame,
+            **{
+                name: values[key].tolist()
+                for name, (key, _) in OUTPUT_PROPERTIES.items()
+            },
+        }
+
+    def get_preview(self, kind: str = "thumbnail", frame: int = None):
+        """Get a preview image or animation of the converted frames.
+
+        Missing or outdated previews are rendered in the background.
+
+        Args:
+            kind (str): "thumbnail" or "animation", ignored if `frame` is
+                given
+            frame (int): index of a frame to get the image of
+
+        Raises:
+            KeyError: if the frame has not been converted (yet)
+            RuntimeError: if no frame has been converted yet
+
+        Returns:
+            str: path of the image, None if it is being rendered
         """
-        if self.process is None:
-            msg = f"No process to stop. Is simulation '{self.id}' running?"
+        from simulation_controller import preview
+        from simulation_controller.postprocessing import stored_frames
 
+        frames = stored_frames(self.simulationPath)
+        if not frames:
+            msg = f"No output frame of simulation '{self.id}' available yet."
             logging.error(msg)
             raise RuntimeError(msg)
-        self.process.terminate()
-        self.status = TransformationState.STOPPED
-        self.process = None
+        if frame is not None and frame not in frames:
+            msg = f"Frame {frame} of simulation '{self.id}' not available."
+            logging.error(msg)
+            raise KeyError(msg)
+        return preview.cached(self.simulationPath, frames, kind, frame)
+
+    def get_progress(self) -> dict:
+        """Estimate how far the run of the simulation got.
+
+        Throughput and completion time are only estimated while it is
+        RUNNING.
+
+        Returns:
+            dict: simulated time, end time, fraction done, throughput and
+                estimated completion as Unix time, None where unknown
+        """
+        progress = {
+            "simulated_time": None,
+            "end_time": None,
+            "fraction": None,
+            "throughput": None,
+            "eta": None,
+        }
+        if self.status == SimulationState.COMPLETED:
+            progress["fraction"] = 1.0
+        elif self.started_at is not None and self.status in (
+            SimulationState.RUNNING,
+            SimulationState.PAUSED,
+            SimulationState.STOPPED,
+            SimulationState.FAILED,
+        ):
+            progress.update(
+                estimate_progress(self.simulationPath, self.started_at)
+            )
+            if self.status != SimulationState.RUNNING:
+                progress["throughput"] = progress["eta"] = None
+        return progress
+
+    def get_packed_phi(self):
+        """Fraction of the powder bed covered by the packed spheres.
+
+        Returns:
+            float: covered fraction, or None if the input was not generated
+        """
+        from simulation_controller.packing import PACKING_FILENAME
+
+        path = os.path.join(self.simulationPath, "input", PACKING_FILENAME)
+        try:
+            with open(path) as f:
+                return json.load(f)["phi"]
+        except FileNotFoundError:
+            return None
+
+    def get_log_path(self) -> str:
+        """Get the path of the SimPARTIX log.
+
+        Raises:
+            KeyError: if the simulation has not been started
+
+        Returns:
+            str: path of the log file
+        """
+        path = log_path(self.simulationPath)
+        if not os.path.isfile(path):
+            msg = f"No log for simulation '{self.id}', it was not started."
+            logging.error(msg)
+            raise KeyError(msg)
+        return path
+
+    def pause(self):
+        """Stop the running process, to continue the run later from its last
+        complete output frame.
+
+        The simulation is PAUSED once the process has exited.
+
+        Raises:
+            RuntimeError: if the simulation is not running
+        """
+        with self._lock:
+            if self.process is None or self.status != SimulationState.RUNNING:
+                msg = f"Simulation '{self.id}' is not running."
+                logging.error(msg)
+                raise RuntimeError(msg)
+            self._pausing = True
+            terminate_group(self.process)
+        logging.info(f"Pausing simulation '{self.id}'.")
+
+    def stop(self):
+        """Stop a running process.
+
+        A PAUSED simulation is stopped too, its next run starts from the
+        beginning. A stop wins over a pause still in progress, and a process
+        that has already exited is not signalled again.
+
+        Raises:
+            RuntimeError: if the simulation is not running
+        """
+        with self._lock:
+            if self.status == SimulationState.PAUSED:
+                restart.clear_paused(self.simulationPath)
+                self.status = SimulationState.STOPPED
+                logging.info(f"Paused simulation '{self.id}' stopped.")
+                return
+            if self.process is None:
+                msg = f"No process to stop. Is simulation '{self.id}' running?"
+
+                logging.error(msg)
+                raise RuntimeError(msg)
+            if self.process.poll() is None:
+                terminate_group(self.process)
+            self._pausing = False
+            self.status = SimulationState.STOPPED
+            self.process = None
+        frame_follower.unfollow(self.simulationPath)
+        log_rotator.unwatch(self.simulationPath)
+        self._notify_exit()
         logging.info(f"Simulation '{self.id}' stopped successfully.")
 
     def delete(self):
@@ -196,11 +890,15 @@ class Simulation:
         Delete all the simulation folders and files.
 
         Raises:
-            RuntimeError: if deleting a running simulation
+            RuntimeError: if deleting a running or preparing simulation
         """
-        if self.status == TransformationState.RUNNING:
+        if self.status == SimulationState.PREPARING:
+            msg = f"Input files of simulation '{self.id}' are being created."
+            logging.error(msg)
+            raise RuntimeError(msg)
+        if self.status == SimulationState.RUNNING:
             msg = f"Simulation '{self.id}' is running."
             logging.error(msg)
             raise RuntimeError(msg)
-        shutil.rmtree(self.simulationPath)
+        shutil.rmtree(self.simulationPath, ignore_errors=True)
         logging.info(f"Simulation '{self.id}' and related files deleted.")
@@ -1,10 +1,25 @@
+import base64
+import bisect
 import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 
-from marketplace_standard_app_api.models.transformation import (
-    TransformationState,
+from models.transformation import SimulationState
+from simulation_controller.input_cache import parameters_key
+from simulation_controller.metrics import SIMULATION_TRANSITIONS
+from simulation_controller.reaper import AdoptedProcess
+from simulation_controller.registry import HOST, WORKER_ID, SimulationRegistry
+from simulation_controller.scheduler import Scheduler
+from simulation_controller.simulation import (
+    SIMULATIONS_FOLDER_PATH,
+    OutputStatus,
+    Simulation,
 )
-
-from simulation_controller.simulation import Simulation
+from simulation_controller.storage import StorageQuota
 
 mappings = {
     "SimpartixOutput": {
@@ -20,9 +35,277 @@ mappings = {
 }
 
 
+PREPARATION_WORKERS = int(os.environ.get("SIMPARTIX_PREPARATION_WORKERS", 2))
+
+RESULT_CACHE = os.environ.get("SIMPARTIX_RESULT_CACHE", "0") == "1"
+
+# Seconds between two synchronizations with the registry, see `_sync_loop`
+SYNC_INTERVAL = float(os.environ.get("SIMPARTIX_SYNC_INTERVAL", 2))
+
+FINAL_STATES = (
+    SimulationState.COMPLETED,
+    SimulationState.FAILED,
+    SimulationState.STOPPED,
+)
+
+# States in which a run no longer makes progress, the simulations following
+# it are then completed with its output or run on their own
+RELEASING_STATES = FINAL_STATES + (SimulationState.PAUSED,)
+
+
+def _remove_sorted(keys: list, key) -> None:
+    """Remove a key from a sorted list, if present."""
+    index = bisect.bisect_left(keys, key)
+    if index < len(keys) and keys[index] == key:
+        del keys[index]
+
+
 class SimulationManager:
-    def __init__(self):
+    def __init__(
+        self,
+        scheduler: Scheduler = None,
+        executor=None,
+        result_cache: bool = RESULT_CACHE,
+        registry: SimulationRegistry = None,
+        worker_id: str = WORKER_ID,
+        storage: StorageQuota = None,
+    ):
         self.simulations: dict[str, Simulation] = {}
+        # Index for listing: sorted (created_at, id) keys of all simulations
+        # and of the simulations in each state, updated on state transitions
+        self._states: dict[str, SimulationState] = {}
+        self._by_state: dict[SimulationState, list] = {
+            state: [] for state in SimulationState
+        }
+        self._created: list = []
+        # Input generation runs in separate processes, so that packing a
+        # powder bed does not block the API. The pool is created on first
+        # use, so that the API starts without it.
+        self._executor = executor
+        self._executor_lock = threading.Lock()
+        self._pending_runs: dict[str, int] = {}
+        # Result cache: runs with the same key produce the same output, so
+        # they are served from a completed run or attached to a running one.
+        self.result_cache = result_cache
+        self._keys: dict[str, str] = {}
+        self._results: dict[str, Simulation] = {}
+        self._in_flight: dict[str, Simulation] = {}
+        self._followers: dict[str, list] = {}
+        self._lock = threading.RLock()
+        # Simulations are shared with the other workers and replicas through
+        # the registry. This worker only drives the simulations it owns.
+        self.registry = (
+            registry if registry is not None else SimulationRegistry()
+        )
+        self.worker_id = worker_id
+        # The concurrency limit and the cores are shared by the workers of
+        # the host, admissions are serialized through a lock file
+        self.scheduler = (
+            scheduler
+            if scheduler is not None
+            else Scheduler(
+                host_lock=lambda: self.registry.lock(f"admission-{HOST}"),
+                host_runs=self._host_runs,
+            )
+        )
+        # Completed simulations are deleted when the simulations folder
+        # exceeds its quota, least recently used first
+        self.storage = (
+            storage
+            if storage is not None
+            else StorageQuota(SIMULATIONS_FOLDER_PATH)
+        )
+        self._version = -1
+        self.registry.heartbeat(self.worker_id)
+        self._sync()
+        self._claim_orphans()
+        threading.Thread(
+            target=self._sync_loop, name="registry_sync", daemon=True
+        ).start()
+
+    @property
+    def executor(self):
+        """Executor running the input generation."""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=PREPARATION_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _sync_loop(self):
+        """Keep this worker alive in the registry, pick up the changes and
+        requests of the other workers, and take over the simulations of
+        dead workers."""
+        while True:
+            time.sleep(SYNC_INTERVAL)
+            try:
+                self.registry.heartbeat(self.worker_id)
+                self._sync()
+                self._apply_requests()
+                self._claim_orphans()
+                self.scheduler.admit()
+            except Exception as e:
+                logging.error(
+                    "Error while synchronizing with the registry. "
+                    f"Error message: {e}"
+                )
+
+    def _sync(self):
+        """Update the simulations owned by other workers from the registry."""
+        with self._lock:
+            for record in self.registry.changes(self._version):
+                self._version = record["version"]
+                id = record["id"]
+                simulation = self.simulations.get(id)
+                if record["deleted"]:
+                    if simulation is not None:
+                        self._forget(id)
+                    continue
+                if record["owner"] == self.worker_id or (
+                    simulation is not None
+                    and simulation.owner == self.worker_id
+                ):
+                    # Written by this worker
+                    continue
+                if simulation is None:
+                    simulation = Simulation.restore(record)
+                    self._add_simulation(simulation)
+                else:
+                    simulation.refresh(record)
+                    self._index_state(simulation, simulation.status)
+                if simulation.status == SimulationState.COMPLETED:
+                    key = self._result_key(simulation)
+                    if key is not None:
+                        self._results.setdefault(key, simulation)
+
+    def _apply_requests(self):
+        """Run, pause or stop the simulations of this worker as requested by
+        the other workers."""
+        for record in self.registry.requests(self.worker_id):
+            id, state = record["id"], record["requested_state"]
+            with self.registry.lock(id):
+                if not self.registry.clear_request(id, state):
+                    continue
+                try:
+                    simulation = self._get_simulation(id)
+                    if state == SimulationState.RUNNING:
+                        self._run(simulation, record["priority"] or 0)
+                    elif state == SimulationState.PAUSED:
+                        self._pause(simulation)
+                    else:
+                        self._stop(simulation)
+                except Exception as e:
+                    logging.error(
+                        f"Request to set simulation '{id}' to {state} "
+                        f"failed. Error message: {e}"
+                    )
+
+    def _claim_orphans(self):
+        """Take over the simulations of workers that are gone.
+
+        This restores the simulations of a previous instance of the app.
+        Running SimPARTIX processes are watched again first, so that they
+        hold their slots. Then preparations are restarted, queued runs are
+        queued again, and runs that ended while their worker was down get
+        their output prepared, or are paused if they did not reach their end
+        time. Runs started on another host are left to that host.
+        """
+        claimed = []
+        for record in self.registry.orphans():
+            # A process can only be watched from the host it runs on
+            if (
+                record["state"] == SimulationState.RUNNING.value
+                and record["pid"] is not None
+                and (record["owner"] or HOST).split(":")[0] != HOST
+            ):
+                continue
+            with self.registry.lock(record["id"]):
+                if self.registry.claim(
+                    record["id"], self.worker_id, record["owner"]
+                ):
+                    claimed.append(record)
+        restored = []
+        for record in claimed:
+            simulation = Simulation.restore(record)
+            simulation.owner = self.worker_id
+            simulation.add_listener(self._on_state_change)
+            with self._lock:
+                if simulation.id in self.simulations:
+                    self._delete_simulation(simulation.id)
+                self._add_simulation(simulation)
+            process = simulation.process
+            if (
+                simulation.status == SimulationState.RUNNING
+                and process is not None
+                and AdoptedProcess.is_alive(process.pid)
+            ):
+                self._track_run(simulation)
+                self.scheduler.adopt(simulation)
+            else:
+                restored.append(simulation)
+        for simulation in restored:
+            state = simulation.status
+            if state == SimulationState.PREPARING:
+                if simulation.priority is not None:
+                    self._pending_runs[simulation.id] = simulation.priority
+                simulation.prepare(self.executor, on_ready=self._on_prepared)
+            elif state == SimulationState.QUEUED or (
+                state == SimulationState.RUNNING and simulation.process is None
+            ):
+                # Followers of an identical run have no process of their own
+                simulation.status = SimulationState.CREATED
+                self._submit(simulation, simulation.priority or 0)
+            elif state == SimulationState.RUNNING:
+                self._track_run(simulation)
+                simulation.resume_output()
+            elif state == SimulationState.COMPLETED:
+                key = self._result_key(simulation)
+                if key is not None:
+                    self._results.setdefault(key, simulation)
+        if claimed:
+            logging.info(f"{len(claimed)} simulations taken over.")
+
+    def _host_runs(self) -> list:
+        """PIDs of the SimPARTIX processes of the other workers of this
+        host."""
+        return [
+            record["pid"]
+            for record in self.registry.running(HOST)
+            if record["owner"] != self.worker_id
+            and AdoptedProcess.is_alive(record["pid"])
+        ]
+
+    def _track_run(self, simulation: Simulation):
+        """Make identical simulations follow a restored run.
+
+        Args:
+            simulation (Simulation): simulation whose run is in progress
+        """
+        key = self._result_key(simulation)
+        if key is not None:
+            with self._lock:
+                self._in_flight.setdefault(key, simulation)
+
+    def _persist(self, simulation: Simulation):
+        """Record the current state of a simulation in the registry.
+
+        Args:
+            simulation (Simulation): simulation to record
+        """
+        if (
+            simulation.id not in self.simulations
+            or simulation.owner != self.worker_id
+        ):
+            return
+        try:
+            self.registry.save(simulation)
+        except Exception as e:
+            logging.error(
+                f"Simulation '{simulation.id}' could not be recorded. "
+                f"Error message: {e}"
+            )
 
     def _get_simulation(self, id: str) -> Simulation:
         """
@@ -37,6 +320,7 @@ class SimulationManager:
         Returns:
             Simulation instance
         """
+        self._sync()
         try:
             simulation = self.simulations[id]
             return simulation
@@ -55,7 +339,12 @@ class SimulationManager:
             str: ID of the added object
         """
         id: str = simulation.id
-        self.simulations[id] = simulation
+        with self._lock:
+            self.simulations[id] = simulation
+            self._states[id] = simulation.status
+            key = (simulation.created_at, id)
+            bisect.insort(self._by_state[simulation.status], key)
+            bisect.insort(self._created, key)
         return id
 
     def _delete_simulation(self, id: str):
@@ -64,67 +353,595 @@ class SimulationManager:
         Args:
             id (str): id of the simulation to remove
         """
-        del self.simulations[id]
+        with self._lock:
+            simulation = self.simulations.pop(id)
+            key = (simulation.created_at, id)
+            _remove_sorted(self._by_state[self._states.pop(id)], key)
+            _remove_sorted(self._created, key)
+
+    def _index_state(self, simulation: Simulation, state: SimulationState):
+        """Move a simulation to its new state in the listing index.
+
+        Args:
+            simulation (Simulation): indexed simulation
+            state (SimulationState): its new state
+        """
+        with self._lock:
+            previous = self._states.get(simulation.id)
+            if previous is not None and previous != state:
+                key = (simulation.created_at, simulation.id)
+                _remove_sorted(self._by_state[previous], key)
+                bisect.insort(self._by_state[state], key)
+                self._states[simulation.id] = state
+
+    def _forget(self, id: str):
+        """Remove a deleted simulation and its cached result.
+
+        The simulations following its run are run on their own.
+
+        Args:
+            id (str): id of the simulation
+        """
+        followers = []
+        with self._lock:
+            simulation = self.simulations[id]
+            self._delete_simulation(id)
+            key = self._keys.pop(id, None)
+            if self._results.get(key) is simulation:
+                del self._results[key]
+            if key is not None and self._in_flight.get(key) is simulation:
+                del self._in_flight[key]
+                followers = self._followers.pop(key, [])
+        self._release_followers(followers)
 
     def create_simulation(self, request_obj: dict) -> str:
         """Create a new simulation given the arguments.
 
+        The simulation is PREPARING until its input files are generated.
+
         Args:
            requestObj: dictionary containing input configuration
 
         Returns:
             str: unique job id
         """
-        return self._add_simulation(Simulation(request_obj))
+        simulation = Simulation(request_obj)
+        simulation.owner = self.worker_id
+        simulation.add_listener(self._on_state_change)
+        id = self._add_simulation(simulation)
+        self._persist(simulation)
+        simulation.prepare(self.executor, on_ready=self._on_prepared)
+        return id
+
+    def _on_prepared(self, simulation: Simulation):
+        """Submit the runs requested while the simulation was PREPARING.
+
+        Args:
+            simulation (Simulation): simulation whose preparation finished
+        """
+        with self._lock:
+            priority = self._pending_runs.pop(simulation.id, None)
+        if priority is not None and simulation.inputs_ready:
+            self._submit(simulation, priority)
+
+    def _result_key(self, simulation: Simulation):
+        """Key under which the result of a simulation is cached.
+
+        Only runs with an explicit seed are reproducible, so other runs are
+        never deduplicated.
+
+        Args:
+            simulation (Simulation): simulation to identify
+
+        Returns:
+            str: cache key, or None if the result is not cached
+        """
+        if not self.result_cache or simulation.parameters.seed is None:
+            return None
+        with self._lock:
+            if simulation.id not in self._keys:
+                self._keys[simulation.id] = parameters_key(
+                    simulation.parameters
+                )
+            return self._keys[simulation.id]
+
+    def _submit(self, simulation: Simulation, priority: int):
+        """Hand a simulation to the scheduler, unless its result is known.
+
+        With the result cache enabled, a simulation identical to a completed
+        one is completed with its output, and one identical to a queued or
+        running simulation follows that run instead of starting its own.
+
+        Args:
+            simulation (Simulation): simulation to execute
+            priority (int): queue priority, higher values are started first
+
+        Raises:
+            RuntimeError: when the simulation is already following a run
+        """
+        key = self._result_key(simulation)
+        if key is not None:
+            with self._lock:
+                if any(
+                    follower is simulation
+                    for follower, _ in self._followers.get(key, [])
+                ):
+                    msg = f"Simulation '{simulation.id}' already in progress."
+                    logging.error(msg)
+                    raise RuntimeError(msg)
+                source = self._results.get(key)
+                if source is not None and source is not simulation:
+                    simulation.adopt_output(source)
+                    return
+                leader = self._in_flight.get(key)
+                if leader is not None and leader is not simulation:
+                    self._followers.setdefault(key, []).append(
+                        (simulation, priority)
+                    )
+                    simulation.priority = priority
+                    simulation.status = leader.status
+                    logging.info(
+                        f"Simulation '{simulation.id}' follows the identical "
+                        f"simulation '{leader.id}'."
+                    )
+                    return
+                if source is simulation:
+                    # Run again, its output no longer serves other runs
+                    del self._results[key]
+                self._in_flight[key] = simulation
+        simulation.priority = priority
+        self.scheduler.submit(simulation, priority)
 
-    def run_simulation(self, id: str):
-        """Execute a simulation.
+    def _on_state_change(self, simulation: Simulation, state):
+        """Record a state transition and propagate it to the simulations
+        following the run.
+
+        Args:
+            simulation (Simulation): simulation whose state was set
+            state (SimulationState): the new state
+        """
+        self._persist(simulation)
+        self._index_state(simulation, state)
+        SIMULATION_TRANSITIONS.labels(state.value).inc()
+        if state == SimulationState.COMPLETED and self.storage.enabled:
+            threading.Thread(
+                target=self._enforce_quota, name="storage_quota", daemon=True
+            ).start()
+        with self._lock:
+            key = self._keys.get(simulation.id)
+            if key is None or self._in_flight.get(key) is not simulation:
+                return
+            if state not in RELEASING_STATES:
+                for follower, _ in self._followers.get(key, []):
+                    follower.status = state
+                return
+            del self._in_flight[key]
+            followers = self._followers.pop(key, [])
+            if state == SimulationState.COMPLETED:
+                self._results[key] = simulation
+        if state == SimulationState.COMPLETED:
+            for follower, _ in followers:
+                follower.adopt_output(simulation)
+        else:
+            self._release_followers(followers)
+
+    def _release_followers(self, followers: list):
+        """Run the simulations that followed a run which will not complete,
+        e.g. because it was paused or deleted.
+
+        The first follower becomes the new leader of the others.
+
+        Args:
+            followers (list): simulations and their priorities
+        """
+        for follower, priority in followers:
+            try:
+                self._submit(follower, priority)
+            except Exception as e:
+                follower.error = f"Simulation could not be run: {e}"
+                follower.status = SimulationState.FAILED
+                logging.error(
+                    f"Simulation '{follower.id}' could not be run after the "
+                    f"run it followed ended. Error message: {e}"
+                )
+
+    def _detach(self, simulation: Simulation) -> bool:
+        """Stop a simulation from following an identical run.
+
+        Args:
+            simulation (Simulation): possibly following simulation
+
+        Returns:
+            bool: whether the simulation was following a run
+        """
+        with self._lock:
+            key = self._keys.get(simulation.id)
+            followers = self._followers.get(key, [])
+            for i, (follower, _) in enumerate(followers):
+                if follower is simulation:
+                    del followers[i]
+                    return True
+            return False
+
+    def run_simulation(self, id: str, priority: int = 0):
+        """Execute a simulation, or queue it if all slots are busy.
+
+        Simulations that are still PREPARING are submitted once their input
+        files are ready. Simulations owned by another worker are run by
+        that worker.
+
+        Args:
+            id (str): unique simulation id
+            priority (int): queue priority, higher values are started first
+
+        Raises:
+            RuntimeError: if the input files of the simulation are missing
+        """
+        simulation = self._get_simulation(id)
+        with self.registry.lock(id):
+            if simulation.owner == self.worker_id:
+                self._run(simulation, priority)
+                return
+            if simulation.status in (
+                SimulationState.QUEUED,
+                SimulationState.RUNNING,
+            ):
+                msg = f"Simulation '{id}' already in progress."
+                logging.error(msg)
+                raise RuntimeError(msg)
+            self._check_inputs(simulation)
+            self.registry.request(id, SimulationState.RUNNING.value, priority)
+            logging.info(
+                f"Run of simulation '{id}' requested from worker "
+                f"'{simulation.owner}'."
+            )
+
+    def _run(self, simulation: Simulation, priority: int):
+        """Execute a simulation owned by this worker.
+
+        Args:
+            simulation (Simulation): simulation to execute
+            priority (int): queue priority, higher values are started first
+        """
+        with self._lock:
+            if simulation.status == SimulationState.PREPARING:
+                self._pending_runs[simulation.id] = priority
+                simulation.priority = priority
+                self._persist(simulation)
+                logging.info(
+                    f"Simulation '{simulation.id}' will run once its input "
+                    "is ready."
+                )
+                return
+        self._check_inputs(simulation)
+        self._submit(simulation, priority)
+
+    @staticmethod
+    def _check_inputs(simulation: Simulation):
+        """Raise a RuntimeError if the input files of a prepared simulation
+        are missing."""
+        if (
+            simulation.status != SimulationState.PREPARING
+            and not simulation.inputs_ready
+        ):
+            msg = (
+                f"Input files of simulation '{simulation.id}' could not be "
+                "created."
+            )
+            logging.error(msg)
+            raise RuntimeError(msg)
+
+    def get_simulation_output_path(
+        self, id: str, format: str = "json", field: str = None
+    ) -> str:
+        """Get the path of the output of a simulation.
 
         Args:
             id (str): unique simulation id
+            format (str): "json" or "npy"
+            field (str): property to get in "npy" format
+
+        Returns:
+            str: path of the json representation of the dlite object, or of
+                the .npy array of the field
         """
-        self._get_simulation(id).run()
+        simulation = self._get_simulation(id)
+        path = simulation.get_output_path(format, field)
+        self.storage.touch(simulation.simulationPath)
+        return path
 
-    def get_simulation_output(self, id: str) -> str:
-        """Get the output a simulation.
+    def query_simulation_output(
+        self,
+        id: str,
+        fields: list = None,
+        frames: str = None,
+        x: str = None,
+        z: str = None,
+        stride: int = 1,
+    ) -> dict:
+        """Get some frames of a window of the output of a simulation.
 
         Args:
             id (str): unique simulation id
+            fields (list): properties to get, all if not given
+            frames (str): frames to get, as `start:stop[:step]`
+            x (str): cells to get in x, as `start:stop`
+            z (str): cells to get in z, as `start:stop`
+            stride (int): cell size of the returned grid, in output cells, a
+                power of two
 
         Returns:
-            str: json representation of the dlite object
+            dict: frame indices, their elapsed time, the returned cells and
+                the requested properties
         """
         simulation = self._get_simulation(id)
-        return simulation.get_output()
+        result = simulation.query_output(fields, frames, x, z, stride)
+        self.storage.touch(simulation.simulationPath)
+        return result
+
+    def get_simulation_frames(self, id: str) -> list:
+        """List the output frames of a simulation converted so far.
+
+        Args:
+            id (str): unique simulation id
+
+        Returns:
+            list: index and elapsed time of each frame
+        """
+        return self._get_simulation(id).get_frames()
+
+    def get_simulation_frame(self, id: str, frame: int) -> dict:
+        """Get the output of a single frame of a simulation.
+
+        Args:
+            id (str): unique simulation id
+            frame (int): index of the frame
+
+        Returns:
+            dict: elapsed time and grids of the frame
+        """
+        simulation = self._get_simulation(id)
+        values = simulation.get_frame(frame)
+        self.storage.touch(simulation.simulationPath)
+        return values
+
+    def get_simulation_preview(
+        self, id: str, kind: str = "thumbnail", frame: int = None
+    ):
+        """Get a preview image or animation of a simulation.
+
+        Args:
+            id (str): unique simulation id
+            kind (str): "thumbnail" or "animation"
+            frame (int): index of a frame to get the image of instead
+
+        Returns:
+            str: path of the image, None if it is being rendered
+        """
+        return self._get_simulation(id).get_preview(kind, frame)
+
+    def get_simulation_progress(self, id: str) -> dict:
+        """Estimate how far the run of a simulation got.
+
+        Args:
+            id (str): unique simulation id
+
+        Returns:
+            dict: state, simulated time, end time, fraction done, throughput
+                and estimated completion time of the run
+        """
+        simulation = self._get_simulation(id)
+        return {"state": simulation.status, **simulation.get_progress()}
+
+    def get_simulation_log_path(self, id: str) -> str:
+        """Get the path of the SimPARTIX log of a simulation.
+
+        Args:
+            id (str): unique simulation id
+
+        Returns:
+            str: path of the log file
+        """
+        return self._get_simulation(id).get_log_path()
 
     def stop_simulation(self, id: str) -> dict:
         """Force termination of a simulation.
 
+        Queued simulations are removed from the queue instead. Simulations
+        owned by another worker are stopped by that worker.
+
+        Args:
+            id (str): unique id of the simulation
+
+        Raises:
+            RuntimeError: if the simulation is not running
+        """
+        simulation = self._get_simulation(id)
+        with self.registry.lock(id):
+            if simulation.owner == self.worker_id:
+                self._stop(simulation)
+                return
+            if simulation.status not in (
+                SimulationState.PREPARING,
+                SimulationState.QUEUED,
+                SimulationState.RUNNING,
+                SimulationState.PAUSED,
+            ):
+                msg = f"No process to stop. Is simulation '{id}' running?"
+                logging.error(msg)
+                raise RuntimeError(msg)
+            self.registry.request(id, SimulationState.STOPPED.value)
+            logging.info(
+                f"Stop of simulation '{id}' requested from worker "
+                f"'{simulation.owner}'."
+            )
+
+    def _stop(self, simulation: Simulation):
+        """Stop a simulation owned by this worker.
+
+        Args:
+            simulation (Simulation): simulation to stop
+        """
+        id = simulation.id
+        with self._lock:
+            if self._pending_runs.pop(id, None) is not None:
+                simulation.priority = None
+                self._persist(simulation)
+                logging.info(f"Pending run of simulation '{id}' cancelled.")
+                return
+        if self._detach(simulation) or self.scheduler.cancel(simulation):
+            simulation.status = SimulationState.STOPPED
+            logging.info(f"Queued simulation '{id}' stopped.")
+        else:
+            simulation.stop()
+
+    def pause_simulation(self, id: str):
+        """Pause a simulation, to continue its run later from its last
+        complete output frame.
+
+        Queued simulations are removed from the queue instead. Simulations
+        owned by another worker are paused by that worker.
+
         Args:
             id (str): unique id of the simulation
+
+        Raises:
+            RuntimeError: if the simulation is not queued or running
+        """
+        simulation = self._get_simulation(id)
+        with self.registry.lock(id):
+            if simulation.owner == self.worker_id:
+                self._pause(simulation)
+                return
+            if simulation.status not in (
+                SimulationState.QUEUED,
+                SimulationState.RUNNING,
+            ):
+                msg = f"Simulation '{id}' is not running."
+                logging.error(msg)
+                raise RuntimeError(msg)
+            self.registry.request(id, SimulationState.PAUSED.value)
+            logging.info(
+                f"Pause of simulation '{id}' requested from worker "
+                f"'{simulation.owner}'."
+            )
+
+    def _pause(self, simulation: Simulation):
+        """Pause a simulation owned by this worker.
+
+        Args:
+            simulation (Simulation): simulation to pause
         """
-        self._get_simulation(id).stop()
+        if self._detach(simulation) or self.scheduler.cancel(simulation):
+            simulation.status = SimulationState.PAUSED
+            logging.info(f"Queued simulation '{simulation.id}' paused.")
+        else:
+            simulation.pause()
 
     def delete_simulation(self, id: str) -> dict:
         """Delete all the simulation information.
 
         Args:
             id (str): unique id of simulation
+
+        Raises:
+            RuntimeError: if the simulation is in progress
+        """
+        simulation = self._get_simulation(id)
+        with self.registry.lock(id):
+            if simulation.owner == self.worker_id:
+                if self._detach(simulation) or self.scheduler.cancel(
+                    simulation
+                ):
+                    simulation.status = SimulationState.STOPPED
+            elif simulation.status == SimulationState.QUEUED:
+                msg = f"Simulation '{id}' is queued by another worker."
+                logging.error(msg)
+                raise RuntimeError(msg)
+            simulation.delete()
+            self.registry.delete(id)
+            self._forget(id)
+
+    def _enforce_quota(self):
+        """Evict the least recently used COMPLETED simulations while the
+        simulations folder exceeds its quota."""
+        with self._lock:
+            candidates = {
+                id: simulation.simulationPath
+                for id, simulation in self.simulations.items()
+                if simulation.status == SimulationState.COMPLETED
+            }
+        try:
+            self.storage.evict(candidates, self._evict)
+        except Exception as e:
+            logging.error(
+                f"Error while enforcing the storage quota. Error message: {e}"
+            )
+
+    def _evict(self, id: str):
+        """Delete a simulation to free disk space, if it is still COMPLETED.
+
+        Args:
+            id (str): unique id of the simulation
+
+        Raises:
+            RuntimeError: if the simulation is no longer COMPLETED
         """
-        self._get_simulation(id).delete()
-        self._delete_simulation(id)
+        simulation = self._get_simulation(id)
+        with self.registry.lock(id):
+            if simulation.status != SimulationState.COMPLETED:
+                msg = f"Simulation '{id}' is no longer completed."
+                logging.error(msg)
+                raise RuntimeError(msg)
+            simulation.delete()
+            self.registry.delete(id)
+            self._forget(id)
 
-    def get_simulation_state(self, id: str) -> TransformationState:
+    def get_simulation_state(self, id: str) -> SimulationState:
         """Return the status of a particular simulation.
 
         Args:
             id (str): id of the simulation
 
         Returns:
-            TransformationState: status of the simulation
+            SimulationState: status of the simulation
         """
         return self._get_simulation(id).status
 
+    def get_simulation_error(self, id: str):
+        """Return the reason why a simulation failed.
+
+        Args:
+            id (str): id of the simulation
+
+        Returns:
+            str: error message, or None if the simulation did not fail
+        """
+        return self._get_simulation(id).error
+
+    def get_packed_phi(self, id: str):
+        """Return the fraction of the powder bed of a simulation covered by
+        the packed spheres.
+
+        Args:
+            id (str): id of the simulation
+
+        Returns:
+            float: covered fraction, or None if the input was not generated
+        """
+        return self._get_simulation(id).get_packed_phi()
+
+    def get_queue_position(self, id: str):
+        """Return the position of a simulation in the run queue.
+
+        Args:
+            id (str): id of the simulation
+
+        Returns:
+            int: 1-based position, or None if the simulation is not queued
+        """
+        return self.scheduler.queue_position(self._get_simulation(id))
+
     def get_simulation(self, id) -> dict:
         """Return information of one simulation.
 
@@ -132,28 +949,275 @@ class SimulationManager:
             id (str): id of the simulation
 
         Returns:
-            list: list of simulation ids
+            dict: id, parameters, state and creation time of the simulation
         """
-        simulation = self.simulations[id]
+        return self._describe(self._get_simulation(id))
+
+    @staticmethod
+    def _describe(simulation: Simulation) -> dict:
         return {
             "id": simulation.id,
             "parameters": simulation.parameters,
             "state": simulation.status,
+            "created_at": simulation.created_at,
         }
 
-    def get_simulations(self) -> dict:
-        """Return information of all simulations.
+    @staticmethod
+    def _encode_cursor(key: tuple) -> str:
+        created_at, id = key
+        return base64.urlsafe_b64encode(
+            f"{created_at!r}/{id}".encode()
+        ).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple:
+        try:
+            created_at, id = (
+                base64.urlsafe_b64decode(cursor.encode()).decode().split("/")
+            )
+            return float(created_at), id
+        except ValueError as ve:
+            msg = f"Invalid cursor '{cursor}'."
+            logging.error(msg)
+            raise ValueError(msg) from ve
+
+    def get_simulations(
+        self,
+        state: SimulationState = None,
+        created_after: float = None,
+        created_before: float = None,
+        cursor: str = None,
+        limit: int = 100,
+    ) -> tuple:
+        """Return one page of simulations, oldest first.
+
+        Args:
+            state (SimulationState): only list simulations in this state
+            created_after (float): only list simulations created at or after
+                this Unix time
+            created_before (float): only list simulations created before
+                this Unix time
+            cursor (str): `next_cursor` of the previous page
+            limit (int): maximum number of simulations in the page
+
+        Raises:
+            ValueError: if the cursor is invalid
+
+        Returns:
+            tuple: list of simulations, and the cursor of the next page or
+                None on the last page
+        """
+        self._sync()
+        with self._lock:
+            keys = self._created if state is None else self._by_state[state]
+            start = 0
+            if cursor is not None:
+                start = bisect.bisect_right(keys, self._decode_cursor(cursor))
+            if created_after is not None:
+                start = max(start, bisect.bisect_left(keys, (created_after,)))
+            end = len(keys)
+            if created_before is not None:
+                end = bisect.bisect_left(keys, (created_before,))
+            page = keys[start : min(end, start + limit)]
+            items = [self._describe(self.simulations[id]) for _, id in page]
+        next_cursor = None
+        if page and start + limit < end:
+            next_cursor = self._encode_cursor(page[-1])
+        return items, next_cursor
+
+    def create_sweep(
+        self, members: list, run: bool = False, priority: int = 0
+    ) -> dict:
+        """Create the simulations of a parameter sweep.
+
+        Args:
+            members (list): TransformationInput of every simulation
+            run (bool): run the simulations once their input is ready
+            priority (int): queue priority of the runs
+
+        Returns:
+            dict: id of the sweep and ids of its simulations, in order
+        """
+        ids = [self.create_simulation(member) for member in members]
+        if run:
+            for id in ids:
+                self.run_simulation(id, priority)
+        sweep_id = str(uuid.uuid4())
+        self.registry.save_sweep(sweep_id, ids, time.time())
+        logging.info(f"Sweep '{sweep_id}' of {len(ids)} simulations created.")
+        return {"id": sweep_id, "members": ids}
+
+    def _get_sweep_members(self, id: str) -> tuple:
+        """Get a sweep and its simulations that were not deleted.
+
+        Args:
+            id (str): unique id of the sweep
+
+        Raises:
+            KeyError: if there is no sweep matching the id
+
+        Returns:
+            tuple: sweep record and list of its simulations
+        """
+        sweep = self.registry.sweep(id)
+        if sweep is None:
+            message = f"Sweep with id '{id}' not found"
+            logging.error(message)
+            raise KeyError(message)
+        self._sync()
+        with self._lock:
+            members = [
+                self.simulations[member]
+                for member in sweep["members"]
+                if member in self.simulations
+            ]
+        return sweep, members
+
+    @staticmethod
+    def _sweep_state(states: list) -> SimulationState:
+        """State of a sweep as a whole.
+
+        A sweep is in progress while any member is, the most advanced
+        state first. Once all members are done, it is COMPLETED if they all
+        completed, else FAILED if any failed, else STOPPED.
+
+        Args:
+            states (list): states of the members
 
         Returns:
-            list: list of simulation ids
+            SimulationState: state of the sweep
         """
-        items = []
-        for simulation in self.simulations.values():
-            items.append(
+        for state in (
+            SimulationState.RUNNING,
+            SimulationState.QUEUED,
+            SimulationState.PREPARING,
+            SimulationState.PAUSED,
+            SimulationState.CREATED,
+        ):
+            if state in states:
+                return state
+        if all(state == SimulationState.COMPLETED for state in states):
+            return SimulationState.COMPLETED
+        if SimulationState.FAILED in states:
+            return SimulationState.FAILED
+        return SimulationState.STOPPED
+
+    def get_sweep(self, id: str) -> dict:
+        """Return the aggregated state of a sweep and an index of its
+        members.
+
+        Args:
+            id (str): unique id of the sweep
+
+        Returns:
+            dict: id, creation time and state of the sweep, number of
+                members per state, and parameters, state, error and result
+                availability of every member
+        """
+        sweep, members = self._get_sweep_members(id)
+        states = [simulation.status for simulation in members]
+        return {
+            "id": id,
+            "created_at": sweep["created_at"],
+            "state": self._sweep_state(states),
+            "counts": {
+                state: states.count(state) for state in SimulationState
+            },
+            "members": [
                 {
-                    "id": simulation.id,
-                    "parameters": simulation.parameters,
-                    "state": simulation.status,
+                    **self._describe(simulation),
+                    "detail": simulation.error,
+                    "result_ready": simulation.output_status
+                    == OutputStatus.READY,
                 }
+                for simulation in members
+            ],
+        }
+
+    def run_sweep(self, id: str, priority: int = 0) -> list:
+        """Run the members of a sweep that are not in progress or completed.
+
+        Members that cannot be run, e.g. because their input files could
+        not be created, are skipped.
+
+        Args:
+            id (str): unique id of the sweep
+            priority (int): queue priority of the runs
+
+        Returns:
+            list: ids of the simulations that were run
+        """
+        _, members = self._get_sweep_members(id)
+        ids = [
+            simulation.id
+            for simulation in members
+            if simulation.status
+            not in (
+                SimulationState.QUEUED,
+                SimulationState.RUNNING,
+                SimulationState.COMPLETED,
             )
-        return items
+        ]
+        return self._apply_to_members(
+            ids, lambda member: self.run_simulation(member, priority)
+        )
+
+    def stop_sweep(self, id: str) -> list:
+        """Stop the members of a sweep that are in progress.
+
+        Args:
+            id (str): unique id of the sweep
+
+        Returns:
+            list: ids of the simulations that were stopped
+        """
+        _, members = self._get_sweep_members(id)
+        ids = [
+            simulation.id
+            for simulation in members
+            if simulation.status
+            in (SimulationState.QUEUED, SimulationState.RUNNING)
+            # PREPARING simulations with a pending run
+            or simulation.status == SimulationState.PREPARING
+            and simulation.priority is not None
+        ]
+        return self._apply_to_members(ids, self.stop_simulation)
+
+    def pause_sweep(self, id: str) -> list:
+        """Pause the members of a sweep that are queued or running.
+
+        Args:
+            id (str): unique id of the sweep
+
+        Returns:
+            list: ids of the simulations that were paused
+        """
+        _, members = self._get_sweep_members(id)
+        ids = [
+            simulation.id
+            for simulation in members
+            if simulation.status
+            in (SimulationState.QUEUED, SimulationState.RUNNING)
+        ]
+        return self._apply_to_members(ids, self.pause_simulation)
+
+    @staticmethod
+    def _apply_to_members(ids: list, action) -> list:
+        """Run or stop members of a sweep, skipping those that fail.
+
+        Args:
+            ids (list): ids of the simulations
+            action (callable): called with the id of every simulation
+
+        Returns:
+            list: ids of the simulations for which the action succeeded
+        """
+        done = []
+        for id in ids:
+            try:
+                action(id)
+                done.append(id)
+            except (KeyError, RuntimeError):
+                # Deleted, or changed state meanwhile; already logged
+                continue
+        return done
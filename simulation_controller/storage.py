@@ -0,0 +1,195 @@
+"""Disk usage of the simulation folders.
+
+Completed outputs are compressed with gzip at its fastest level, and served
+as stored to clients accepting gzip. The simulations folder is kept within a
+quota by deleting the least recently used COMPLETED simulations.
+"""
+
+import fcntl
+import gzip
+import logging
+import os
+import shutil
+
+# Whether completed outputs are compressed
+COMPRESS_OUTPUT = os.environ.get("SIMPARTIX_COMPRESS_OUTPUT", "1") == "1"
+
+# Disk budget of the simulations folder, 0 for no limit
+STORAGE_QUOTA_BYTES = int(os.environ.get("SIMPARTIX_STORAGE_QUOTA_BYTES", 0))
+
+# Suffix of the compressed files
+COMPRESSED_SUFFIX = ".gz"
+
+# Files of a completed simulation that are compressed, relative to its folder
+COMPRESSED_FILES = (
+    "output.json",
+    os.path.join("output", "output.h5part"),
+)
+
+
+def directory_size(path: str) -> int:
+    """Size of the files below a directory, skipping files removed
+    meanwhile."""
+    size = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                pass
+    return size
+
+
+def stored_path(path: str):
+    """Path of a file as stored, compressed or not.
+
+    Args:
+        path (str): path of the uncompressed file
+
+    Returns:
+        str: path of the file, or of its compressed version, None if
+            neither exists
+    """
+    for candidate in (path, f"{path}{COMPRESSED_SUFFIX}"):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def is_compressed(path: str) -> bool:
+    return path.endswith(COMPRESSED_SUFFIX)
+
+
+def compress(path: str) -> str:
+    """Replace a file with its gzip-compressed version.
+
+    Args:
+        path (str): file to compress
+
+    Returns:
+        str: path of the compressed file
+    """
+    target = f"{path}{COMPRESSED_SUFFIX}"
+    try:
+        with open(path, "rb") as src, gzip.open(
+            f"{target}.tmp", "wb", compresslevel=1
+        ) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        shutil.copystat(path, f"{target}.tmp")
+    except Exception:
+        if os.path.exists(f"{target}.tmp"):
+            os.remove(f"{target}.tmp")
+        raise
+    os.replace(f"{target}.tmp", target)
+    os.remove(path)
+    return target
+
+
+def compress_output(basePath: str) -> None:
+    """Compress the `COMPRESSED_FILES` of a completed simulation.
+
+    Args:
+        basePath (str): folder of the simulation
+    """
+    if not COMPRESS_OUTPUT:
+        return
+    for name in COMPRESSED_FILES:
+        path = os.path.join(basePath, name)
+        if os.path.isfile(path):
+            size = os.path.getsize(path)
+            compressed = os.path.getsize(compress(path))
+            logging.info(
+                f"'{path}' compressed from {size} to {compressed} bytes."
+            )
+
+
+def remove_compressed(basePath: str) -> None:
+    """Remove the compressed output of a previous run.
+
+    Args:
+        basePath (str): folder of the simulation
+    """
+    for name in COMPRESSED_FILES:
+        try:
+            os.remove(os.path.join(basePath, f"{name}{COMPRESSED_SUFFIX}"))
+        except FileNotFoundError:
+            pass
+
+
+class StorageQuota:
+    """Keep a folder of simulations within `max_bytes`.
+
+    Simulations are evicted in least recently used order, their folder
+    being touched every time their output is read. The folder may be shared
+    by several processes, evictions are serialized through a lock file.
+    """
+
+    def __init__(self, path: str, max_bytes: int = STORAGE_QUOTA_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        lock_file = open(os.path.join(self.path, ".storage.lock"), "w")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    @staticmethod
+    def touch(basePath: str) -> None:
+        """Record that the output of a simulation was used."""
+        try:
+            os.utime(basePath)
+        except FileNotFoundError:
+            pass
+
+    def evict(self, candidates: dict, delete) -> list:
+        """Delete least recently used simulations until within budget.
+
+        Args:
+            candidates (dict): folders of the simulations that may be
+                deleted, by id
+            delete (callable): deletes the simulation of an id, raising a
+                KeyError or RuntimeError if it cannot be deleted anymore
+
+        Returns:
+            list: ids of the deleted simulations
+        """
+        evicted = []
+        if not self.enabled:
+            return evicted
+        with self._lock():
+            total = directory_size(self.path)
+            if total <= self.max_bytes:
+                return evicted
+            entries = []
+            for id, basePath in candidates.items():
+                try:
+                    entries.append((os.path.getmtime(basePath), id, basePath))
+                except FileNotFoundError:
+                    continue
+            for _, id, basePath in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                size = directory_size(basePath)
+                try:
+                    delete(id)
+                except (KeyError, RuntimeError) as e:
+                    logging.warning(
+                        f"Simulation '{id}' could not be evicted. "
+                        f"Error message: {e}"
+                    )
+                    continue
+                total -= size
+                evicted.append(id)
+                logging.info(f"Simulation '{id}' evicted, {size} bytes freed.")
+            if total > self.max_bytes:
+                logging.warning(
+                    f"Simulations use {total} bytes, more than the quota of "
+                    f"{self.max_bytes} bytes, and no more completed "
+                    "simulations can be evicted."
+                )
+        return evicted
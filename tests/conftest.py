@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+STANDIN_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "benchmarks",
+    "bin",
+    "SimPARTIX",
+)
+
+
+def wait_for(condition, timeout: float = 10.0):
+    """Poll a condition until it holds, and return its last value."""
+    deadline = time.monotonic() + timeout
+    while True:
+        value = condition()
+        if value or time.monotonic() > deadline:
+            return value
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def standin():
+    """Start the stand-in solver in a simulation folder."""
+    processes = []
+
+    def start(basePath, duration: float = 3.0, frames: int = 10):
+        config = os.path.join(basePath, "input", "simulation.conf")
+        if not os.path.isfile(config):
+            os.makedirs(os.path.dirname(config), exist_ok=True)
+            with open(config, "w") as f:
+                f.write("startTime = 0.0\nendTime = 1.0e-03\n")
+        process = subprocess.Popen(
+            [sys.executable, STANDIN_PATH],
+            cwd=basePath,
+            env=dict(
+                os.environ,
+                SIMPARTIX_FAKE_DURATION=str(duration),
+                SIMPARTIX_FAKE_FRAMES=str(frames),
+                SIMPARTIX_FAKE_PARTICLES="2000",
+            ),
+            stdout=subprocess.DEVNULL,
+        )
+        processes.append(process)
+        return process
+
+    yield start
+    for process in processes:
+        process.kill()
+        process.wait()
@@ -0,0 +1,81 @@
+import os
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import write_h5part
+from simulation_controller import postprocessing, restart
+from simulation_controller.frame_follower import FrameFollower
+from simulation_controller.h5part import frame_count, frame_times
+from tests.conftest import wait_for
+
+
+@pytest.fixture
+def follower(monkeypatch):
+    """Follower converting the frames in the test process."""
+
+    def submit_frames(*args):
+        future = Future()
+        future.set_result(postprocessing.store_frames(*args))
+        return future
+
+    monkeypatch.setattr(postprocessing, "POSTPROCESSING_ENGINE", "direct")
+    monkeypatch.setattr(postprocessing, "submit_frames", submit_frames)
+    return FrameFollower(interval=0.05)
+
+
+def _frame_count(path: str) -> int:
+    """Frames of a file, 0 while it is being created."""
+    try:
+        return frame_count(path)
+    except OSError:
+        return 0
+
+
+def test_frames_are_read_while_written(tmp_path, standin):
+    process = standin(str(tmp_path))
+    path = str(tmp_path / restart.OUTPUT_FILENAME)
+    assert wait_for(lambda: _frame_count(path) >= 3)
+    assert process.poll() is None
+    assert len(frame_times(path)) >= 3
+
+
+def test_frames_are_converted_while_written(tmp_path, standin, follower):
+    basePath = str(tmp_path)
+    process = standin(basePath)
+    follower.follow(basePath)
+    assert wait_for(lambda: len(postprocessing.stored_frames(basePath)) >= 2)
+    assert process.poll() is None
+    follower.unfollow(basePath, wait=True)
+    assert postprocessing.stored_frames(basePath)[:2] == [0, 1]
+
+
+def test_segment_of_resumed_run_is_followed(tmp_path, standin, follower):
+    basePath = str(tmp_path)
+    os.makedirs(tmp_path / "input")
+    (tmp_path / restart.CONFIG_FILENAME).write_text(
+        "startTime = 0.0\nendTime = 1.0e-03\n"
+    )
+    os.makedirs(tmp_path / "output")
+    write_h5part(
+        str(tmp_path / restart.OUTPUT_FILENAME), 2000, 4, end_time=0.3e-3
+    )
+    assert restart.prepare_restart(basePath) == 3
+
+    process = standin(basePath, duration=1.0)
+    follower.follow(basePath)
+    assert wait_for(lambda: process.poll() is not None)
+    assert wait_for(lambda: 8 in postprocessing.stored_frames(basePath))
+    follower.unfollow(basePath, wait=True)
+    restart.stitch(basePath)
+
+    times = frame_times(str(tmp_path / restart.OUTPUT_FILENAME))
+    assert len(times) == 10
+    stored = postprocessing.stored_frames(basePath)
+    assert {4, 5, 6, 7, 8} <= set(stored)
+    for frame in stored:
+        np.testing.assert_allclose(
+            postprocessing.load_frame(basePath, frame)["elapsed_time"],
+            times[frame],
+        )
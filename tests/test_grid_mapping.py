@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import BOX_LOWER, BOX_UPPER, write_h5part
+from simulation_controller import grid_mapping, postprocessing
+from simulation_controller.grid_mapping import (
+    DEFAULT_VALUE,
+    apply_micress_convention,
+)
+
+
+def test_micress_convention_numbers_grains_and_phases():
+    result = apply_micress_convention(
+        {
+            "Group": np.array([DEFAULT_VALUE, 0, 0, 3, 3]),
+            "StateOfMatter_SPH": np.array([DEFAULT_VALUE, 0, 1, 0, 1.0]),
+        }
+    )
+    np.testing.assert_array_equal(result["Group"], [DEFAULT_VALUE, 1, 0, 4, 0])
+    np.testing.assert_array_equal(
+        result["StateOfMatter_SPH"], [DEFAULT_VALUE, 1, 0, 1, 0]
+    )
+
+
+@pytest.fixture
+def simulation_path(tmp_path):
+    (tmp_path / "output").mkdir()
+    write_h5part(str(tmp_path / "output" / "output.h5part"), 2000, 2)
+    return str(tmp_path)
+
+
+def test_direct_engine_applies_the_micress_convention(simulation_path):
+    mapped = grid_mapping.map_frames(
+        f"{simulation_path}/output/output.h5part",
+        [1],
+        BOX_LOWER,
+        BOX_UPPER,
+    )
+    group = mapped["Group"][0]
+    state = mapped["StateOfMatter_SPH"][0]
+    covered = group != DEFAULT_VALUE
+    assert covered.any()
+    assert np.all((group[covered] == 0) == (state[covered] == 0))
+    assert set(np.unique(state[covered])) <= {0, 1}
+
+
+def test_engines_agree(simulation_path, monkeypatch):
+    pytest.importorskip("propartix")
+    results = {}
+    for engine in ("direct", "vtk"):
+        monkeypatch.setattr(postprocessing, "POSTPROCESSING_ENGINE", engine)
+        results[engine] = postprocessing.convert_frames(simulation_path, [1])
+    direct, vtk = results["direct"], results["vtk"]
+    for name in ("Group", "StateOfMatter_SPH"):
+        a, b = np.asarray(direct[name][0]), np.asarray(vtk[name][0])
+        assert a.shape == b.shape
+        assert np.mean(a == b) > 0.99, name
+    a = np.asarray(direct["Temperature_SPH"][0])
+    b = np.asarray(vtk["Temperature_SPH"][0])
+    covered = (a != DEFAULT_VALUE) & (b != DEFAULT_VALUE)
+    np.testing.assert_allclose(a[covered], b[covered], rtol=0.05)
@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+
+# Records a transition and a queue depth, then prints the metrics
+SCRIPT = """
+from simulation_controller.metrics import (
+    QUEUE_DEPTH,
+    SIMULATION_TRANSITIONS,
+    init_metrics,
+    render,
+)
+
+init_metrics()
+SIMULATION_TRANSITIONS.labels("RUNNING").inc()
+QUEUE_DEPTH.set(3)
+print(render()[0].decode())
+"""
+
+
+def _run(path) -> dict:
+    output = subprocess.check_output(
+        [sys.executable, "-c", SCRIPT],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(path)),
+        text=True,
+    )
+    samples = {}
+    for line in output.splitlines():
+        if line and not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            samples[name] = float(value)
+    return samples
+
+
+def test_counters_of_exited_processes_are_kept(tmp_path):
+    transitions = 'simpartix_simulation_transitions_total{state="RUNNING"}'
+    assert _run(tmp_path)[transitions] == 1
+    samples = _run(tmp_path)
+    assert samples[transitions] == 2
+    # Only the gauge of the live process is counted
+    assert samples["simpartix_queue_depth"] == 3
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from simulation_controller import packing
+
+LOWER = [-250e-6, -250e-6, 0.0]
+UPPER = [250e-6, 250e-6, 500e-6]
+
+
+def _overlaps(centers, radii) -> bool:
+    distances = np.linalg.norm(
+        centers[:, None, [0, 2]] - centers[None, :, [0, 2]], axis=2
+    )
+    np.fill_diagonal(distances, np.inf)
+    return np.any(distances < radii[:, None] + radii[None, :] - 1e-12)
+
+
+@pytest.mark.parametrize("phi", [0.3, 0.5])
+def test_loose_packing_reaches_the_fraction(phi):
+    np.random.seed(0)
+    centers, radii, achieved = packing.create_random(
+        LOWER, UPPER, phi, 15e-6, 0.2
+    )
+    assert achieved == pytest.approx(
+        packing.covered_fraction(LOWER, UPPER, radii)
+    )
+    assert achieved >= phi
+    assert not _overlaps(centers, radii)
+
+
+@pytest.mark.parametrize("phi", [0.7, 0.9])
+def test_dense_packing_returns_the_fraction_reached(phi):
+    np.random.seed(0)
+    centers, radii, achieved = packing.create_random(
+        LOWER, UPPER, phi, 15e-6, 0.2
+    )
+    assert achieved == pytest.approx(
+        packing.covered_fraction(LOWER, UPPER, radii)
+    )
+    assert 0.55 < achieved < phi
+    assert not _overlaps(centers, radii)
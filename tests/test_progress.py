@@ -0,0 +1,25 @@
+import time
+
+from simulation_controller.progress import estimate_progress, latest_time
+from tests.conftest import wait_for
+
+
+def test_progress_of_running_simulation(tmp_path, standin):
+    basePath = str(tmp_path)
+    started_at = time.time()
+    process = standin(basePath)
+    assert wait_for(lambda: (latest_time(basePath) or 0) > 0)
+    assert process.poll() is None
+
+    progress = estimate_progress(basePath, started_at)
+    assert progress["end_time"] == 1.0e-3
+    assert 0 < progress["fraction"] < 1
+    assert progress["throughput"] > 0
+    assert progress["eta"] > time.time()
+
+
+def test_progress_before_first_frame(tmp_path):
+    (tmp_path / "input").mkdir()
+    (tmp_path / "input" / "simulation.conf").write_text("endTime = 1.0e-3\n")
+    assert latest_time(str(tmp_path)) is None
+    assert estimate_progress(str(tmp_path), time.time())["fraction"] is None
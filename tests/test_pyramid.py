@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from simulation_controller import pyramid
+
+
+@pytest.fixture
+def simulation_path(tmp_path):
+    temperature = np.arange(2 * 8 * 8, dtype=float).reshape(2, 8, 8)
+    pyramid.build(
+        str(tmp_path), np.array([0.0, 1.0]), {"temperature": temperature}
+    )
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize("stride", [0, 3, 6, 12])
+def test_query_rejects_strides_other_than_powers_of_two(
+    simulation_path, stride
+):
+    with pytest.raises(ValueError, match="power of two"):
+        pyramid.query(simulation_path, ["temperature"], stride=stride)
+
+
+def test_query_averages_the_cells_of_a_stride(simulation_path):
+    result = pyramid.query(simulation_path, ["temperature"], stride=4)
+    temperature = np.arange(2 * 8 * 8, dtype=float).reshape(2, 8, 8)
+    expected = temperature.reshape(2, 2, 4, 2, 4).mean(axis=(2, 4))
+    np.testing.assert_allclose(result["temperature"], expected)
+    assert result["x"] == (0, 8, 4)
+    assert result["z"] == (0, 8, 4)
+
+
+def test_frames_are_read_from_the_pyramid_once_removed(tmp_path):
+    from simulation_controller import postprocessing
+
+    grids = {
+        "temperature": np.arange(2 * 4 * 4, dtype=float).reshape(2, 4, 4),
+        "group": np.ones((2, 4, 4), dtype=np.int64),
+        "state_of_matter": np.zeros((2, 4, 4)),
+    }
+    pyramid.build(str(tmp_path), np.array([0.0, 0.5]), grids)
+    postprocessing.remove_frames(str(tmp_path))
+
+    assert postprocessing.stored_frames(str(tmp_path)) == [0, 1]
+    frame = postprocessing.load_frame(str(tmp_path), 1)
+    assert float(frame["elapsed_time"]) == 0.5
+    np.testing.assert_array_equal(
+        frame["Temperature_SPH"], grids["temperature"][1]
+    )
+    np.testing.assert_array_equal(frame["Group"], grids["group"][1])
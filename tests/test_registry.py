@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+
+from models.transformation import SimulationState, TransformationInput
+from simulation_controller import simulation as simulation_module
+from simulation_controller.registry import SimulationRegistry
+from simulation_controller.simulation import Simulation
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        simulation_module, "SIMULATIONS_FOLDER_PATH", str(tmp_path)
+    )
+    return SimulationRegistry(str(tmp_path / "registry.sqlite"))
+
+
+def _save(registry, owner="host:1:a", state=SimulationState.CREATED):
+    simulation = Simulation(TransformationInput())
+    simulation.owner = owner
+    simulation.status = state
+    registry.save(simulation)
+    return simulation
+
+
+def test_changes_include_deletions(registry):
+    first, second = _save(registry), _save(registry)
+    version = registry.changes(0)[-1]["version"]
+
+    registry.delete(first.id)
+
+    changes = registry.changes(version)
+    assert [(row["id"], row["deleted"]) for row in changes] == [(first.id, 1)]
+    assert second.id not in {row["id"] for row in changes}
+
+
+def test_requests_reach_the_owner_once(registry):
+    simulation = _save(registry)
+    registry.request(simulation.id, "RUNNING", priority=3)
+
+    (row,) = registry.requests("host:1:a")
+    assert (row["requested_state"], row["priority"]) == ("RUNNING", 3)
+    assert registry.requests("host:2:b") == []
+
+    registry.request(simulation.id, "STOPPED")
+    assert not registry.clear_request(simulation.id, "RUNNING")
+    assert registry.clear_request(simulation.id, "STOPPED")
+    assert registry.requests("host:1:a") == []
+
+
+def test_only_one_worker_claims_an_orphan(registry):
+    simulation = _save(registry, owner=None)
+    assert [row["id"] for row in registry.orphans()] == [simulation.id]
+
+    assert registry.claim(simulation.id, "host:2:b", None)
+    assert not registry.claim(simulation.id, "host:3:c", None)
+
+    registry.heartbeat("host:2:b")
+    assert registry.orphans() == []
+
+
+def test_running_filters_by_host(registry):
+    class Process:
+        pid = 4242
+
+    simulation = Simulation(TransformationInput())
+    simulation.owner = "host:1:a"
+    simulation.process = Process()
+    simulation.status = SimulationState.RUNNING
+    registry.save(simulation)
+
+    assert [row["pid"] for row in registry.running("host")] == [4242]
+    assert registry.running("other") == []
+    assert registry.running("hos") == []
+
+
+def test_lock_excludes_other_holders(registry):
+    order = []
+
+    def hold():
+        with registry.lock("a"):
+            order.append("other")
+
+    with registry.lock("a"):
+        thread = threading.Thread(target=hold)
+        thread.start()
+        thread.join(0.2)
+        order.append("first")
+    thread.join()
+
+    assert order == ["first", "other"]
+
+
+def test_delete_removes_the_lock_file(registry, tmp_path):
+    simulation = _save(registry)
+    with registry.lock(simulation.id):
+        registry.delete(simulation.id)
+    assert list((tmp_path / "locks").iterdir()) == []
+
+
+def test_lock_is_taken_again_after_a_delete(registry):
+    order = []
+
+    def hold():
+        with registry.lock("a"):
+            order.append("other")
+
+    with registry.lock("a"):
+        thread = threading.Thread(target=hold)
+        thread.start()
+        thread.join(0.2)
+        registry.delete("a")
+        order.append("deleted")
+    thread.join()
+
+    assert order == ["deleted", "other"]
+    # A new holder gets the lock on the recreated file
+    with registry.lock("a"):
+        pass
@@ -0,0 +1,68 @@
+import json
+import os
+import subprocess
+import sys
+
+from simulation_controller.resources import (
+    SIMULATION_NICE,
+    THREAD_VARIABLES,
+    CoreAllocator,
+    environment,
+    restrict,
+)
+
+# Affinity and niceness of a thread started by the child process
+THREAD_SCRIPT = """
+import json, os, threading
+result = {}
+def probe():
+    result["cores"] = sorted(os.sched_getaffinity(0))
+    result["nice"] = os.nice(0)
+thread = threading.Thread(target=probe)
+thread.start()
+thread.join()
+print(json.dumps(result))
+"""
+
+
+def test_runs_get_disjoint_cores():
+    allocator = CoreAllocator(cores=range(16), cores_per_simulation=8)
+    first, second = allocator.allocate(), allocator.allocate()
+    assert first == list(range(8))
+    assert second == list(range(8, 16))
+
+    allocator.release(first)
+    assert allocator.allocate() == first
+
+
+def test_runs_share_all_cores_when_none_is_free():
+    allocator = CoreAllocator(cores=range(8), cores_per_simulation=8)
+    allocator.allocate()
+    assert allocator.allocate() == list(range(8))
+
+
+def test_cores_of_other_workers_are_excluded():
+    cores = sorted(os.sched_getaffinity(0))
+    allocator = CoreAllocator(cores=cores, cores_per_simulation=1)
+    allocator.exclude([os.getpid()])
+    shared = allocator.allocate()
+    assert shared == cores
+
+    allocator.release(shared)
+    allocator.exclude([])
+    assert allocator.allocate() == cores[:1]
+
+
+def test_environment_sets_the_thread_counts():
+    env = environment([2, 3, 4])
+    assert all(env[name] == "3" for name in THREAD_VARIABLES)
+
+
+def test_threads_of_the_process_inherit_the_restriction():
+    cores = sorted(os.sched_getaffinity(0))[:1]
+    output = subprocess.check_output(
+        [sys.executable, "-c", THREAD_SCRIPT], preexec_fn=restrict(cores)
+    )
+    result = json.loads(output)
+    assert result["cores"] == cores
+    assert result["nice"] >= SIMULATION_NICE
@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from models.transformation import SimulationState, TransformationInput
+from simulation_controller import simulation as simulation_module
+from simulation_controller.registry import SimulationRegistry
+from simulation_controller.simulation import Simulation
+from simulation_controller.simulation_manager import SimulationManager
+from simulation_controller.storage import StorageQuota
+
+
+class RecordingScheduler:
+    """Queue simulations without running them."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, simulation, priority=0):
+        self.submitted.append(simulation)
+        simulation.status = SimulationState.QUEUED
+
+    def cancel(self, simulation):
+        return False
+
+    def admit(self):
+        pass
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        simulation_module, "SIMULATIONS_FOLDER_PATH", str(tmp_path)
+    )
+    return SimulationManager(
+        scheduler=RecordingScheduler(),
+        executor=ThreadPoolExecutor(1),
+        result_cache=True,
+        registry=SimulationRegistry(str(tmp_path / "registry.sqlite")),
+        storage=StorageQuota(str(tmp_path), 0),
+    )
+
+
+def _add(manager):
+    simulation = Simulation(TransformationInput(seed=1))
+    simulation.owner = manager.worker_id
+    simulation.inputs_ready = True
+    simulation.add_listener(manager._on_state_change)
+    manager._add_simulation(simulation)
+    simulation.status = SimulationState.CREATED
+    return simulation
+
+
+def test_followers_run_when_the_leader_is_paused(manager):
+    leader, follower = _add(manager), _add(manager)
+    manager._submit(leader, 0)
+    manager._submit(follower, 0)
+    assert manager.scheduler.submitted == [leader]
+
+    leader.status = SimulationState.PAUSED
+
+    assert manager.scheduler.submitted == [leader, follower]
+    assert follower.status == SimulationState.QUEUED
+
+
+def test_followers_run_when_the_leader_is_deleted(manager):
+    leader, follower = _add(manager), _add(manager)
+    manager._submit(leader, 0)
+    manager._submit(follower, 0)
+
+    manager._forget(leader.id)
+
+    assert manager.scheduler.submitted == [leader, follower]
+
+
+def test_a_completed_source_runs_again(manager):
+    source = _add(manager)
+    manager._submit(source, 0)
+    source.status = SimulationState.COMPLETED
+
+    manager._submit(source, 0)
+
+    assert manager.scheduler.submitted == [source, source]
+    assert not manager._results
@@ -0,0 +1,95 @@
+from models.transformation import SimulationState
+from simulation_controller.scheduler import Scheduler
+from tests.conftest import wait_for
+
+
+class FakeSimulation:
+    """Simulation whose run only records that it started."""
+
+    def __init__(self, id: str, fail: bool = False):
+        self.id = id
+        self.fail = fail
+        self.status = SimulationState.CREATED
+        self.error = None
+        self.on_exit = None
+
+    def run(self, on_exit=None):
+        if self.fail:
+            raise OSError("SimPARTIX not found")
+        self.on_exit = on_exit
+        self.status = SimulationState.RUNNING
+
+    def exit(self):
+        self.status = SimulationState.COMPLETED
+        self.on_exit(self)
+
+
+def test_runs_beyond_the_limit_are_queued():
+    scheduler = Scheduler(max_concurrent=2)
+    a, b, c, d = (FakeSimulation(id) for id in "abcd")
+    for simulation in (a, b, c, d):
+        scheduler.submit(simulation)
+
+    assert [s.status for s in (a, b, c, d)] == [
+        SimulationState.RUNNING,
+        SimulationState.RUNNING,
+        SimulationState.QUEUED,
+        SimulationState.QUEUED,
+    ]
+    assert scheduler.running_count == 2
+    assert scheduler.queue_position(c) == 1
+    assert scheduler.queue_position(d) == 2
+
+
+def test_released_slots_go_by_priority():
+    scheduler = Scheduler(max_concurrent=1)
+    a, b, c = (FakeSimulation(id) for id in "abc")
+    scheduler.submit(a)
+    scheduler.submit(b)
+    scheduler.submit(c, priority=5)
+    assert scheduler.queue_position(c) == 1
+
+    a.exit()
+
+    assert wait_for(lambda: c.status == SimulationState.RUNNING)
+    assert b.status == SimulationState.QUEUED
+
+
+def test_cancelled_runs_are_not_started():
+    scheduler = Scheduler(max_concurrent=1)
+    a, b = FakeSimulation("a"), FakeSimulation("b")
+    scheduler.submit(a)
+    scheduler.submit(b)
+    assert scheduler.cancel(b)
+    assert not scheduler.cancel(b)
+
+    a.exit()
+
+    assert wait_for(lambda: scheduler.running_count == 0)
+    assert b.status == SimulationState.QUEUED
+    assert scheduler.queue_depth == 0
+
+
+def test_runs_of_other_workers_count_against_the_limit():
+    others = [0]
+    scheduler = Scheduler(max_concurrent=2, host_runs=lambda: others)
+    a, b = FakeSimulation("a"), FakeSimulation("b")
+    scheduler.submit(a)
+    scheduler.submit(b)
+    assert b.status == SimulationState.QUEUED
+
+    others.clear()
+    scheduler.admit()
+
+    assert wait_for(lambda: b.status == SimulationState.RUNNING)
+
+
+def test_a_run_failing_to_start_frees_its_slot():
+    scheduler = Scheduler(max_concurrent=1)
+    failing, other = FakeSimulation("a", fail=True), FakeSimulation("b")
+    scheduler.submit(failing)
+    scheduler.submit(other)
+
+    assert failing.status == SimulationState.FAILED
+    assert "SimPARTIX not found" in failing.error
+    assert other.status == SimulationState.RUNNING
@@ -0,0 +1,69 @@
+import pytest
+
+from models.transformation import SimulationState, TransformationInput
+from simulation_controller import restart
+from simulation_controller import simulation as simulation_module
+from simulation_controller.simulation import Simulation
+
+
+class FakeProcess:
+    pid = 4242
+
+    def __init__(self, returncode=None):
+        self.returncode = returncode
+
+    def poll(self):
+        return self.returncode
+
+
+@pytest.fixture
+def terminated(monkeypatch):
+    """Processes sent SIGTERM by the simulations."""
+    processes = []
+    monkeypatch.setattr(simulation_module, "terminate_group", processes.append)
+    return processes
+
+
+@pytest.fixture
+def running(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        simulation_module, "SIMULATIONS_FOLDER_PATH", str(tmp_path)
+    )
+    simulation = Simulation(TransformationInput())
+    (tmp_path / simulation.id).mkdir()
+    simulation.process = FakeProcess()
+    simulation.status = SimulationState.RUNNING
+    return simulation
+
+
+def test_stop_terminates_a_running_process(running, terminated):
+    process = running.process
+    running.stop()
+    assert terminated == [process]
+    assert running.status == SimulationState.STOPPED
+
+
+def test_stop_wins_over_a_pause_in_progress(running, terminated):
+    running.pause()
+    # The process exits, its pause is not finished yet
+    running.process.returncode = -15
+    terminated.clear()
+
+    running.stop()
+    running._finish_pause()
+
+    assert terminated == []
+    assert running.status == SimulationState.STOPPED
+    assert not restart.is_paused(running.simulationPath)
+
+
+def test_a_paused_simulation_can_be_stopped(running, terminated):
+    running.pause()
+    running.process.returncode = -15
+    running._finish_pause()
+    assert running.status == SimulationState.PAUSED
+
+    running.stop()
+
+    assert running.status == SimulationState.STOPPED
+    assert not restart.is_paused(running.simulationPath)